@@ -2,13 +2,9 @@ import streamlit as st
 import os
 from PIL import Image
 import json
+import requests
 from datetime import datetime
 
-from llm.llm_handler import LLMHandler
-from memory.memory_handler import MemoryHandler
-from pipeline.pipeline_handler import PipelineHandler
-from openfabric_pysdk.utility import Stub
-
 
 # Page config
 st.set_page_config(
@@ -37,6 +33,9 @@ st.markdown("""
     .gallery-image {
         border-radius: 0.5rem;
         margin: 0.5rem 0;
+        width: 100%;
+        aspect-ratio: 1;
+        object-fit: cover;
     }
 </style>
 """, unsafe_allow_html=True)
@@ -44,31 +43,69 @@ st.markdown("""
 # Initialize session state
 if 'session_id' not in st.session_state:
     st.session_state.session_id = None
-if 'history' not in st.session_state:
-    st.session_state.history = []
+if 'gallery' not in st.session_state:
+    st.session_state.gallery = {"creations": [], "next_cursor": None, "loaded": False}
 if 'reference_id' not in st.session_state:
     st.session_state.reference_id = None
 
-# Initialize handlers
-@st.cache_resource
-def init_handlers():
-    config = {
-        "app_ids": [
-            "f0997a01-d6d3-a5fe-53d8-561300318557",
-            "69543f29-4d41-4afc-7f29-3d51591f11eb"
-        ],
-        "llm_model": "deepseek-ai/deepseek-coder-6.7b-base",
-        "memory_type": "vector"
-    }
-    
-    stub = Stub(config["app_ids"])
-    llm_handler = LLMHandler(config["llm_model"])
-    memory_handler = MemoryHandler(config["memory_type"])
-    pipeline = PipelineHandler(stub, llm_handler, memory_handler, config)
-    
-    return pipeline
+# Creations run as background jobs on the API server, which also owns the
+# model and memory stores, so the UI starts without loading either
+API_URL = os.getenv("API_URL", "http://localhost:8888")
+# Where the browser reaches the API for thumbnails, if not at API_URL
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", API_URL)
+GALLERY_PAGE_SIZE = 24
+
+def submit_job(prompt, session_id, reference_id):
+    response = requests.post(f"{API_URL}/jobs", json={
+        "prompt": prompt,
+        "session_id": session_id,
+        "reference_id": reference_id
+    }, timeout=10)
+    response.raise_for_status()
+    return response.json()["job_id"]
 
-pipeline = init_handlers()
+def search_similar(prompt):
+    response = requests.get(f"{API_URL}/creations/similar", params={"prompt": prompt}, timeout=30)
+    response.raise_for_status()
+    return response.json()["creations"]
+
+def fetch_creations(session_id=None, cursor=None, limit=GALLERY_PAGE_SIZE):
+    """Fetch one page of creations, newest first, from the memory store."""
+    path = f"/sessions/{session_id}/creations" if session_id else "/creations"
+    response = requests.get(f"{API_URL}{path}", params={"limit": limit, "cursor": cursor}, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+def thumbnail_html(creation, size=256):
+    """An <img> the browser fetches only when scrolled into view; empty if there is no image hash."""
+    # Records nest their metadata; vector search results flatten it
+    digest = (creation.get("metadata") or creation).get("image_sha256")
+    if not digest:
+        return ""
+    return (f'<img class="gallery-image" loading="lazy" alt="{creation["id"][:8]}" '
+            f'src="{PUBLIC_API_URL}/thumbnails/{digest}?size={size}">')
+
+def read_sse(path, params=None):
+    """Yield (event type, payload) pairs from a Server-Sent Events endpoint."""
+    with requests.get(f"{API_URL}{path}", params=params, stream=True, timeout=(10, 60)) as response:
+        response.raise_for_status()
+        event_type = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event_type = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event_type, json.loads(line[len("data:"):])
+
+def stream_job_events(job_id):
+    return read_sse(f"/jobs/{job_id}/events")
+
+def stream_enhancement(prompt, stats):
+    """Yield enhanced-prompt text as it is generated; timings land in stats."""
+    for event_type, event in read_sse("/enhance/stream", {"prompt": prompt}):
+        if event_type == "token":
+            yield event["text"]
+        elif event_type == "done":
+            stats.update(event)
 
 # Sidebar
 with st.sidebar:
@@ -88,16 +125,20 @@ with st.sidebar:
     
     st.markdown("---")
     
-    # Gallery
+    # Latest creations of this session, from the memory store
     st.subheader("📚 Your Creations")
-    if st.session_state.history:
-        for creation in reversed(st.session_state.history[-5:]):
-            with st.expander(f"Creation {creation['creation_id'][:8]}..."):
+    if st.session_state.session_id:
+        try:
+            recent = fetch_creations(st.session_state.session_id, limit=5)["creations"]
+        except requests.RequestException as e:
+            st.error(f"Could not load creations: {str(e)}")
+            recent = []
+        for creation in recent:
+            with st.expander(f"Creation {creation['id'][:8]}..."):
                 st.write(f"**Prompt:** {creation['prompt']}")
-                if os.path.exists(creation['image_path']):
-                    st.image(creation['image_path'], use_column_width=True)
-                if st.button("Use as Reference", key=creation['creation_id']):
-                    st.session_state.reference_id = creation['creation_id']
+                st.markdown(thumbnail_html(creation, 128), unsafe_allow_html=True)
+                if st.button("Use as Reference", key=creation['id']):
+                    st.session_state.reference_id = creation['id']
                     st.rerun()
 
 # Main content
@@ -110,28 +151,64 @@ with st.form("creation_form"):
         placeholder="e.g., A glowing dragon standing on a cliff at sunset..."
     )
     
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         submit = st.form_submit_button("🚀 Create Magic!")
     with col2:
+        preview = st.form_submit_button("✨ Preview Enhancement")
+    with col3:
         find_similar = st.form_submit_button("🔍 Find Similar")
 
+# Stream the enhanced prompt live
+if preview and prompt:
+    st.subheader("✨ Enhanced Prompt")
+    stats = {}
+    try:
+        st.write_stream(stream_enhancement(prompt, stats))
+        if stats.get("time_to_first_token_seconds") is not None:
+            st.caption(
+                f"First token after {stats['time_to_first_token_seconds']:.2f}s, "
+                f"done in {stats['total_seconds']:.2f}s"
+            )
+    except requests.RequestException as e:
+        st.error(f"Enhancement failed: {str(e)}")
+
 # Process creation
 if submit and prompt:
-    with st.spinner("🎨 Creating your masterpiece..."):
-        result = pipeline.process_creation(
-            prompt=prompt,
-            session_id=st.session_state.session_id,
-            reference_id=st.session_state.reference_id
-        )
+    stage_labels = {
+        "enhance": "✍️ Enhancing prompt",
+        "image": "🖼 Generating image",
+        "3d": "🎮 Building 3D model",
+        "optimize": "🗜 Compacting 3D model",
+        "persist": "💾 Saving to memory"
+    }
+    with st.status("🎨 Creating your masterpiece...", expanded=True) as status:
+        try:
+            job_id = submit_job(prompt, st.session_state.session_id, st.session_state.reference_id)
+            job = None
+            for event_type, event in stream_job_events(job_id):
+                if event_type == "done":
+                    job = event
+                elif event["stage"] in stage_labels and event["status"] != "started":
+                    st.write(f"{stage_labels[event['stage']]}: {event['status']} in {event['seconds']:.1f}s")
+                elif event["stage"] in stage_labels:
+                    status.update(label=f"{stage_labels[event['stage']]}...")
+        except requests.RequestException as e:
+            job = {"status": "failed", "error": str(e)}
+
+        if job and job["status"] == "completed":
+            status.update(label="✨ Creation complete!", state="complete", expanded=False)
+        else:
+            status.update(label="Creation failed", state="error")
+
+    if job and job["status"] == "completed":
+        result = job["result"]
         
-        # Update session state
+        # Update session state; the new creation heads the gallery on its next load
         st.session_state.session_id = result['session_id']
-        st.session_state.history.append(result)
+        st.session_state.gallery["loaded"] = False
         
         # Display result
-        st.success("✨ Creation complete!")
-        
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("🖼 Generated Image")
@@ -140,21 +217,54 @@ if submit and prompt:
             st.subheader("🎮 3D Model")
             st.markdown(f"Download the 3D model: [{result['creation_id']}.glb]({result['model_path']})")
             st.json(result['metadata'])
+    else:
+        st.error(f"Creation failed: {job.get('error') if job else 'no result'}")
 
 # Find similar creations
 if find_similar and prompt:
     with st.spinner("🔍 Finding similar creations..."):
-        similar = pipeline.find_similar_creations(prompt)
+        try:
+            similar = search_similar(prompt)
+        except requests.RequestException as e:
+            st.error(f"Search failed: {str(e)}")
+            similar = None
         
         if similar:
             st.subheader("🔍 Similar Creations")
             for item in similar:
                 with st.container():
                     st.markdown(f"**Prompt:** {item['prompt']}")
-                    if os.path.exists(item.get('image_path', '')):
-                        st.image(item['image_path'], use_column_width=True)
+                    st.markdown(thumbnail_html(item), unsafe_allow_html=True)
                     if st.button("Use as Reference", key=f"similar_{item['id']}"):
                         st.session_state.reference_id = item['id']
                         st.rerun()
-        else:
+        elif similar is not None:
             st.info("No similar creations found.")
+
+# Gallery of every creation, a page at a time
+st.markdown("---")
+st.subheader("🖼 Gallery")
+gallery = st.session_state.gallery
+if not gallery["loaded"]:
+    try:
+        gallery.update(fetch_creations(), loaded=True)
+    except requests.RequestException as e:
+        st.error(f"Could not load the gallery: {str(e)}")
+
+columns = st.columns(4)
+for i, creation in enumerate(gallery["creations"]):
+    with columns[i % 4]:
+        st.markdown(thumbnail_html(creation), unsafe_allow_html=True)
+        st.caption(creation["prompt"][:80])
+        if st.button("Use as Reference", key=f"gallery_{creation['id']}"):
+            st.session_state.reference_id = creation["id"]
+            st.rerun()
+
+if gallery["next_cursor"] and st.button("Load more"):
+    try:
+        page = fetch_creations(cursor=gallery["next_cursor"])
+        gallery["creations"] += page["creations"]
+        gallery["next_cursor"] = page["next_cursor"]
+        st.rerun()
+    except requests.RequestException as e:
+        st.error(f"Could not load more creations: {str(e)}")
@@ -0,0 +1,61 @@
+"""Disk bytes written per creation: direct per-UUID files vs the artifact store.
+
+A share of the prompts repeat (as users resubmit), and the fake Openfabric
+apps are deterministic, so repeated prompts produce identical outputs that
+the content-addressed store writes only once.
+
+Usage:
+    python benchmarks/bench_artifacts.py --creations 40 --repeat-ratio 0.5
+"""
+import argparse
+import os
+import tempfile
+
+from common import print_table, write_json
+from fakes import FakeLLM, FakeMemory, FakeStub
+
+from pipeline.pipeline_handler import PipelineHandler
+from utils.file_ops import ArtifactStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--creations", type=int, default=40)
+    parser.add_argument("--repeat-ratio", type=float, default=0.5)
+    parser.add_argument("--payload-kb", type=int, default=512)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_artifacts_"))
+    store = ArtifactStore()
+    pipeline = PipelineHandler(
+        stub=FakeStub(default_latency=0.0, default_payload_size=args.payload_kb * 1024, deterministic=True),
+        llm_handler=FakeLLM(enhance_seconds=0.0),
+        memory_handler=FakeMemory(),
+        config={},
+        artifact_store=store
+    )
+
+    unique = max(1, int(args.creations * (1 - args.repeat_ratio)))
+    legacy_bytes = 0
+    for i in range(args.creations):
+        result = pipeline.process_creation(f"prompt {i % unique}")
+        # The old path wrote both payloads under fresh UUIDs every time
+        legacy_bytes += os.path.getsize(result["image_path"]) + os.path.getsize(result["model_path"])
+    store.flush()
+    stats = store.stats()
+    pipeline.close()
+
+    rows = [
+        {"storage": "per-uuid files", "bytes_written": legacy_bytes,
+         "bytes_per_creation": legacy_bytes / args.creations},
+        {"storage": "content-addressed", "bytes_written": stats["bytes_written"],
+         "bytes_per_creation": stats["bytes_written"] / args.creations},
+    ]
+    print_table(rows, ["storage", "bytes_written", "bytes_per_creation"])
+    print(f"Dedup hits: {stats['dedup_hits']} of {stats['puts']} artifacts")
+    write_json(args.json, {"config": vars(args), "results": rows, "store": stats})
+
+
+if __name__ == "__main__":
+    main()
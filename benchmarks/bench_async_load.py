@@ -0,0 +1,80 @@
+"""Load test: concurrent creations through the sync and async pipeline paths.
+
+Runs N creations on one event loop, as the /execution endpoint would, and
+reports wall time plus the worst event-loop stall seen by a heartbeat task.
+With the sync path the creations serialize and the loop freezes for each one;
+with process_creation_async they overlap.
+
+Usage:
+    python benchmarks/bench_async_load.py --requests 8
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from common import print_table, write_json
+from fakes import FakeLLM, FakeMemory, FakeStub
+
+from pipeline.pipeline_handler import PipelineHandler
+
+
+async def heartbeat(interval: float, stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(pipeline: PipelineHandler, n_requests: int, use_async: bool) -> dict:
+    async def one(i: int) -> None:
+        if use_async:
+            await pipeline.process_creation_async(f"prompt {i}")
+        else:
+            # What the endpoint did before: a blocking call on the loop thread
+            pipeline.process_creation(f"prompt {i}")
+
+    lags: list = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(0.01, stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+
+    return {
+        "path": "async" if use_async else "sync",
+        "requests": n_requests,
+        "wall_s": elapsed,
+        "creations_per_s": n_requests / elapsed,
+        "max_loop_stall_s": max(lags) if lags else elapsed
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--llm-seconds", type=float, default=0.2)
+    parser.add_argument("--stub-seconds", type=float, default=0.5)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_async_"))
+    pipeline = PipelineHandler(
+        stub=FakeStub(default_latency=args.stub_seconds),
+        llm_handler=FakeLLM(enhance_seconds=args.llm_seconds),
+        memory_handler=FakeMemory(),
+        config={"llm_max_batch_size": 8, "io_workers": 16}
+    )
+
+    rows = [asyncio.run(run(pipeline, args.requests, use_async)) for use_async in (False, True)]
+    pipeline.close()
+
+    print_table(rows, ["path", "requests", "wall_s", "creations_per_s", "max_loop_stall_s"])
+    write_json(args.json, {"results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Throughput and latency of LLM micro-batching at different batch sizes.
+
+Usage:
+    python benchmarks/bench_batching.py --model sshleifer/tiny-gpt2 --requests 32
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import print_table, summarize, write_json
+
+from llm.llm_handler import LLMHandler
+from llm.processor import BatchProcessor
+
+
+PROMPTS = [
+    "A glowing dragon standing on a cliff at sunset",
+    "A quiet library inside a giant tree",
+    "A robot painting a portrait in the rain",
+    "An underwater city lit by bioluminescent coral",
+]
+
+
+def run(llm_handler: LLMHandler, batch_size: int, window_ms: float, n_requests: int) -> dict:
+    processor = BatchProcessor(llm_handler, max_batch_size=batch_size, max_wait_ms=window_ms)
+    latencies = []
+
+    def one(i: int) -> None:
+        start = time.perf_counter()
+        processor.enhance_prompt(PROMPTS[i % len(PROMPTS)])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_requests) as pool:
+        list(pool.map(one, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    stats = processor.stats()
+    processor.close()
+
+    latency = summarize(latencies)
+    return {
+        "batch_size": batch_size,
+        "requests_per_sec": n_requests / elapsed,
+        "avg_batch": stats["avg_batch_size"],
+        "latency_p50_s": latency["p50"],
+        "latency_p95_s": latency["p95"]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--window-ms", type=float, default=20.0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    llm_handler = LLMHandler(args.model)
+    llm_handler.enhance_prompt(PROMPTS[0])  # warm-up
+
+    rows = [run(llm_handler, size, args.window_ms, args.requests) for size in args.batch_sizes]
+    print_table(rows, ["batch_size", "requests_per_sec", "avg_batch", "latency_p50_s", "latency_p95_s"])
+    write_json(args.json, {"model": args.model, "requests": args.requests, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Embedding throughput and similarity query latency of the vector index.
+
+Compares the old ingestion path (one collection.add, and so one embedding
+call, per creation) with hybrid MemoryHandler writes that are buffered and
+embedded in bulk, then times a backfill of records that were never indexed
+and similarity queries with a cold and a warm embedding cache.
+
+The default embedder is a fake with a fixed per-call cost so the benchmark
+runs offline; pass --embedder default to use Chroma's ONNX model.
+
+Usage:
+    python benchmarks/bench_embeddings.py --creations 2000 --queries 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+
+import chromadb
+from chromadb.config import Settings
+
+from common import print_table, summarize, write_json
+from fakes import FakeEmbeddingFunction
+
+from memory.memory_handler import MemoryHandler
+
+SUBJECTS = ["dragon", "castle", "robot", "forest", "ocean", "city", "spaceship", "garden"]
+STYLES = ["at sunset", "in the rain", "made of glass", "low poly", "watercolor", "neon lit"]
+
+
+def make_prompt(rng: random.Random) -> str:
+    return f"a {rng.choice(SUBJECTS)} {rng.choice(STYLES)}, variation {rng.randint(0, 10**6)}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--creations", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--distinct-queries", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--embedder", choices=["fake", "default"], default="fake")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_embeddings_"))
+    rng = random.Random(0)
+    if args.embedder == "fake":
+        embed = FakeEmbeddingFunction()
+    else:
+        from chromadb.utils import embedding_functions
+        embed = embedding_functions.DefaultEmbeddingFunction()
+
+    creations = [
+        {"creation_id": str(uuid.uuid4()), "session_id": "bench", "prompt": make_prompt(rng)}
+        for _ in range(args.creations)
+    ]
+
+    # Old path: every save embeds its own prompt inside collection.add
+    client = chromadb.PersistentClient(path="legacy_store", settings=Settings(anonymized_telemetry=False))
+    collection = client.get_or_create_collection(name="creative_memory")
+    start = time.perf_counter()
+    for creation in creations:
+        collection.add(
+            ids=[creation["creation_id"]],
+            documents=[creation["prompt"]],
+            embeddings=embed([creation["prompt"]])
+        )
+    legacy_seconds = time.perf_counter() - start
+
+    # New path: records commit immediately, index writes are flushed in bulk
+    memory = MemoryHandler(
+        "hybrid", db_path="memory/creative_memory.db", vector_db_path="memory/vector_store",
+        embedding_function=embed, embedding_batch_size=args.batch_size
+    )
+    start = time.perf_counter()
+    for creation in creations:
+        memory.save_creation(**creation)
+    save_seconds = time.perf_counter() - start
+    memory.index_buffer.flush()
+    buffered_seconds = time.perf_counter() - start
+
+    # Backfill: records that exist only in SQLite
+    extra = [
+        {"creation_id": str(uuid.uuid4()), "session_id": "bench", "prompt": make_prompt(rng)}
+        for _ in range(args.creations)
+    ]
+    with memory.pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO creations (id, session_id, prompt, metadata, created_at) VALUES (?, ?, ?, '{}', '')",
+            [(c["creation_id"], c["session_id"], c["prompt"]) for c in extra]
+        )
+    start = time.perf_counter()
+    backfilled = memory.backfill_index()
+    backfill_seconds = time.perf_counter() - start
+
+    ingestion = [
+        {"path": "add per creation", "creations": args.creations,
+         "embeddings_per_sec": args.creations / legacy_seconds, "save_ms": legacy_seconds / args.creations * 1000},
+        {"path": "buffered bulk upsert", "creations": args.creations,
+         "embeddings_per_sec": args.creations / buffered_seconds, "save_ms": save_seconds / args.creations * 1000},
+        {"path": "backfill", "creations": backfilled,
+         "embeddings_per_sec": backfilled / backfill_seconds, "save_ms": None},
+    ]
+    print_table(ingestion, ["path", "creations", "embeddings_per_sec", "save_ms"])
+    print()
+
+    distinct = [make_prompt(rng) for _ in range(args.distinct_queries)]
+    queries = [rng.choice(distinct) for _ in range(args.queries)]
+
+    def timed_queries(run_query) -> list:
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            run_query(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    legacy_latencies = timed_queries(
+        lambda q: collection.query(query_embeddings=embed([q]), n_results=5)
+    )
+    cached_latencies = timed_queries(lambda q: memory.get_similar_creations(q, 5))
+    lookups = [
+        {"query": "embed every query", **summarize(legacy_latencies)},
+        {"query": "cached query embedding + hydrate", **summarize(cached_latencies)},
+    ]
+    print_table(lookups, ["query", "count", "p50", "p95", "p99"])
+    print("(latencies in ms)")
+
+    stats = memory.stats()
+    memory.close()
+    write_json(args.json, {
+        "config": vars(args),
+        "ingestion": ingestion,
+        "queries_ms": lookups,
+        "memory": stats
+    })
+
+
+if __name__ == "__main__":
+    main()
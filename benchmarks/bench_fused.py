@@ -0,0 +1,75 @@
+"""Reference-based enhancement: two generations vs one fused generation.
+
+The two-call path enhances the prompt and then analyzes the reference
+against the result, as PipelineHandler does with llm_fused_reference off.
+The fused path asks for both in one structured output; rows whose output
+does not parse fall back to the two-call path, so the fallback rate is
+reported next to the latencies. Small models rarely follow the format, so
+use the production model for meaningful numbers.
+
+Usage:
+    python benchmarks/bench_fused.py --model deepseek-ai/deepseek-coder-6.7b-base --runs 10
+"""
+import argparse
+import time
+
+from common import print_table, summarize, write_json
+
+from llm.backends import create_llm_handler
+
+
+PAIRS = [
+    ("A glowing dragon standing on a cliff at sunset", "The same dragon asleep in a snowy cave"),
+    ("A quiet library inside a giant tree", "A reading nook inside a hollow mushroom"),
+    ("A robot painting a portrait in the rain", "The robot sculpting a statue at dawn"),
+]
+
+
+def two_call(llm_handler, reference_prompt: str, prompt: str) -> None:
+    enhanced_prompt = llm_handler.enhance_prompt(prompt)
+    llm_handler.analyze_reference(reference_prompt, enhanced_prompt)
+
+
+def fused(llm_handler, reference_prompt: str, prompt: str) -> None:
+    llm_handler.enhance_with_reference(reference_prompt, prompt)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="deepseek-ai/deepseek-coder-6.7b-base")
+    parser.add_argument("--backend", default="transformers")
+    parser.add_argument("--threads", type=int, default=0, help="0 uses every core")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    llm_handler = create_llm_handler(args.backend, args.model, deterministic=True, num_threads=args.threads)
+    pairs = [PAIRS[i % len(PAIRS)] for i in range(args.runs)]
+    fused(llm_handler, *PAIRS[0])  # warm-up
+
+    rows = []
+    for name, run in [("two calls", two_call), ("fused", fused)]:
+        generations = llm_handler.generations
+        tokens = llm_handler.generated_tokens
+        fallbacks = llm_handler.fused_fallbacks
+        latencies = []
+        for reference_prompt, prompt in pairs:
+            start = time.perf_counter()
+            run(llm_handler, reference_prompt, prompt)
+            latencies.append(time.perf_counter() - start)
+        summary = summarize(latencies)
+        rows.append({
+            "path": name,
+            "p50_s": summary["p50"],
+            "p95_s": summary["p95"],
+            "generations_per_request": (llm_handler.generations - generations) / args.runs,
+            "tokens_per_request": (llm_handler.generated_tokens - tokens) / args.runs,
+            "fallback_rate": (llm_handler.fused_fallbacks - fallbacks) / args.runs
+        })
+
+    print_table(rows, ["path", "p50_s", "p95_s", "generations_per_request", "tokens_per_request", "fallback_rate"])
+    write_json(args.json, {"config": vars(args), "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Gallery page cost: full-resolution images vs cached thumbnails.
+
+Fills a fresh store with --creations generated images and their memory
+records, then pages through the gallery the way the UI does: one keyset
+page of records from MemoryHandler, then an image per creation. Each page
+is measured three ways: full-resolution PNGs (what the UI sent before),
+thumbnails on first request (rendered from the stored image) and cached
+thumbnails. Render time covers the record query and every image lookup.
+
+Usage:
+    python benchmarks/bench_gallery.py --creations 500 --page-size 24
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from common import print_table, summarize, write_json
+from PIL import Image
+
+from memory.memory_handler import MemoryHandler
+from utils.file_ops import ArtifactStore
+from utils.thumbnails import ThumbnailCache
+
+
+def make_image(rng: random.Random, resolution: int) -> bytes:
+    # Noise over a gradient, so PNG compression sees something like a render
+    image = Image.linear_gradient("L").resize((resolution, resolution)).convert("RGB")
+    noise = Image.frombytes("RGB", (resolution // 4, resolution // 4),
+                            rng.randbytes(3 * (resolution // 4) ** 2))
+    image = Image.blend(image, noise.resize((resolution, resolution)), 0.3)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def page_through(memory: MemoryHandler, page_size: int, load_image) -> tuple:
+    """Walk every gallery page; return per-page render times (ms) and bytes."""
+    latencies, sizes = [], []
+    cursor = None
+    while True:
+        start = time.perf_counter()
+        page = memory.list_recent(page_size, cursor)
+        size = sum(load_image(creation["metadata"]["image_sha256"]) for creation in page["creations"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        sizes.append(size)
+        cursor = page["next_cursor"]
+        if not cursor:
+            return latencies, sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--creations", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=24)
+    parser.add_argument("--resolution", type=int, default=1024)
+    parser.add_argument("--thumbnail-size", type=int, default=256)
+    parser.add_argument("--format", default="webp", choices=["webp", "jpeg"])
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_gallery_"))
+    rng = random.Random(0)
+    store = ArtifactStore()
+    memory = MemoryHandler("sqlite", db_path="memory/creative_memory.db")
+    thumbnails = ThumbnailCache(default_size=args.thumbnail_size, image_format=args.format)
+
+    creations = []
+    for i in range(args.creations):
+        image = store.put(make_image(rng, args.resolution), "image")
+        creations.append({
+            "creation_id": str(uuid.uuid4()),
+            "session_id": "bench",
+            "prompt": f"gallery creation {i}",
+            "image_path": image.path,
+            "model_path": None,
+            "metadata": {"image_sha256": image.digest}
+        })
+    store.flush()
+    memory.save_creations(creations)
+
+    def full_resolution(digest: str) -> int:
+        with open(store.path_for(digest, "image"), "rb") as f:
+            return len(f.read())
+
+    def thumbnail(digest: str) -> int:
+        with open(thumbnails.get(digest), "rb") as f:
+            return len(f.read())
+
+    rows = []
+    for name, load_image in [("full resolution", full_resolution),
+                             ("thumbnail, cold", thumbnail),
+                             ("thumbnail, cached", thumbnail)]:
+        latencies, sizes = page_through(memory, args.page_size, load_image)
+        summary = summarize(latencies)
+        rows.append({"images": name, "pages": summary["count"],
+                     "p50_ms": summary["p50"], "p95_ms": summary["p95"],
+                     "kb_per_page": sum(sizes) / len(sizes) / 1024})
+
+    print_table(rows, ["images", "pages", "p50_ms", "p95_ms", "kb_per_page"])
+    print(f"Thumbnail format: {thumbnails.image_format}")
+    write_json(args.json, {"config": vars(args), "results": rows, "thumbnails": thumbnails.stats()})
+    thumbnails.close()
+    store.close()
+    memory.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""GLB size and processing time before and after the model optimization stage.
+
+Builds synthetic models like image-to-3D output: a bumpy sphere emitted as
+an unindexed triangle soup with float normals and UVs, at several densities.
+With --flat, normals are per face, so few vertices can be shared.
+Each is optimized with dedup only, with quantization, and with quantization
+plus a triangle budget; the preview is made in the same pass. The last row
+pushes --concurrent models through the process pool at once.
+
+Usage:
+    python benchmarks/bench_glb.py --segments 64 128 256 --max-triangles 20000 --workers 2
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import print_table, write_json
+
+from utils.glb import GLBOptimizer, GLBOptions, optimize_glb, write_glb
+
+
+def make_model(segments: int, flat: bool = False) -> bytes:
+    """A displaced UV sphere of 4 * segments^2 triangles, three vertices per triangle."""
+    u, v = np.meshgrid(np.linspace(0, np.pi, segments + 1), np.linspace(0, 2 * np.pi, 2 * segments + 1))
+    radius = 1 + 0.05 * np.sin(7 * u) * np.cos(5 * v)
+    grid = np.stack([radius * np.sin(u) * np.cos(v), radius * np.sin(u) * np.sin(v), radius * np.cos(u)], -1)
+    positions = grid.reshape(-1, 3).astype(np.float32)
+    uvs = np.stack([v / (2 * np.pi), u / np.pi], -1).reshape(-1, 2).astype(np.float32)
+
+    rows, cols = u.shape
+    index = np.arange(rows * cols).reshape(rows, cols)
+    a, b, c, d = index[:-1, :-1], index[1:, :-1], index[:-1, 1:], index[1:, 1:]
+    triangles = np.concatenate([np.stack([a, b, c], -1).reshape(-1, 3), np.stack([c, b, d], -1).reshape(-1, 3)])
+
+    corners = triangles.reshape(-1)
+    soup = positions[corners]
+    if flat:
+        normals = np.repeat(np.cross(soup[1::3] - soup[0::3], soup[2::3] - soup[0::3]), 3, axis=0)
+    else:
+        normals = soup.copy()
+    normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+    arrays = [soup, normals.astype(np.float32), uvs[corners]]
+
+    offset, views, accessors = 0, [], []
+    for i, array in enumerate(arrays):
+        views.append({"buffer": 0, "byteOffset": offset, "byteLength": array.nbytes, "target": 34962})
+        accessors.append({"bufferView": i, "componentType": 5126, "count": len(array),
+                          "type": "VEC3" if array.shape[1] == 3 else "VEC2"})
+        offset += array.nbytes
+    accessors[0].update(min=soup.min(axis=0).tolist(), max=soup.max(axis=0).tolist())
+    gltf = {
+        "asset": {"version": "2.0"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0, "NORMAL": 1, "TEXCOORD_0": 2}}]}],
+        "bufferViews": views,
+        "accessors": accessors
+    }
+    return write_glb(gltf, b"".join(array.tobytes() for array in arrays))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--segments", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--max-triangles", type=int, default=20000)
+    parser.add_argument("--preview-triangles", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrent", type=int, default=8)
+    parser.add_argument("--flat", action="store_true", help="Per-face normals")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    variants = [
+        ("dedup", GLBOptions(quantize=False, preview_triangles=args.preview_triangles)),
+        ("quantize", GLBOptions(preview_triangles=args.preview_triangles)),
+        ("quantize+budget", GLBOptions(max_triangles=args.max_triangles, preview_triangles=args.preview_triangles)),
+    ]
+    rows = []
+    for segments in args.segments:
+        model = make_model(segments, args.flat)
+        for name, options in variants:
+            stats = optimize_glb(model, options)["stats"]
+            rows.append({
+                "model": f"{stats['triangles_in']} tris",
+                "variant": name,
+                "input_kb": stats["input_bytes"] / 1024,
+                "output_kb": stats["output_bytes"] / 1024,
+                "ratio": stats["ratio"],
+                "triangles_out": stats["triangles_out"],
+                "preview_kb": stats["preview_bytes"] / 1024,
+                "seconds": stats["seconds"]
+            })
+
+    # Throughput of the pool, as the pipeline uses it
+    model = make_model(args.segments[-1], args.flat)
+    optimizer = GLBOptimizer(variants[1][1], workers=args.workers)
+    optimizer.optimize(model)  # start the workers outside the timing
+    start = time.perf_counter()
+    futures = [optimizer.submit(model) for _ in range(args.concurrent)]
+    results = [future.result()["stats"] for future in futures]
+    elapsed = time.perf_counter() - start
+    optimizer.close()
+    rows.append({
+        "model": f"{args.concurrent} x {results[0]['triangles_in']} tris",
+        "variant": f"pool of {args.workers}",
+        "input_kb": sum(r["input_bytes"] for r in results) / 1024,
+        "output_kb": sum(r["output_bytes"] for r in results) / 1024,
+        "ratio": sum(r["output_bytes"] for r in results) / sum(r["input_bytes"] for r in results),
+        "triangles_out": results[0]["triangles_out"],
+        "preview_kb": sum(r["preview_bytes"] for r in results) / 1024,
+        "seconds": elapsed
+    })
+
+    print_table(rows, ["model", "variant", "input_kb", "output_kb", "ratio", "triangles_out", "preview_kb",
+                       "seconds"])
+    write_json(args.json, {"config": vars(args), "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Tokens/sec and resident memory of each LLM backend.
+
+Each backend is loaded in its own subprocess so its RSS is measured in
+isolation. Backends whose model or library is unavailable are reported
+with the error instead of numbers.
+
+Usage:
+    python benchmarks/bench_llm_backends.py --model deepseek-ai/deepseek-coder-6.7b-base \
+        --gguf models/deepseek-coder-6.7b-base.Q4_K_M.gguf --threads 8 --prompts 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import print_table, write_json
+
+PROMPTS = [
+    "A glowing dragon standing on a cliff at sunset",
+    "A quiet library inside a giant tree",
+    "A robot painting a portrait in the rain",
+    "A lighthouse on a floating island",
+]
+
+
+def run_backend(args: argparse.Namespace) -> dict:
+    """Load one backend and time enhancement calls; runs inside the subprocess."""
+    from llm.backends import create_llm_handler
+    from utils.system import current_rss_bytes, peak_rss_bytes
+
+    model = args.gguf if args.worker == "llama_cpp" else args.model
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    handler = create_llm_handler(args.worker, model, deterministic=True, num_threads=args.threads)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = current_rss_bytes()
+
+    handler.enhance_prompt(PROMPTS[0])  # warm-up
+    tokens_before = handler.generated_tokens
+    start = time.perf_counter()
+    for i in range(args.prompts):
+        handler.enhance_prompt(PROMPTS[i % len(PROMPTS)])
+    elapsed = time.perf_counter() - start
+    tokens = handler.generated_tokens - tokens_before
+
+    return {
+        "backend": args.worker,
+        "load_seconds": load_seconds,
+        "tokens_per_sec": tokens / elapsed if elapsed else 0.0,
+        "seconds_per_prompt": elapsed / args.prompts,
+        "model_rss_mib": (rss_loaded - rss_before) / 2**20,
+        "peak_rss_mib": peak_rss_bytes() / 2**20
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="deepseek-ai/deepseek-coder-6.7b-base",
+                        help="Hugging Face model for the transformers and quantized backends")
+    parser.add_argument("--gguf", help="GGUF file for the llama_cpp backend; skipped if not given")
+    parser.add_argument("--threads", type=int, default=0, help="0 uses every core")
+    parser.add_argument("--prompts", type=int, default=8)
+    parser.add_argument("--backends", default="transformers,quantized,llama_cpp")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args)))
+        return
+
+    rows = []
+    for backend in args.backends.split(","):
+        if backend == "llama_cpp" and not args.gguf:
+            rows.append({"backend": backend, "error": "no --gguf file given"})
+            continue
+        command = [sys.executable, os.path.abspath(__file__), "--worker", backend,
+                   "--model", args.model, "--threads", str(args.threads), "--prompts", str(args.prompts)]
+        if args.gguf:
+            command += ["--gguf", args.gguf]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"
+            rows.append({"backend": backend, "error": error})
+        else:
+            rows.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print_table(rows, ["backend", "load_seconds", "tokens_per_sec", "seconds_per_prompt",
+                       "model_rss_mib", "peak_rss_mib", "error"])
+    write_json(args.json, {"config": vars(args), "results": rows})
+
+
+if __name__ == "__main__":
+    main()
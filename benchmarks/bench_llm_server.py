@@ -0,0 +1,123 @@
+"""Total resident memory of N API workers: a model per worker vs one shared LLM server.
+
+Without the server every worker process loads its own LLM handler. With it,
+one llm.server process owns the model and each worker holds an LLMClient.
+Workers run concurrently and send --requests enhancements each, so the
+server-side batching shows up in the per-request latency.
+
+Usage:
+    python benchmarks/bench_llm_server.py --model deepseek-ai/deepseek-coder-6.7b-base --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import print_table, write_json
+
+from utils.system import process_rss_bytes
+
+PROMPTS = [
+    "A glowing dragon standing on a cliff at sunset",
+    "A quiet library inside a giant tree",
+    "A robot painting a portrait in the rain",
+    "A lighthouse on a floating island",
+]
+
+
+def run_worker(args: argparse.Namespace) -> dict:
+    """Get an LLM the way one API worker would and time enhancements; runs inside the subprocess."""
+    from utils.system import current_rss_bytes
+
+    if args.worker == "client":
+        from llm.server import LLMClient
+        llm_handler = LLMClient(args.address, connect_timeout=args.connect_timeout)
+    else:
+        from llm.backends import create_llm_handler
+        llm_handler = create_llm_handler(args.backend, args.model, deterministic=True)
+
+    start = time.perf_counter()
+    for i in range(args.requests):
+        llm_handler.enhance_prompt(PROMPTS[i % len(PROMPTS)])
+    elapsed = time.perf_counter() - start
+    return {"rss_bytes": current_rss_bytes(), "seconds_per_request": elapsed / args.requests}
+
+
+def run_workers(args: argparse.Namespace, mode: str, address: str = "") -> list:
+    command = [sys.executable, os.path.abspath(__file__), "--worker", mode, "--model", args.model,
+               "--backend", args.backend, "--requests", str(args.requests), "--address", address,
+               "--connect-timeout", str(args.connect_timeout)]
+    processes = [subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                 for _ in range(args.workers)]
+    results = []
+    for process in processes:
+        stdout, stderr = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(stderr.strip().splitlines()[-1] if stderr.strip() else "worker failed")
+        results.append(json.loads(stdout.strip().splitlines()[-1]))
+    return results
+
+
+def summarize_run(name: str, workers: list, server_rss: int = 0) -> dict:
+    worker_rss = sum(w["rss_bytes"] for w in workers)
+    return {
+        "setup": name,
+        "workers": len(workers),
+        "server_rss_mib": server_rss / 2**20,
+        "worker_rss_mib": worker_rss / 2**20,
+        "total_rss_mib": (server_rss + worker_rss) / 2**20,
+        "seconds_per_request": sum(w["seconds_per_request"] for w in workers) / len(workers)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="deepseek-ai/deepseek-coder-6.7b-base")
+    parser.add_argument("--backend", default="transformers")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=4, help="Enhancements per worker")
+    parser.add_argument("--connect-timeout", type=float, default=600.0)
+    parser.add_argument("--address", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    rows = []
+    try:
+        rows.append(summarize_run("model per worker", run_workers(args, "local")))
+    except RuntimeError as e:
+        # Typically out of memory with several copies of a large model
+        rows.append({"setup": "model per worker", "workers": args.workers, "error": str(e)})
+
+    workdir = tempfile.mkdtemp(prefix="bench_llm_server_")
+    address = os.path.join(workdir, "llm.sock")
+    # Inherited by the server, which writes its key there, and by the workers that read it
+    os.environ["LLM_SERVER_AUTHKEY_FILE"] = os.path.join(workdir, "llm.key")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "llm.server", "--address", address, "--model", args.model,
+         "--backend", args.backend, "--deterministic", "--no-cache"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    try:
+        workers = run_workers(args, "client", address)
+        rows.append(summarize_run("shared server", workers, process_rss_bytes(server.pid)))
+    except RuntimeError as e:
+        rows.append({"setup": "shared server", "workers": args.workers, "error": str(e)})
+    finally:
+        server.terminate()
+        server.wait()
+
+    print_table(rows, ["setup", "workers", "server_rss_mib", "worker_rss_mib", "total_rss_mib",
+                       "seconds_per_request", "error"])
+    write_json(args.json, {"config": vars(args), "results": rows})
+
+
+if __name__ == "__main__":
+    main()
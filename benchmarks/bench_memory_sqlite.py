@@ -0,0 +1,160 @@
+"""Insert throughput and lookup latency of the SQLite memory backend.
+
+Fills a fresh database with --rows creations through batched save_creations,
+measures single save_creation calls through the pool against the old
+connect-per-call path, then times id lookups and history pages: the first
+page of a session, a deep page reached by keyset cursor, and the same deep
+page fetched with OFFSET for comparison.
+
+Usage:
+    python benchmarks/bench_memory_sqlite.py --rows 1000000 --batch-size 1000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from common import print_table, summarize, write_json
+
+from memory.memory_handler import MemoryHandler
+
+
+def make_creation(session_id: str) -> dict:
+    creation_id = str(uuid.uuid4())
+    return {
+        "creation_id": creation_id,
+        "session_id": session_id,
+        "prompt": f"a glowing dragon on a cliff at sunset, variation {creation_id[:8]}",
+        "image_path": f"static/images/{creation_id}.png",
+        "model_path": f"static/models/{creation_id}.glb",
+        "metadata": {"original_prompt": "a glowing dragon", "reference_id": None}
+    }
+
+
+def legacy_save(db_path: str, creation: dict) -> None:
+    # What save_creation did before the pool: a new connection per call
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT OR REPLACE INTO creations "
+        "(id, session_id, prompt, image_path, model_path, metadata, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (creation["creation_id"], creation["session_id"], creation["prompt"],
+         creation["image_path"], creation["model_path"], json.dumps(creation["metadata"]),
+         datetime.now().isoformat())
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeats: int) -> list:
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--single-inserts", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_memory_sqlite_"))
+    memory = MemoryHandler("sqlite", db_path="memory/creative_memory.db")
+    rng = random.Random(0)
+    sessions = [str(uuid.uuid4()) for _ in range(args.sessions)]
+    ids = []
+
+    start = time.perf_counter()
+    for offset in range(0, args.rows, args.batch_size):
+        batch = [make_creation(rng.choice(sessions))
+                 for _ in range(min(args.batch_size, args.rows - offset))]
+        memory.save_creations(batch)
+        ids.append(batch[0]["creation_id"])
+    bulk_seconds = time.perf_counter() - start
+
+    sample = [make_creation(rng.choice(sessions)) for _ in range(args.single_inserts)]
+    start = time.perf_counter()
+    for creation in sample:
+        memory.save_creation(**creation)
+    pooled_seconds = time.perf_counter() - start
+
+    sample = [make_creation(rng.choice(sessions)) for _ in range(args.single_inserts)]
+    start = time.perf_counter()
+    for creation in sample:
+        legacy_save(memory.db_path, creation)
+    legacy_seconds = time.perf_counter() - start
+
+    inserts = [
+        {"path": f"save_creations x{args.batch_size}", "rows": args.rows,
+         "inserts_per_sec": args.rows / bulk_seconds},
+        {"path": "save_creation (pooled)", "rows": args.single_inserts,
+         "inserts_per_sec": args.single_inserts / pooled_seconds},
+        {"path": "save_creation (connect per call)", "rows": args.single_inserts,
+         "inserts_per_sec": args.single_inserts / legacy_seconds},
+    ]
+    print_table(inserts, ["path", "rows", "inserts_per_sec"])
+    print()
+
+    # A deep page: walk one session's history by cursor, then fetch the same
+    # rows with OFFSET to show what keyset pagination avoids
+    busiest = sessions[0]
+    cursor, depth = None, 0
+    for _ in range(20):
+        page = memory.list_session_creations(busiest, args.page_size, cursor)
+        if not page["next_cursor"]:
+            break
+        cursor, depth = page["next_cursor"], depth + 1
+    recent_cursor = None
+    for _ in range(200):
+        recent_cursor = memory.list_recent(args.page_size, recent_cursor)["next_cursor"]
+    deep_offset = 200 * args.page_size
+
+    def offset_page():
+        with memory.pool.connection() as conn:
+            conn.execute(
+                "SELECT * FROM creations ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                (args.page_size, deep_offset)
+            ).fetchall()
+
+    n = args.lookups
+    lookups = [
+        {"query": "get_creation_by_id",
+         **summarize(timed(lambda: memory.get_creation_by_id(rng.choice(ids)), n))},
+        {"query": "session page 1",
+         **summarize(timed(lambda: memory.list_session_creations(rng.choice(sessions), args.page_size), n))},
+        {"query": f"session page {depth + 1} (cursor)",
+         **summarize(timed(lambda: memory.list_session_creations(busiest, args.page_size, cursor), n))},
+        {"query": "recent page 1",
+         **summarize(timed(lambda: memory.list_recent(args.page_size), n))},
+        {"query": "recent page 201 (cursor)",
+         **summarize(timed(lambda: memory.list_recent(args.page_size, recent_cursor), n))},
+        {"query": "recent page 201 (OFFSET)",
+         **summarize(timed(offset_page, max(1, n // 10)))},
+    ]
+    print_table(lookups, ["query", "count", "p50", "p95", "p99"])
+    print("(latencies in ms)")
+
+    memory.close()
+    write_json(args.json, {
+        "config": vars(args),
+        "inserts": inserts,
+        "lookups_ms": lookups,
+        "db_bytes": os.path.getsize(memory.db_path)
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Tail latency and success rate of Openfabric calls, raw Stub vs OpenfabricClient.
+
+The fake apps inject slow calls and failures so the effect of timeouts,
+retries and hedging shows up offline.
+
+Usage:
+    python benchmarks/bench_openfabric.py --calls 200 --tail-probability 0.05 \
+        --tail-latency 1.0 --error-rate 0.05 --hedge-delay 0.15
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import print_table, summarize, write_json
+from fakes import TEXT_TO_IMAGE_APP, FakeStub
+
+from pipeline.openfabric_client import OpenfabricClient
+
+
+def run(label: str, call, n_calls: int, concurrency: int) -> dict:
+    latencies = []
+    failures = 0
+
+    def one(_: int) -> None:
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            call()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            failures += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n_calls)))
+
+    latency = summarize(latencies)
+    return {
+        "client": label,
+        "success_rate": (n_calls - failures) / n_calls,
+        "p50_s": latency["p50"],
+        "p95_s": latency["p95"],
+        "p99_s": latency["p99"]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--tail-probability", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--hedge-delay", type=float, default=0.15)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    def make_stub() -> FakeStub:
+        return FakeStub(
+            default_latency=args.latency,
+            default_payload_size=1024,
+            tail_probability=args.tail_probability,
+            tail_latency=args.tail_latency,
+            error_rate=args.error_rate,
+            seed=0
+        )
+
+    payload = {"prompt": "a glowing dragon"}
+    rows = []
+
+    stub = make_stub()
+    rows.append(run("raw stub", lambda: stub.call(TEXT_TO_IMAGE_APP, payload, "super-user"),
+                    args.calls, args.concurrency))
+
+    for label, hedge_delay in (("retries", 0.0), ("retries+hedging", args.hedge_delay)):
+        client = OpenfabricClient(
+            make_stub(),
+            default_timeout=args.timeout,
+            max_concurrency=args.concurrency * 2,
+            retries=args.retries,
+            backoff_base=0.05,
+            hedge_apps=[TEXT_TO_IMAGE_APP],
+            hedge_delay=hedge_delay,
+            # Keep the breaker out of the way of an intentionally flaky stand-in
+            breaker_threshold=args.calls
+        )
+        rows.append(run(label, lambda: client.call(TEXT_TO_IMAGE_APP, payload), args.calls, args.concurrency))
+        rows[-1]["hedges"] = client.stats()[TEXT_TO_IMAGE_APP]["hedges"]
+        client.close()
+
+    print_table(rows, ["client", "success_rate", "p50_s", "p95_s", "p99_s", "hedges"])
+    write_json(args.json, {"config": vars(args), "results": rows})
+
+
+if __name__ == "__main__":
+    main()
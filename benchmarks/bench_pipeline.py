@@ -0,0 +1,241 @@
+"""End-to-end benchmark of PipelineHandler.process_creation, fully offline.
+
+Runs the real pipeline (LLM handler, batching, artifact store, memory)
+against a tiny local causal LM, a fake Openfabric Stub with configurable
+latencies and payload sizes, and each MemoryHandler backend. Vector and
+hybrid memory use the fake embedder. Reports per-stage p50/p95/p99
+latency, creations/sec at each concurrency, peak RSS and bytes written to
+disk.
+
+Each memory backend runs in its own subprocess so peak RSS is measured in
+isolation. Results carry the git commit; pass --compare with the JSON of
+an earlier run to print the change per row.
+
+Usage:
+    python benchmarks/bench_pipeline.py --creations 32 --concurrency 1,4,8 --json pipeline.json
+    python benchmarks/bench_pipeline.py --model /path/to/model --compare pipeline.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import print_table, summarize, write_json
+from fakes import IMAGE_TO_3D_APP, TEXT_TO_IMAGE_APP, FakeEmbeddingFunction, FakeStub, build_tiny_lm
+
+STAGES = ["enhance", "image", "3d", "persist"]
+SUBJECTS = ["dragon", "castle", "robot", "forest", "lighthouse", "spaceship", "library", "fox"]
+STYLES = ["at sunset", "in the rain", "made of glass", "low poly", "watercolor", "neon lit"]
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def build_pipeline(args: argparse.Namespace, memory_type: str):
+    """Wire the handlers as the registry does, with the fake Stub and embedder."""
+    from llm.backends import create_llm_handler
+    from llm.processor import BatchProcessor
+    from memory.memory_handler import MemoryHandler
+    from pipeline.pipeline_handler import PipelineHandler
+
+    stub = FakeStub(
+        latencies={TEXT_TO_IMAGE_APP: args.image_seconds, IMAGE_TO_3D_APP: args.model_seconds},
+        payload_sizes={TEXT_TO_IMAGE_APP: args.image_kib * 1024, IMAGE_TO_3D_APP: args.model_kib * 1024}
+    )
+    llm_handler = create_llm_handler("transformers", args.model, deterministic=True, num_threads=args.threads)
+    if args.batch_size > 1:
+        llm_handler = BatchProcessor(llm_handler, max_batch_size=args.batch_size, max_wait_ms=20.0)
+    memory_handler = MemoryHandler(
+        memory_type,
+        vector_db_path=os.path.abspath("memory/vector_store"),
+        embedding_function=FakeEmbeddingFunction()
+    )
+    pipeline = PipelineHandler(
+        stub=stub,
+        llm_handler=llm_handler,
+        memory_handler=memory_handler,
+        config={"app_ids": [TEXT_TO_IMAGE_APP, IMAGE_TO_3D_APP], "llm_max_batch_size": args.batch_size}
+    )
+    return pipeline, stub
+
+
+def run_level(pipeline, concurrency: int, prompts: list) -> dict:
+    """Run every prompt at a fixed number of concurrent creations."""
+    stage_seconds = {stage: [] for stage in STAGES}
+    totals = []
+    failures = []
+    lock = threading.Lock()
+
+    def progress(stage: str, status: str, info: dict) -> None:
+        if status == "finished":
+            with lock:
+                stage_seconds[stage].append(info["seconds"])
+
+    def one(prompt: str) -> None:
+        start = time.perf_counter()
+        try:
+            pipeline.process_creation(prompt, progress=progress)
+        except Exception as e:
+            with lock:
+                failures.append(str(e))
+            return
+        with lock:
+            totals.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, prompts))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "creations": len(totals),
+        "failures": len(failures),
+        "creations_per_sec": len(totals) / elapsed if elapsed else 0.0,
+        "total": summarize(totals),
+        "stages": {stage: summarize(values) for stage, values in stage_seconds.items()}
+    }
+
+
+def run_backend(args: argparse.Namespace) -> dict:
+    """Benchmark one memory backend; runs inside the subprocess."""
+    from utils.system import peak_rss_bytes
+
+    os.chdir(tempfile.mkdtemp(prefix=f"bench_pipeline_{args.worker}_"))
+    pipeline, stub = build_pipeline(args, args.worker)
+    pipeline.process_creation("warm-up creation")
+    bytes_before = directory_bytes(".")
+
+    levels = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        prompts = [
+            f"a {SUBJECTS[i % len(SUBJECTS)]} {STYLES[(i // len(SUBJECTS)) % len(STYLES)]}, take {concurrency}-{i}"
+            for i in range(args.creations)
+        ]
+        levels.append(run_level(pipeline, concurrency, prompts))
+
+    # Closing flushes the index buffer and pending artifact writes
+    pipeline.close()
+    return {
+        "memory_type": args.worker,
+        "levels": levels,
+        "openfabric_calls": stub.calls,
+        "disk_bytes_written": directory_bytes(".") - bytes_before,
+        "peak_rss_mib": peak_rss_bytes() / 2**20
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def flatten(results: list) -> list:
+    """One row per backend and concurrency, for the table and for comparisons."""
+    rows = []
+    for result in results:
+        if "error" in result:
+            rows.append({"memory_type": result["memory_type"], "error": result["error"]})
+            continue
+        for level in result["levels"]:
+            row = {
+                "memory_type": result["memory_type"],
+                "concurrency": level["concurrency"],
+                "creations_per_sec": level["creations_per_sec"],
+                "failures": level["failures"],
+                "p50_s": level["total"]["p50"],
+                "p95_s": level["total"]["p95"],
+                "p99_s": level["total"]["p99"],
+                "peak_rss_mib": result["peak_rss_mib"],
+                "disk_mib": result["disk_bytes_written"] / 2**20
+            }
+            for stage in STAGES:
+                row[f"{stage}_p95_s"] = level["stages"][stage]["p95"]
+            rows.append(row)
+    return rows
+
+
+def compare(rows: list, path: str) -> None:
+    with open(path) as f:
+        previous = json.load(f)
+    before = {(r["memory_type"], r.get("concurrency")): r for r in flatten(previous["results"])}
+    changes = []
+    for row in rows:
+        old = before.get((row["memory_type"], row.get("concurrency")))
+        if not old or "error" in row or "error" in old:
+            continue
+        changes.append({
+            "memory_type": row["memory_type"],
+            "concurrency": row["concurrency"],
+            "creations_per_sec_change": row["creations_per_sec"] / old["creations_per_sec"] - 1
+                if old["creations_per_sec"] else None,
+            "p95_change": row["p95_s"] / old["p95_s"] - 1 if old["p95_s"] else None,
+            "peak_rss_mib_change": row["peak_rss_mib"] - old["peak_rss_mib"]
+        })
+    print(f"\nCompared with {previous.get('commit') or path}:")
+    print_table(changes, ["memory_type", "concurrency", "creations_per_sec_change", "p95_change", "peak_rss_mib_change"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", help="Local causal LM; a tiny random GPT-2 is built if not given")
+    parser.add_argument("--memory-types", default="sqlite,vector,hybrid")
+    parser.add_argument("--creations", type=int, default=32, help="Creations per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,8")
+    parser.add_argument("--batch-size", type=int, default=8, help="LLM micro-batch size; 1 disables batching")
+    parser.add_argument("--threads", type=int, default=0, help="Torch threads; 0 uses every core")
+    parser.add_argument("--image-seconds", type=float, default=0.2)
+    parser.add_argument("--model-seconds", type=float, default=0.4)
+    parser.add_argument("--image-kib", type=int, default=256)
+    parser.add_argument("--model-kib", type=int, default=1024)
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args)))
+        return
+
+    if not args.model:
+        args.model = build_tiny_lm(os.path.join(tempfile.gettempdir(), "bench_tiny_lm"))
+
+    results = []
+    for memory_type in args.memory_types.split(","):
+        command = [sys.executable, os.path.abspath(__file__), "--worker", memory_type]
+        for name, value in vars(args).items():
+            if name not in ("worker", "json", "compare", "memory_types") and value is not None:
+                command += [f"--{name.replace('_', '-')}", str(value)]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"
+            results.append({"memory_type": memory_type, "error": error})
+        else:
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    rows = flatten(results)
+    print_table(rows, ["memory_type", "concurrency", "creations_per_sec", "failures", "p50_s", "p95_s", "p99_s",
+                       *[f"{stage}_p95_s" for stage in STAGES], "peak_rss_mib", "disk_mib", "error"])
+    if args.compare:
+        compare(rows, args.compare)
+    write_json(args.json, {"commit": git_commit(), "config": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Per-request prefill time with and without the cached system-prompt prefix.
+
+Usage:
+    python benchmarks/bench_prefix_cache.py --model sshleifer/tiny-gpt2 --runs 20
+"""
+import argparse
+import copy
+import time
+
+import torch
+
+from common import print_table, summarize, write_json
+
+from llm.llm_handler import LLMHandler
+
+
+PROMPTS = [
+    "A glowing dragon standing on a cliff at sunset",
+    "A quiet library inside a giant tree",
+    "A robot painting a portrait in the rain",
+]
+
+
+def prefill_seconds(llm_handler: LLMHandler, prompt: str, cached: bool) -> float:
+    """Time the forward pass that precedes the first generated token."""
+    prefix_text, suffix_text = llm_handler._enhance_parts(prompt)
+    prefix_ids, past_key_values = llm_handler._get_prefix(prefix_text)
+    suffix_ids = llm_handler.tokenizer(
+        suffix_text, return_tensors="pt", add_special_tokens=False
+    ).input_ids.to(llm_handler.device)
+
+    with torch.no_grad():
+        if cached:
+            past = copy.deepcopy(past_key_values)
+            start = time.perf_counter()
+            llm_handler.model(suffix_ids, past_key_values=past, use_cache=True)
+        else:
+            input_ids = torch.cat([prefix_ids, suffix_ids], dim=-1)
+            start = time.perf_counter()
+            llm_handler.model(input_ids, use_cache=True)
+    return time.perf_counter() - start
+
+
+def request_seconds(llm_handler: LLMHandler, prompt: str, cached: bool) -> float:
+    llm_handler.use_prefix_cache = cached
+    start = time.perf_counter()
+    llm_handler.enhance_prompt(prompt)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    llm_handler = LLMHandler(args.model)
+    prompts = [PROMPTS[i % len(PROMPTS)] for i in range(args.runs)]
+
+    rows = []
+    for cached in (False, True):
+        prefill = summarize([prefill_seconds(llm_handler, p, cached) for p in prompts])
+        request = summarize([request_seconds(llm_handler, p, cached) for p in prompts])
+        rows.append({
+            "prefix_cache": "on" if cached else "off",
+            "prefill_p50_ms": prefill["p50"] * 1000,
+            "prefill_p95_ms": prefill["p95"] * 1000,
+            "request_p50_s": request["p50"],
+            "request_p95_s": request["p95"]
+        })
+
+    print_table(rows, ["prefix_cache", "prefill_p50_ms", "prefill_p95_ms", "request_p50_s", "request_p95_s"])
+    write_json(args.json, {"model": args.model, "runs": args.runs, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Openfabric calls and latency with the near-duplicate short-circuit on and off.
+
+A share of the prompts are reworded repeats of earlier ones (the same words
+in a different order), which the fake embedder maps to the same vector.
+Each reuse mode runs the same workload against a fresh hybrid memory.
+
+Usage:
+    python benchmarks/bench_reuse.py --creations 60 --duplicate-ratio 0.4
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from common import print_table, summarize, write_json
+from fakes import FakeEmbeddingFunction, FakeLLM, FakeStub
+
+from memory.memory_handler import MemoryHandler
+from pipeline.pipeline_handler import PipelineHandler
+
+WORDS = ["dragon", "castle", "robot", "forest", "ocean", "glass", "neon", "sunset", "storm",
+         "garden", "tower", "desert", "crystal", "engine", "temple", "river", "moon", "fox"]
+
+
+def make_prompts(count: int, duplicate_ratio: float, rng: random.Random) -> list:
+    prompts = []
+    for _ in range(count):
+        if prompts and rng.random() < duplicate_ratio:
+            words = rng.choice(prompts).split()
+            rng.shuffle(words)
+            prompts.append(" ".join(words))
+        else:
+            prompts.append(" ".join(rng.sample(WORDS, 4)))
+    return prompts
+
+
+def run(mode: str, prompts: list, args: argparse.Namespace) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_reuse_{mode}_")
+    os.chdir(workdir)
+    stub = FakeStub(default_latency=args.openfabric_seconds, default_payload_size=64 * 1024, deterministic=True)
+    memory = MemoryHandler(
+        # Absolute paths: Chroma caches clients by path across runs in one process
+        "hybrid", db_path="memory/creative_memory.db", vector_db_path=os.path.join(workdir, "memory/vector_store"),
+        embedding_function=FakeEmbeddingFunction(call_seconds=0.0, item_seconds=0.0)
+    )
+    pipeline = PipelineHandler(
+        stub=stub,
+        llm_handler=FakeLLM(enhance_seconds=0.0),
+        memory_handler=memory,
+        config={"reuse_mode": mode, "reuse_threshold": args.threshold}
+    )
+
+    latencies = []
+    start = time.perf_counter()
+    for prompt in prompts:
+        began = time.perf_counter()
+        pipeline.process_creation(prompt)
+        latencies.append(time.perf_counter() - began)
+        # Make the creation searchable before the next request, as a quiet period would
+        memory.index_buffer.flush()
+    elapsed = time.perf_counter() - start
+
+    stats = pipeline.reuse_stats()
+    pipeline.close()
+    return {
+        "mode": mode,
+        "openfabric_calls": stub.calls,
+        "calls_saved": stats["openfabric_calls_saved"],
+        "reuse_rate": stats["reuse_rate"],
+        "creations_per_sec": len(prompts) / elapsed,
+        "p50_seconds": summarize(latencies)["p50"]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--creations", type=int, default=60)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.4)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--openfabric-seconds", type=float, default=0.05)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    prompts = make_prompts(args.creations, args.duplicate_ratio, random.Random(0))
+    rows = [run(mode, prompts, args) for mode in ("off", "model", "full")]
+    print_table(rows, ["mode", "openfabric_calls", "calls_saved", "reuse_rate", "creations_per_sec", "p50_seconds"])
+    write_json(args.json, {"config": vars(args), "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Lookup latency and hit rates with the short-term memory tier on and off.
+
+Replays a trace of interleaved sessions against a hybrid memory preloaded
+with --history older creations. Each session step saves a new creation,
+looks one up by id to use as a reference (usually one made earlier in the
+same session, sometimes an old one), or runs a similarity query (usually a
+reworded repeat of a recent prompt, which the fake embedder maps to the same
+vector). The same trace runs with the tier off, on, and on with write-behind.
+
+Usage:
+    python benchmarks/bench_short_term.py --sessions 50 --steps 2000 --history 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+from common import print_table, summarize, write_json
+from fakes import FakeEmbeddingFunction
+
+from memory.memory_handler import MemoryHandler
+
+WORDS = ["dragon", "castle", "robot", "forest", "ocean", "glass", "neon", "sunset", "storm",
+         "garden", "tower", "desert", "crystal", "engine", "temple", "river", "moon", "fox"]
+
+
+def make_trace(args: argparse.Namespace, rng: random.Random) -> tuple:
+    """Build (history, steps): older creations, then (operation, payload) session steps."""
+    history = [
+        {"creation_id": str(uuid.uuid4()), "session_id": f"old-{i % 500}", "prompt": " ".join(rng.sample(WORDS, 4))}
+        for i in range(args.history)
+    ]
+    recent = defaultdict(list)
+    steps = []
+    for _ in range(args.steps):
+        session_id = f"session-{rng.randrange(args.sessions)}"
+        own = recent[session_id]
+        roll = rng.random()
+        if not own or roll < 0.4:
+            creation = {"creation_id": str(uuid.uuid4()), "session_id": session_id,
+                        "prompt": " ".join(rng.sample(WORDS, 4))}
+            own.append(creation)
+            steps.append(("save", creation))
+        elif roll < 0.7:
+            source = own[-rng.randint(1, min(5, len(own)))] if rng.random() < 0.9 else rng.choice(history)
+            steps.append(("get", source["creation_id"]))
+        else:
+            if rng.random() < 0.8:
+                words = rng.choice(own[-5:])["prompt"].split()
+                rng.shuffle(words)
+                steps.append(("similar", (session_id, " ".join(words))))
+            else:
+                steps.append(("similar", (session_id, " ".join(rng.sample(WORDS, 4)))))
+    return history, steps
+
+
+def run(name: str, history: list, steps: list, args: argparse.Namespace, **options) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_short_term_{name.replace(' ', '_')}_")
+    os.chdir(workdir)
+    memory = MemoryHandler(
+        # Absolute paths: Chroma caches clients by path across runs in one process
+        "hybrid", db_path="memory/creative_memory.db", vector_db_path=os.path.join(workdir, "memory/vector_store"),
+        embedding_function=FakeEmbeddingFunction(call_seconds=0.0, item_seconds=0.0),
+        **options
+    )
+    memory.save_creations(history)
+    memory.index_buffer.flush()
+
+    latencies = defaultdict(list)
+    for operation, payload in steps:
+        start = time.perf_counter()
+        if operation == "save":
+            memory.save_creation(**payload)
+        elif operation == "get":
+            memory.get_creation_by_id(payload)
+        else:
+            memory.get_similar_creations(payload[1], n_results=1, session_id=payload[0])
+        latencies[operation].append((time.perf_counter() - start) * 1000)
+
+    stats = memory.stats().get("short_term", {})
+    memory.close()
+    row = {"tier": name}
+    for operation in ("save", "get", "similar"):
+        summary = summarize(latencies[operation])
+        row[f"{operation}_p50_ms"] = summary["p50"]
+        row[f"{operation}_p95_ms"] = summary["p95"]
+    row["get_hit_rate"] = stats.get("hit_rate", 0.0)
+    row["similar_hit_rate"] = stats.get("similar_hit_rate", 0.0)
+    return row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=5000)
+    parser.add_argument("--short-term-size", type=int, default=50)
+    parser.add_argument("--ttl-seconds", type=float, default=3600.0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    history, steps = make_trace(args, random.Random(0))
+    tier = {"short_term_size": args.short_term_size, "short_term_ttl_seconds": args.ttl_seconds}
+    rows = [
+        run("off", history, steps, args),
+        run("on", history, steps, args, **tier),
+        run("on, write-behind", history, steps, args, write_behind=True, **tier),
+    ]
+    print_table(rows, ["tier", "save_p50_ms", "get_p50_ms", "get_p95_ms", "similar_p50_ms", "similar_p95_ms",
+                       "get_hit_rate", "similar_hit_rate"])
+    write_json(args.json, {"config": vars(args), "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Sustained creations per minute: sequential process_creation vs the staged engine.
+
+Usage:
+    python benchmarks/bench_staged.py --creations 12 --llm-seconds 0.5 \
+        --image-seconds 1.0 --model-seconds 1.5
+"""
+import argparse
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+
+from common import print_table, write_json
+from fakes import IMAGE_TO_3D_APP, TEXT_TO_IMAGE_APP, FakeLLM, FakeMemory, FakeStub
+
+from pipeline.pipeline_handler import PipelineHandler
+from pipeline.staged import StagedPipeline
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--creations", type=int, default=12)
+    parser.add_argument("--llm-seconds", type=float, default=0.5)
+    parser.add_argument("--image-seconds", type=float, default=1.0)
+    parser.add_argument("--model-seconds", type=float, default=1.5)
+    parser.add_argument("--enhance-workers", type=int, default=1)
+    parser.add_argument("--image-workers", type=int, default=2)
+    parser.add_argument("--model-workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_staged_"))
+    pipeline = PipelineHandler(
+        stub=FakeStub(latencies={TEXT_TO_IMAGE_APP: args.image_seconds, IMAGE_TO_3D_APP: args.model_seconds}),
+        llm_handler=FakeLLM(enhance_seconds=args.llm_seconds),
+        memory_handler=FakeMemory(),
+        config={}
+    )
+    prompts = [f"prompt {i}" for i in range(args.creations)]
+
+    start = time.perf_counter()
+    for prompt in prompts:
+        pipeline.process_creation(prompt)
+    sequential = time.perf_counter() - start
+
+    staged = StagedPipeline(
+        lambda: nullcontext(pipeline),
+        workers={"enhance": args.enhance_workers, "image": args.image_workers, "3d": args.model_workers},
+        queue_size=args.queue_size
+    )
+    staged.start()
+    start = time.perf_counter()
+    futures = [staged.submit(prompt) for prompt in prompts]
+    for future in futures:
+        future.result()
+    pipelined = time.perf_counter() - start
+    staged.stop()
+    pipeline.close()
+
+    rows = [
+        {"engine": "sequential", "wall_s": sequential, "creations_per_min": 60 * args.creations / sequential},
+        {"engine": "staged", "wall_s": pipelined, "creations_per_min": 60 * args.creations / pipelined},
+    ]
+    print_table(rows, ["engine", "wall_s", "creations_per_min"])
+    print(f"Speed-up: {sequential / pipelined:.2f}x")
+    write_json(args.json, {"config": vars(args), "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Time to first feedback for blocking vs streamed prompt enhancement.
+
+Also reports the average generated length with and without stop sequences,
+since stopping early is where most of the saved decode time comes from.
+
+Usage:
+    python benchmarks/bench_streaming.py --model sshleifer/tiny-gpt2 --runs 10
+"""
+import argparse
+import time
+
+from common import print_table, summarize, write_json
+
+from llm.llm_handler import ENHANCE_STOP_SEQUENCES, LLMHandler
+
+
+PROMPTS = [
+    "A glowing dragon standing on a cliff at sunset",
+    "A quiet library inside a giant tree",
+    "A robot painting a portrait in the rain",
+]
+
+
+def measure(llm_handler: LLMHandler, prompts, stream: bool, stop_sequences) -> dict:
+    first_feedback = []
+    totals = []
+    lengths = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        if stream:
+            first = None
+            pieces = []
+            for piece in llm_handler.stream_enhance_prompt(prompt, stop_sequences=stop_sequences):
+                if first is None:
+                    first = time.perf_counter() - start
+                pieces.append(piece)
+            text = "".join(pieces)
+        else:
+            inputs = [llm_handler._enhance_parts(prompt)]
+            text = llm_handler._generate(inputs, max_new_tokens=150, stop_sequences=stop_sequences)[0]
+            first = time.perf_counter() - start
+        totals.append(time.perf_counter() - start)
+        first_feedback.append(first if first is not None else totals[-1])
+        lengths.append(len(llm_handler.tokenizer(text, add_special_tokens=False).input_ids))
+    return {
+        "mode": "stream" if stream else "blocking",
+        "stops": "on" if stop_sequences else "off",
+        "first_feedback_p50_s": summarize(first_feedback)["p50"],
+        "total_p50_s": summarize(totals)["p50"],
+        "avg_generated_tokens": sum(lengths) / len(lengths)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    llm_handler = LLMHandler(args.model)
+    prompts = [PROMPTS[i % len(PROMPTS)] for i in range(args.runs)]
+
+    rows = [
+        measure(llm_handler, prompts, stream=False, stop_sequences=()),
+        measure(llm_handler, prompts, stream=False, stop_sequences=ENHANCE_STOP_SEQUENCES),
+        measure(llm_handler, prompts, stream=True, stop_sequences=ENHANCE_STOP_SEQUENCES),
+    ]
+    print_table(rows, ["mode", "stops", "first_feedback_p50_s", "total_p50_s", "avg_generated_tokens"])
+    write_json(args.json, {"model": args.model, "runs": args.runs, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
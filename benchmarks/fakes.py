@@ -0,0 +1,166 @@
+"""In-process stand-ins for the LLM, Openfabric Stub and memory store.
+
+They sleep instead of computing so benchmarks measure the pipeline's
+scheduling, I/O and bookkeeping rather than model quality.
+"""
+import hashlib
+import os
+import random
+import string
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+# App ids of the production configuration in main.py
+TEXT_TO_IMAGE_APP = "f0997a01-d6d3-a5fe-53d8-561300318557"
+IMAGE_TO_3D_APP = "69543f29-4d41-4afc-7f29-3d51591f11eb"
+
+class FakeLLM:
+    def __init__(self, enhance_seconds: float = 0.2, analyze_seconds: float = 0.2):
+        self.model_name = "fake-llm"
+        self.sampling_params = {"do_sample": False}
+        self.enhance_seconds = enhance_seconds
+        self.analyze_seconds = analyze_seconds
+
+    def enhance_prompt(self, prompt: str, style_guide: Optional[Dict] = None) -> str:
+        time.sleep(self.enhance_seconds)
+        return f"{prompt}, dramatic lighting, highly detailed"
+
+    def analyze_reference(self, reference_prompt: str, new_prompt: str) -> Dict:
+        time.sleep(self.analyze_seconds)
+        return {
+            "analysis": "Keep the palette, change the subject.",
+            "reference_prompt": reference_prompt,
+            "new_prompt": new_prompt
+        }
+
+
+class FakeStub:
+    """Local stand-in for the Openfabric apps behind Stub.call.
+
+    Each app has a base latency and payload size. Tail behaviour is injected
+    per call: with tail_probability a call takes tail_latency instead, and
+    with error_rate it raises after its latency, like a remote failure.
+    """
+
+    def __init__(self,
+                 latencies: Optional[Dict[str, float]] = None,
+                 payload_sizes: Optional[Dict[str, int]] = None,
+                 default_latency: float = 0.5,
+                 default_payload_size: int = 256 * 1024,
+                 deterministic: bool = False,
+                 tail_probability: float = 0.0,
+                 tail_latency: float = 0.0,
+                 error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latencies = latencies or {}
+        # Deterministic outputs depend only on the input, like a seeded remote app
+        self.deterministic = deterministic
+        self.payload_sizes = payload_sizes or {}
+        self.default_latency = default_latency
+        self.default_payload_size = default_payload_size
+        self.tail_probability = tail_probability
+        self.tail_latency = tail_latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self, app_id: str, data: Dict[str, Any], uid: str) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+            slow = self._random.random() < self.tail_probability
+            fail = self._random.random() < self.error_rate
+        time.sleep(self.tail_latency if slow else self.latencies.get(app_id, self.default_latency))
+        if fail:
+            with self._lock:
+                self.errors += 1
+            raise ConnectionError(f"Injected failure from app {app_id}")
+
+        size = self.payload_sizes.get(app_id, self.default_payload_size)
+        if self.deterministic:
+            seed = hashlib.sha256(repr(sorted(data.items())).encode()).hexdigest()
+        else:
+            # Vary the content per call so outputs are not trivially identical
+            seed = str(time.perf_counter_ns())
+        return {"result": seed.encode().ljust(size, b"\0")}
+
+
+class FakeEmbeddingFunction:
+    """Hashes words into a fixed-size vector. Each call costs call_seconds plus
+    item_seconds per text, like a model whose per-call overhead batching amortizes."""
+
+    def __init__(self, dimensions: int = 384, call_seconds: float = 0.01, item_seconds: float = 0.001):
+        self.dimensions = dimensions
+        self.call_seconds = call_seconds
+        self.item_seconds = item_seconds
+        self.calls = 0
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.call_seconds + self.item_seconds * len(input))
+        vectors = []
+        for text in input:
+            vector = [0.0] * self.dimensions
+            for word in re.findall(r"\w+", text.lower()):
+                vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimensions] += 1.0
+            norm = sum(x * x for x in vector) ** 0.5 or 1.0
+            vectors.append([x / norm for x in vector])
+        return vectors
+
+
+class FakeMemory:
+    def __init__(self):
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def save_creation(self, creation_id: str, session_id: str, prompt: str,
+                      image_path: Optional[str] = None, model_path: Optional[str] = None,
+                      metadata: Optional[Dict] = None) -> None:
+        with self._lock:
+            self.records[creation_id] = {
+                "id": creation_id,
+                "session_id": session_id,
+                "prompt": prompt,
+                "image_path": image_path,
+                "model_path": model_path,
+                "metadata": metadata or {}
+            }
+
+    def get_creation_by_id(self, creation_id: str) -> Optional[Dict[str, Any]]:
+        return self.records.get(creation_id)
+
+    def get_similar_creations(self,
+                              prompt: str,
+                              n_results: int = 5,
+                              session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+def build_tiny_lm(path: str, layers: int = 2, hidden_size: int = 64) -> str:
+    """Save a randomly initialized GPT-2 with a character tokenizer to path.
+
+    It runs the real transformers code path (tokenizer, prefix cache,
+    generate) at a tiny fraction of a real model's cost, without a download.
+    """
+    if os.path.exists(os.path.join(path, "config.json")):
+        return path
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+    vocab = {token: i for i, token in enumerate(["<eos>", "<unk>", "\n", "\t"] + list(string.printable[:95]))}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split("", "isolated")
+    tokenizer.decoder = decoders.Fuse()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<eos>", unk_token="<unk>").save_pretrained(path)
+
+    config = GPT2Config(vocab_size=len(vocab), n_embd=hidden_size, n_layer=layers, n_head=2,
+                        bos_token_id=0, eos_token_id=0)
+    GPT2LMHeadModel(config).save_pretrained(path)
+    return path
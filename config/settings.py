@@ -0,0 +1,48 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+@dataclass
+class RetentionPolicy:
+    """Which creations the retention task expires, and how hard it may work.
+
+    A creation expires when it is older than max_age_days, beyond the
+    max_per_session newest of its session, or among the oldest while the
+    stored artifacts exceed max_artifact_bytes. Limits left as None do not
+    apply, so the default policy only compacts. With archive_dir set,
+    expired records and their last-referenced files are moved there instead
+    of deleted.
+    """
+    max_age_days: Optional[float] = None
+    max_per_session: Optional[int] = None
+    max_artifact_bytes: Optional[int] = None
+    archive_dir: Optional[str] = None
+    # Throttling: creations per batch, pause between batches, batches per run
+    batch_size: int = 100
+    pause_seconds: float = 0.5
+    max_batches_per_run: int = 50
+    interval_seconds: float = 6 * 3600
+    # Compaction after a run that expired anything
+    vacuum: bool = True
+    # Advise `python -m memory.cli rebuild-index` once this share of the
+    # similarity index has been deleted; the task never rebuilds the live index
+    index_rebuild_ratio: float = 0.2
+
+
+RETENTION_POLICY = RetentionPolicy(
+    max_age_days=_env_float("RETENTION_MAX_AGE_DAYS"),
+    max_per_session=_env_int("RETENTION_MAX_PER_SESSION"),
+    max_artifact_bytes=_env_int("RETENTION_MAX_ARTIFACT_BYTES"),
+    archive_dir=os.getenv("RETENTION_ARCHIVE_DIR") or None
+)
@@ -0,0 +1,150 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import torch
+
+from llm.llm_handler import LLMHandler
+from llm.prompts import truncate_at_stop
+
+
+class QuantizedLLMHandler(LLMHandler):
+    """Transformers backend with every Linear layer dynamically quantized to int8.
+
+    Weights are stored as int8 and activations are quantized on the fly, which
+    roughly quarters the memory of the Linear layers and speeds up CPU matmuls.
+    Quantization only applies on CPU; on GPU this behaves like LLMHandler.
+    """
+
+    def _load_model(self) -> None:
+        super()._load_model()
+        if self.device != "cpu":
+            logging.warning("Dynamic int8 quantization is CPU-only; using the unquantized model")
+            return
+        # In place, so the fp32 Linear weights are freed rather than copied
+        torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class LlamaCppHandler(LLMHandler):
+    """GGUF backend running on llama.cpp through llama-cpp-python.
+
+    model_name is either a path to a .gguf file or a Hugging Face repo id,
+    in which case gguf_file (a glob, 4-bit Q4_K_M by default) picks the file
+    to download from it. Prefix caching uses llama.cpp's own state cache
+    rather than torch KV tensors.
+    """
+
+    def __init__(self,
+                 model_name: str = "TheBloke/Llama-2-7B-Chat-GGUF",
+                 use_prefix_cache: bool = True,
+                 max_cached_prefixes: int = 16,
+                 deterministic: bool = False,
+                 num_threads: int = 0,
+                 gguf_file: Optional[str] = None,
+                 context_length: int = 2048):
+        self.gguf_file = gguf_file
+        self.context_length = context_length
+        self._model_lock = threading.Lock()
+        super().__init__(model_name, use_prefix_cache, max_cached_prefixes, deterministic, num_threads)
+
+    def _load_model(self) -> None:
+        try:
+            from llama_cpp import Llama, LlamaRAMCache
+        except ImportError:
+            raise RuntimeError("The llama_cpp backend needs llama-cpp-python: pip install llama-cpp-python")
+
+        self.device = "cpu"
+        options = {
+            "n_ctx": self.context_length,
+            "n_threads": self.num_threads or os.cpu_count(),
+            "verbose": False
+        }
+        if os.path.exists(self.model_name):
+            self.model = Llama(model_path=self.model_name, **options)
+        else:
+            self.model = Llama.from_pretrained(repo_id=self.model_name, filename=self.gguf_file or "*Q4_K_M.gguf", **options)
+        if self.use_prefix_cache:
+            # States are stored per evaluated prompt and looked up by longest common prefix
+            self.model.set_cache(LlamaRAMCache(capacity_bytes=2 << 30))
+
+    def precompute_prefixes(self, style_guides: Optional[List[Dict]] = None) -> None:
+        """Evaluate the system prompts once so their states land in llama.cpp's cache."""
+        prefixes = [self._enhance_parts("")[0], self._analysis_parts("", "")[0], self._fused_parts("", "")[0]]
+        prefixes += [self._enhance_parts("", style_guide)[0] for style_guide in style_guides or []]
+        for prefix in prefixes:
+            for _ in self._stream(prefix, "", 1, ()):
+                pass
+
+    @property
+    def sampling_params(self) -> Dict[str, Any]:
+        if self.deterministic:
+            return {"temperature": 0.0}
+        return {"temperature": 0.7, "top_p": 0.9}
+
+    def _generate(self,
+                  inputs: List[Tuple[str, str]],
+                  max_new_tokens: int,
+                  stop_sequences: Sequence[str] = ()) -> List[str]:
+        # llama.cpp evaluates one sequence at a time; the shared prefix is
+        # reused from its cache, so only each suffix is prefilled
+        results = []
+        for prefix, suffix in inputs:
+            text = ""
+            pieces = self._stream(prefix, suffix, max_new_tokens, stop_sequences)
+            for piece in pieces:
+                text += piece
+                if truncate_at_stop(text, stop_sequences) != text.strip():
+                    break
+            pieces.close()
+            self.generations += 1
+            results.append(truncate_at_stop(text, stop_sequences))
+        return results
+
+    def _stream(self,
+                prefix_text: str,
+                suffix_text: str,
+                max_new_tokens: int,
+                stop_sequences: Sequence[str]) -> Iterator[str]:
+        # Stop sequences are matched by the caller: llama.cpp's own stop
+        # matching would end on the newline that often leads the output
+        with self._model_lock:
+            started = time.perf_counter()
+            first_token_at = None
+            generated_tokens = 0
+            completion = self.model.create_completion(
+                prefix_text + suffix_text,
+                max_tokens=max_new_tokens,
+                stream=True,
+                **self.sampling_params
+            )
+            try:
+                for chunk in completion:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    generated_tokens += 1
+                    self.generated_tokens += 1
+                    yield chunk["choices"][0]["text"]
+            finally:
+                # Leaving the generator early stops generation
+                completion.close()
+                prompt_tokens = len(self.model.tokenize((prefix_text + suffix_text).encode("utf-8")))
+                self._record_generation(prompt_tokens, generated_tokens, started, first_token_at)
+
+
+LLM_BACKENDS = {
+    "transformers": LLMHandler,
+    "quantized": QuantizedLLMHandler,
+    "llama_cpp": LlamaCppHandler,
+}
+
+
+def create_llm_handler(backend: str, model_name: str, **kwargs: Any) -> LLMHandler:
+    """Build the LLM handler for a backend name from LLM_BACKENDS."""
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unsupported LLM backend: {backend}")
+    if backend != "llama_cpp":
+        kwargs.pop("gguf_file", None)
+        kwargs.pop("context_length", None)
+    return LLM_BACKENDS[backend](model_name, **kwargs)
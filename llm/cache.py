@@ -0,0 +1,217 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+from llm.prompts import ANALYSIS_FAILED, ENHANCE_STOP_SEQUENCES
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse case and whitespace so trivially different prompts share a cache entry."""
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+
+class PromptCache:
+    """In-process LRU with TTL, backed by a persistent SQLite table."""
+
+    def __init__(self,
+                 db_path: str = "memory/llm_cache.db",
+                 max_entries: int = 1024,
+                 ttl_seconds: float = 7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        try:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    expires_at REAL
+                )
+            ''')
+            self._conn.commit()
+        except Exception as e:
+            logging.error(f"Error initializing LLM cache: {str(e)}")
+            raise RuntimeError(f"Failed to initialize LLM cache: {str(e)}")
+
+    @staticmethod
+    def make_key(kind: str, model_name: str, sampling_params: Dict[str, Any], *parts: Any) -> str:
+        payload = json.dumps(
+            [kind, model_name, sampling_params, *parts],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+                self.evictions += 1
+
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row and row[1] > now:
+                value = json.loads(row[0])
+                self._remember(key, row[1], value)
+                self.disk_hits += 1
+                return value
+            if row:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, value)
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                self._conn.commit()
+            except Exception as e:
+                # The in-process tier still serves the entry
+                logging.error(f"Error persisting LLM cache entry: {str(e)}")
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+
+class CachedLLM:
+    """Serves enhance_prompt / analyze_reference from a PromptCache before calling the LLM."""
+
+    def __init__(self, llm_handler: Any, cache: PromptCache):
+        self.llm_handler = llm_handler
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm_handler, name)
+
+    def _key(self, kind: str, *parts: Any) -> str:
+        return self.cache.make_key(
+            kind,
+            self.llm_handler.model_name,
+            self.llm_handler.sampling_params,
+            *parts
+        )
+
+    def enhance_prompt(self, prompt: str, style_guide: Optional[Dict] = None) -> str:
+        """Enhance the user's prompt, reusing a cached enhancement when one exists."""
+        key = self._key("enhance", normalize_prompt(prompt), style_guide)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        enhanced_prompt = self.llm_handler.enhance_prompt(prompt, style_guide)
+        if enhanced_prompt != prompt:  # do not cache the fallback
+            self.cache.set(key, enhanced_prompt)
+        return enhanced_prompt
+
+    def stream_enhance_prompt(self,
+                              prompt: str,
+                              style_guide: Optional[Dict] = None,
+                              stop_sequences: Sequence[str] = ENHANCE_STOP_SEQUENCES) -> Iterator[str]:
+        """Stream the enhancement; a cached one is yielded whole."""
+        # Cached enhancements were cut at the default stop sequences
+        cacheable = tuple(stop_sequences) == tuple(ENHANCE_STOP_SEQUENCES)
+        key = self._key("enhance", normalize_prompt(prompt), style_guide)
+        cached = self.cache.get(key) if cacheable else None
+        if cached is not None:
+            yield cached
+            return
+
+        pieces = []
+        for piece in self.llm_handler.stream_enhance_prompt(prompt, style_guide, stop_sequences):
+            pieces.append(piece)
+            yield piece
+        enhanced_prompt = "".join(pieces).strip()
+        if cacheable and enhanced_prompt and enhanced_prompt != prompt:
+            self.cache.set(key, enhanced_prompt)
+
+    def analyze_reference(self, reference_prompt: str, new_prompt: str) -> Dict:
+        """Analyze a reference relationship, reusing a cached analysis when one exists."""
+        key = self._key("analyze", normalize_prompt(reference_prompt), normalize_prompt(new_prompt))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {
+                "analysis": cached,
+                "reference_prompt": reference_prompt,
+                "new_prompt": new_prompt
+            }
+
+        result = self.llm_handler.analyze_reference(reference_prompt, new_prompt)
+        if result["analysis"] != ANALYSIS_FAILED:
+            self.cache.set(key, result["analysis"])
+        return result
+
+    def enhance_with_reference(self, reference_prompt: str, prompt: str) -> Dict:
+        """Fused enhance-and-analyze, reusing a cached result when one exists."""
+        key = self._key("fused", normalize_prompt(reference_prompt), normalize_prompt(prompt))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {
+                "enhanced_prompt": cached["enhanced_prompt"],
+                "analysis": {
+                    "analysis": cached["analysis"],
+                    "reference_prompt": reference_prompt,
+                    "new_prompt": cached["enhanced_prompt"]
+                }
+            }
+
+        result = self.llm_handler.enhance_with_reference(reference_prompt, prompt)
+        # Neither fallback is worth keeping
+        if result["enhanced_prompt"] != prompt and result["analysis"]["analysis"] != ANALYSIS_FAILED:
+            self.cache.set(key, {
+                "enhanced_prompt": result["enhanced_prompt"],
+                "analysis": result["analysis"]["analysis"]
+            })
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        inner = getattr(self.llm_handler, "stats", None)
+        return {"cache": self.cache.stats(), **(inner() if callable(inner) else {})}
@@ -1,107 +1,477 @@
+import copy
 import os
-from typing import Dict, Optional
-from transformers import AutoModelForCausalLM, AutoTokenizer
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer
+)
 import torch
 import logging
 
+from llm.prompts import (
+    ANALYSIS_FAILED,
+    ANALYSIS_STOP_SEQUENCES,
+    ANALYSIS_SYSTEM_PROMPT,
+    ENHANCE_STOP_SEQUENCES,
+    ENHANCE_SYSTEM_PROMPT,
+    FUSED_STOP_SEQUENCES,
+    FUSED_SYSTEM_PROMPT,
+    longest_stop,
+    parse_fused,
+    truncate_at_stop
+)
+from utils.metrics import metrics
+
+PROMPT_TOKENS = metrics.counter("llm_prompt_tokens_total", "Prompt tokens fed to the LLM", ["model"])
+GENERATED_TOKENS = metrics.counter("llm_generated_tokens_total", "Tokens generated by the LLM", ["model"])
+PREFILL_SECONDS = metrics.histogram(
+    "llm_prefill_seconds", "Time from the start of a generation to its first new token", ["model"]
+)
+DECODE_SECONDS = metrics.histogram("llm_decode_seconds", "Time spent generating after the first token", ["model"])
+DECODE_TOKENS_PER_SECOND = metrics.histogram(
+    "llm_decode_tokens_per_second", "Decode throughput of each generation", ["model"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+
+
+class _FirstTokenTimer(StoppingCriteria):
+    """Notes when generate produces its first token, which ends the prefill; never stops."""
+
+    def __init__(self):
+        self.first_token_at: Optional[float] = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+
+class _StopOnSequences(StoppingCriteria):
+    """Stops each row once its generated text contains a stop sequence."""
+
+    def __init__(self, tokenizer, prompt_length: int, stop_sequences: Sequence[str]):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.stop_sequences = stop_sequences
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        return torch.tensor(
+            [any(stop in text.lstrip() for stop in self.stop_sequences) for text in texts],
+            dtype=torch.bool,
+            device=input_ids.device
+        )
+
 
 class LLMHandler:
-    def __init__(self, model_name: str = "TheBloke/Llama-2-7B-Chat-GGML"):
+    def __init__(self,
+                 model_name: str = "deepseek-ai/deepseek-coder-6.7b-base",
+                 use_prefix_cache: bool = True,
+                 max_cached_prefixes: int = 16,
+                 deterministic: bool = False,
+                 num_threads: int = 0):
         self.model_name = model_name
+        self.deterministic = deterministic
+        self.num_threads = num_threads
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.use_prefix_cache = use_prefix_cache
+        self.max_cached_prefixes = max_cached_prefixes
+        self._prefix_cache: "OrderedDict[str, Tuple[torch.Tensor, Any]]" = OrderedDict()
+        self._prefix_lock = threading.Lock()
+        self.generations = 0
+        self.generated_tokens = 0
+        # Running totals, so a long-lived handler keeps no per-stream history
+        self.streams = 0
+        self.stream_ttft_total = 0.0
+        self.fused_requests = 0
+        self.fused_fallbacks = 0
         
         try:
             logging.info(f"Loading {model_name} on {self.device}...")
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            self.model = AutoModelForCausalLM.from_pretrained(
-                model_name,
-                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-                device_map="auto",
-                low_cpu_mem_usage=True
-            )
+            self._load_model()
             logging.info("Model loaded successfully")
+
+            if self.use_prefix_cache:
+                self.precompute_prefixes()
         except Exception as e:
             logging.error(f"Error loading model: {str(e)}")
             raise RuntimeError(f"Failed to load model: {str(e)}")
     
+    def _load_model(self) -> None:
+        """Load the tokenizer and model. Backends override this and the generation hooks."""
+        if self.num_threads > 0:
+            torch.set_num_threads(self.num_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # Left padding keeps every prompt flush with its generated tokens in a batch
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(
+            self.model_name,
+            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+            device_map="auto",
+            low_cpu_mem_usage=True
+        )
+    
+    # Prefixes end on the system prompt's last character and suffixes start with
+    # the blank line: a trailing run of whitespace would be one token on its own
+    # but split differently once the suffix follows, so the cached prefix tokens
+    # would not match the full prompt's.
+
+    @staticmethod
+    def _enhance_parts(prompt: str, style_guide: Optional[Dict] = None) -> Tuple[str, str]:
+        """Split an enhancement input into its constant prefix and per-request suffix."""
+        system_prompt = ENHANCE_SYSTEM_PROMPT
+        if style_guide:
+            system_prompt += f"\nStyle preferences: {style_guide}"
+        return system_prompt, f"\n\nOriginal prompt: {prompt}\nEnhanced prompt:"
+
+    @staticmethod
+    def _analysis_parts(reference_prompt: str, new_prompt: str) -> Tuple[str, str]:
+        """Split an analysis input into its constant prefix and per-request suffix."""
+        return ANALYSIS_SYSTEM_PROMPT, f"\n\nReference: {reference_prompt}\nNew prompt: {new_prompt}\nAnalysis:"
+
+    @staticmethod
+    def _fused_parts(reference_prompt: str, prompt: str) -> Tuple[str, str]:
+        """Split a fused enhance-and-analyze input into its constant prefix and per-request suffix."""
+        return FUSED_SYSTEM_PROMPT, f"\n\nReference: {reference_prompt}\nNew prompt: {prompt}\nEnhanced prompt:"
+
+    def _get_prefix(self, prefix_text: str) -> Tuple[torch.Tensor, Any]:
+        """Return the token ids and KV cache of a system prompt, computing it on first use."""
+        with self._prefix_lock:
+            if prefix_text in self._prefix_cache:
+                self._prefix_cache.move_to_end(prefix_text)
+                return self._prefix_cache[prefix_text]
+
+            prefix_ids = self.tokenizer(prefix_text, return_tensors="pt").input_ids.to(self.device)
+            with torch.no_grad():
+                past_key_values = self.model(prefix_ids, use_cache=True).past_key_values
+
+            self._prefix_cache[prefix_text] = (prefix_ids, past_key_values)
+            if len(self._prefix_cache) > self.max_cached_prefixes:
+                self._prefix_cache.popitem(last=False)
+            return prefix_ids, past_key_values
+
+    def precompute_prefixes(self, style_guides: Optional[List[Dict]] = None) -> None:
+        """Prefill the system prompts once so requests only encode their own text."""
+        self._get_prefix(self._enhance_parts("")[0])
+        self._get_prefix(self._analysis_parts("", "")[0])
+        self._get_prefix(self._fused_parts("", "")[0])
+        for style_guide in style_guides or []:
+            self._get_prefix(self._enhance_parts("", style_guide)[0])
+
+    @property
+    def sampling_params(self) -> Dict[str, Any]:
+        """Decoding settings; greedy when deterministic so repeated prompts give identical output."""
+        if self.deterministic:
+            return {"do_sample": False}
+        return {"do_sample": True, "temperature": 0.7, "top_p": 0.9}
+
+    def _prepare_cached(self, inputs: List[Tuple[str, str]]) -> Optional[Dict[str, Any]]:
+        """Generate arguments that continue every row from one cached system prompt.
+
+        Returns None when the rows have different prefixes, or when a prefix's
+        tokens are not the start of its full prompt's, so the caller prefills in full.
+        """
+        prefix_text = inputs[0][0]
+        if any(prefix != prefix_text for prefix, _ in inputs):
+            return None
+        prefix_ids, past_key_values = self._get_prefix(prefix_text)
+        prefix_length = prefix_ids.shape[1]
+
+        # Tokenized whole, so every row gets exactly the tokens an uncached call would
+        rows = []
+        for _, suffix_text in inputs:
+            ids = self.tokenizer(prefix_text + suffix_text).input_ids
+            if ids[:prefix_length] != prefix_ids[0].tolist():
+                return None
+            rows.append(ids[prefix_length:])
+
+        # Left padding sits between the prefix and the suffix, masked out
+        width = max(len(ids) for ids in rows)
+        suffix_ids = torch.tensor(
+            [[self.tokenizer.pad_token_id] * (width - len(ids)) + ids for ids in rows], device=self.device
+        )
+        suffix_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in rows], device=self.device)
+        batch_size = len(rows)
+        input_ids = torch.cat([prefix_ids.expand(batch_size, -1), suffix_ids], dim=-1)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.cat([torch.ones_like(prefix_ids).expand(batch_size, -1), suffix_mask], dim=-1),
+            "past_key_values": self._copy_prefix_cache(past_key_values, batch_size)
+        }
+
+    @staticmethod
+    def _copy_prefix_cache(past_key_values: Any, batch_size: int) -> Any:
+        """One copy of a cached prefix per generate call (which extends it in place), with a row per input."""
+        if isinstance(past_key_values, tuple):
+            # Legacy layout: repeat_interleave already allocates the copy
+            return tuple(
+                tuple(tensor.repeat_interleave(batch_size, dim=0) for tensor in layer)
+                for layer in past_key_values
+            )
+        cache = copy.deepcopy(past_key_values)
+        if batch_size > 1:
+            cache.batch_repeat_interleave(batch_size)
+        return cache
+
+    def _generate(self,
+                  inputs: List[Tuple[str, str]],
+                  max_new_tokens: int,
+                  stop_sequences: Sequence[str] = ()) -> List[str]:
+        """Run one generate call over (prefix, suffix) inputs and decode the new tokens of each row."""
+        # Continue from the cached system prompt; only the suffixes are prefilled
+        model_inputs = self._prepare_cached(inputs) if self.use_prefix_cache else None
+        if model_inputs is None:
+            model_inputs = self.tokenizer(
+                [prefix + suffix for prefix, suffix in inputs],
+                return_tensors="pt",
+                padding=True
+            ).to(self.device)
+
+        prompt_length = model_inputs["input_ids"].shape[1]
+        timer = _FirstTokenTimer()
+        stopping_criteria = StoppingCriteriaList([timer])
+        if stop_sequences:
+            stopping_criteria.append(_StopOnSequences(self.tokenizer, prompt_length, stop_sequences))
+
+        started = time.perf_counter()
+        with torch.no_grad():
+            outputs = self.model.generate(
+                **model_inputs,
+                max_new_tokens=max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                stopping_criteria=stopping_criteria,
+                **self.sampling_params
+            )
+
+        # Only the generated slice; the prompt never needs decoding
+        generated = outputs[:, prompt_length:]
+        generated_tokens = int((generated != self.tokenizer.pad_token_id).sum())
+        self.generated_tokens += generated_tokens
+        self.generations += len(inputs)
+        self._record_generation(int(model_inputs["attention_mask"].sum()), generated_tokens,
+                                started, timer.first_token_at)
+        return [
+            truncate_at_stop(text, stop_sequences)
+            for text in self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+        ]
+
+    def stream_enhance_prompt(self,
+                              prompt: str,
+                              style_guide: Optional[Dict] = None,
+                              stop_sequences: Sequence[str] = ENHANCE_STOP_SEQUENCES) -> Iterator[str]:
+        """Yield the enhanced prompt piece by piece as tokens are generated.
+
+        Generation ends at the first stop sequence, which is not yielded.
+        """
+        prefix_text, suffix_text = self._enhance_parts(prompt, style_guide)
+        pieces = self._stream(prefix_text, suffix_text, 150, stop_sequences)
+        start = time.perf_counter()
+
+        text = ""
+        emitted = 0
+        first_token_at = None
+        try:
+            for piece in pieces:
+                if first_token_at is None and piece:
+                    first_token_at = time.perf_counter()
+                text += piece
+                visible = truncate_at_stop(text, stop_sequences)
+                stopped = len(visible) < len(text.strip())
+                # Hold back trailing text that could be the start of a stop sequence
+                safe = len(visible) if stopped else max(len(visible) - longest_stop(stop_sequences), emitted)
+                if safe > emitted:
+                    yield visible[emitted:safe]
+                    emitted = safe
+                if stopped:
+                    break
+            else:
+                visible = truncate_at_stop(text, stop_sequences)
+                if len(visible) > emitted:
+                    yield visible[emitted:]
+        finally:
+            pieces.close()
+            if first_token_at is not None:
+                self.streams += 1
+                self.stream_ttft_total += first_token_at - start
+
+    def _stream(self,
+                prefix_text: str,
+                suffix_text: str,
+                max_new_tokens: int,
+                stop_sequences: Sequence[str]) -> Iterator[str]:
+        """Yield raw generated text as it is produced; the caller handles stop sequences."""
+        model_inputs = self._prepare_cached([(prefix_text, suffix_text)]) if self.use_prefix_cache else None
+        if model_inputs is None:
+            model_inputs = self.tokenizer(prefix_text + suffix_text, return_tensors="pt").to(self.device)
+        prompt_length = model_inputs["input_ids"].shape[1]
+
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        timer = _FirstTokenTimer()
+        stopping_criteria = StoppingCriteriaList(
+            [timer] + ([_StopOnSequences(self.tokenizer, prompt_length, stop_sequences)] if stop_sequences else [])
+        )
+        outputs = []
+
+        def generate() -> None:
+            with torch.no_grad():
+                outputs.append(self.model.generate(
+                    **model_inputs,
+                    max_new_tokens=max_new_tokens,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    stopping_criteria=stopping_criteria,
+                    streamer=streamer,
+                    **self.sampling_params
+                ))
+
+        started = time.perf_counter()
+        thread = threading.Thread(target=generate, name="llm-stream", daemon=True)
+        thread.start()
+        try:
+            yield from streamer
+        finally:
+            # The stopping criteria end generation at the stop sequence, so this is short
+            thread.join()
+            if outputs:
+                self._record_generation(prompt_length, outputs[0].shape[1] - prompt_length,
+                                        started, timer.first_token_at)
+
+    def _record_generation(self,
+                           prompt_tokens: int,
+                           generated_tokens: int,
+                           started: float,
+                           first_token_at: Optional[float]) -> None:
+        """Export token counts and the prefill/decode split of one generation."""
+        finished = time.perf_counter()
+        first_token_at = first_token_at or finished
+        PROMPT_TOKENS.inc(prompt_tokens, model=self.model_name)
+        GENERATED_TOKENS.inc(generated_tokens, model=self.model_name)
+        PREFILL_SECONDS.observe(first_token_at - started, model=self.model_name)
+        DECODE_SECONDS.observe(finished - first_token_at, model=self.model_name)
+        if generated_tokens > 1 and finished > first_token_at:
+            # The first token comes out of the prefill pass
+            DECODE_TOKENS_PER_SECOND.observe((generated_tokens - 1) / (finished - first_token_at),
+                                             model=self.model_name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "generations": self.generations,
+            "avg_generated_tokens": self.generated_tokens / self.generations if self.generations else 0.0,
+            "streams": self.streams,
+            "avg_time_to_first_token_seconds": self.stream_ttft_total / self.streams if self.streams else 0.0,
+            "fused_requests": self.fused_requests,
+            "fused_fallbacks": self.fused_fallbacks
+        }
+
     def enhance_prompt(self, prompt: str, style_guide: Optional[Dict] = None) -> str:
         """Enhance the user's prompt with more artistic and detailed descriptions."""
+        return self.enhance_prompts([prompt], [style_guide])[0]
+
+    def enhance_prompts(self,
+                        prompts: List[str],
+                        style_guides: Optional[List[Optional[Dict]]] = None) -> List[str]:
+        """Enhance several prompts with a single batched generation."""
+        style_guides = style_guides or [None] * len(prompts)
         try:
-            system_prompt = """You are a creative AI assistant specialized in enhancing text prompts for image generation.
-Your task is to expand the given prompt with rich, artistic details while maintaining the original intent.
-Focus on visual elements like lighting, mood, composition, colors, and artistic style.
-Keep the enhanced prompt concise but descriptive."""
-
-            if style_guide:
-                system_prompt += f"\nStyle preferences: {style_guide}"
-            
-            input_text = f"{system_prompt}\n\nOriginal prompt: {prompt}\nEnhanced prompt:"
-            
-            inputs = self.tokenizer(input_text, return_tensors="pt").to(self.device)
-            
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=150,
-                    temperature=0.7,
-                    top_p=0.9,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.eos_token_id
-                )
-            
-            enhanced_prompt = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            enhanced_prompt = enhanced_prompt.split("Enhanced prompt:")[-1].strip()
-            
-            if not enhanced_prompt:
-                return prompt  # Fallback to original prompt if enhancement fails
-                
-            return enhanced_prompt
-            
+            inputs = [
+                self._enhance_parts(prompt, style_guide)
+                for prompt, style_guide in zip(prompts, style_guides)
+            ]
+            decoded = self._generate(inputs, max_new_tokens=150, stop_sequences=ENHANCE_STOP_SEQUENCES)
+
+            enhanced_prompts = []
+            for prompt, enhanced_prompt in zip(prompts, decoded):
+                # Fallback to original prompt if enhancement fails
+                enhanced_prompts.append(enhanced_prompt or prompt)
+            return enhanced_prompts
+
         except Exception as e:
             logging.error(f"Error enhancing prompt: {str(e)}")
-            return prompt  # Fallback to original prompt
-    
+            return list(prompts)  # Fallback to original prompts
+
     def analyze_reference(self, reference_prompt: str, new_prompt: str) -> Dict:
         """Analyze the relationship between a reference creation and a new prompt."""
+        return self.analyze_references([(reference_prompt, new_prompt)])[0]
+
+    def analyze_references(self, pairs: List[Tuple[str, str]]) -> List[Dict]:
+        """Analyze several (reference, new prompt) pairs with a single batched generation."""
         try:
-            system_prompt = """Analyze the relationship between a reference creation and a new prompt.
-Extract key differences and similarities in terms of:
-1. Subject matter
-2. Style
-3. Mood
-4. Composition
-Return specific aspects that should be maintained or modified."""
-
-            input_text = f"{system_prompt}\n\nReference: {reference_prompt}\nNew prompt: {new_prompt}\nAnalysis:"
-            
-            inputs = self.tokenizer(input_text, return_tensors="pt").to(self.device)
-            
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=200,
-                    temperature=0.7,
-                    top_p=0.9,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.eos_token_id
-                )
-            
-            analysis = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            analysis = analysis.split("Analysis:")[-1].strip()
-            
-            if not analysis:
-                analysis = "No significant relationships found."
-            
-            return {
-                "analysis": analysis,
-                "reference_prompt": reference_prompt,
-                "new_prompt": new_prompt
-            }
-            
+            inputs = [
+                self._analysis_parts(reference_prompt, new_prompt)
+                for reference_prompt, new_prompt in pairs
+            ]
+            decoded = self._generate(inputs, max_new_tokens=200, stop_sequences=ANALYSIS_STOP_SEQUENCES)
+
+            results = []
+            for (reference_prompt, new_prompt), analysis in zip(pairs, decoded):
+                if not analysis:
+                    analysis = "No significant relationships found."
+                results.append({
+                    "analysis": analysis,
+                    "reference_prompt": reference_prompt,
+                    "new_prompt": new_prompt
+                })
+            return results
+
         except Exception as e:
             logging.error(f"Error analyzing reference: {str(e)}")
-            return {
-                "analysis": "Failed to analyze relationship.",
-                "reference_prompt": reference_prompt,
-                "new_prompt": new_prompt
-            } 
\ No newline at end of file
+            return [
+                {
+                    "analysis": ANALYSIS_FAILED,
+                    "reference_prompt": reference_prompt,
+                    "new_prompt": new_prompt
+                }
+                for reference_prompt, new_prompt in pairs
+            ]
+
+    def enhance_with_reference(self, reference_prompt: str, prompt: str) -> Dict:
+        """Enhance a prompt and analyze its reference creation in a single generation.
+
+        Returns the enhanced prompt and an analysis shaped like analyze_reference's.
+        """
+        return self.enhance_with_references([(reference_prompt, prompt)])[0]
+
+    def enhance_with_references(self, pairs: List[Tuple[str, str]]) -> List[Dict]:
+        """Fused enhance-and-analyze over several (reference, new prompt) pairs in one batched generation.
+
+        Rows whose output does not parse into both parts fall back to the
+        separate enhance and analyze generations.
+        """
+        results: List[Optional[Dict]] = [None] * len(pairs)
+        try:
+            inputs = [self._fused_parts(reference_prompt, prompt) for reference_prompt, prompt in pairs]
+            # Both budgets of the two-call path, less the repeated context
+            decoded = self._generate(inputs, max_new_tokens=300, stop_sequences=FUSED_STOP_SEQUENCES)
+            for i, ((reference_prompt, _), text) in enumerate(zip(pairs, decoded)):
+                parsed = parse_fused(text)
+                if parsed:
+                    enhanced_prompt, analysis = parsed
+                    results[i] = {
+                        "enhanced_prompt": enhanced_prompt,
+                        "analysis": {
+                            "analysis": analysis,
+                            "reference_prompt": reference_prompt,
+                            "new_prompt": enhanced_prompt
+                        }
+                    }
+        except Exception as e:
+            logging.error(f"Error in fused enhancement: {str(e)}")
+
+        fallback = [i for i, result in enumerate(results) if result is None]
+        if fallback:
+            self.fused_fallbacks += len(fallback)
+            enhanced_prompts = self.enhance_prompts([pairs[i][1] for i in fallback])
+            analyses = self.analyze_references(
+                [(pairs[i][0], enhanced_prompt) for i, enhanced_prompt in zip(fallback, enhanced_prompts)]
+            )
+            for i, enhanced_prompt, analysis in zip(fallback, enhanced_prompts, analyses):
+                results[i] = {"enhanced_prompt": enhanced_prompt, "analysis": analysis}
+        self.fused_requests += len(pairs)
+        return results
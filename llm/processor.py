@@ -0,0 +1,169 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from llm.prompts import ENHANCE_STOP_SEQUENCES
+
+if TYPE_CHECKING:
+    from llm.llm_handler import LLMHandler
+
+
+class BatchProcessor:
+    """Collects concurrent LLM requests and runs them as batched generate calls.
+
+    Exposes the same enhance_prompt / analyze_reference interface as LLMHandler,
+    so it can be dropped in front of the handler wherever one is expected.
+    """
+
+    def __init__(self,
+                 llm_handler: "LLMHandler",
+                 max_batch_size: int = 8,
+                 max_wait_ms: float = 20.0):
+        self.llm_handler = llm_handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue: "queue.Queue[Optional[Tuple[str, Tuple, Future]]]" = queue.Queue()
+        self._closed = False
+        self.batches_run = 0
+        self.requests_served = 0
+
+        self._worker = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self._worker.start()
+
+    @property
+    def model_name(self) -> str:
+        return self.llm_handler.model_name
+
+    @property
+    def sampling_params(self) -> Dict[str, Any]:
+        return self.llm_handler.sampling_params
+
+    def enhance_prompt(self, prompt: str, style_guide: Optional[Dict] = None) -> str:
+        """Enhance the user's prompt, sharing a generate call with concurrent requests."""
+        return self._submit("enhance", (prompt, style_guide)).result()
+
+    def analyze_reference(self, reference_prompt: str, new_prompt: str) -> Dict:
+        """Analyze a reference relationship, sharing a generate call with concurrent requests."""
+        return self._submit("analyze", (reference_prompt, new_prompt)).result()
+
+    def enhance_with_reference(self, reference_prompt: str, prompt: str) -> Dict:
+        """Fused enhance-and-analyze, sharing a generate call with concurrent requests."""
+        return self._submit("fused", (reference_prompt, prompt)).result()
+
+    def stream_enhance_prompt(self,
+                              prompt: str,
+                              style_guide: Optional[Dict] = None,
+                              stop_sequences: Sequence[str] = ENHANCE_STOP_SEQUENCES) -> Iterator[str]:
+        """Stream the enhanced prompt; it runs on the worker, so never alongside a batch."""
+        pieces: "queue.Queue[Optional[str]]" = queue.Queue()
+        cancelled = threading.Event()
+        future = self._submit("stream", (prompt, style_guide, stop_sequences, pieces, cancelled))
+        try:
+            while True:
+                piece = pieces.get()
+                if piece is None:
+                    break
+                yield piece
+            future.result()
+        finally:
+            # Lets the worker move on if the caller stops reading midway
+            cancelled.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.llm_handler.stats(),
+            "batches_run": self.batches_run,
+            "requests_served": self.requests_served,
+            "avg_batch_size": self.requests_served / self.batches_run if self.batches_run else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0
+        }
+
+    def close(self) -> None:
+        """Stop the worker once the requests already queued have been served."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def _submit(self, kind: str, args: Tuple) -> Future:
+        if self._closed:
+            raise RuntimeError("Batch processor is closed")
+        future: Future = Future()
+        self._queue.put((kind, args, future))
+        return future
+
+    def _collect(self, first: Tuple[str, Tuple, Future]) -> Tuple[List[Tuple[str, Tuple, Future]], bool]:
+        """Gather requests until the batch is full or the time window closes."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stop = self._collect(first)
+
+            # Each kind uses its own prompts and token budget
+            for kind in ("enhance", "analyze", "fused"):
+                items = [item for item in batch if item[0] == kind]
+                if items:
+                    self._run_batch(kind, items)
+            for item in batch:
+                if item[0] == "stream":
+                    self._run_stream(*item[1:])
+
+    def _run_batch(self, kind: str, items: List[Tuple[str, Tuple, Future]]) -> None:
+        try:
+            if kind == "enhance":
+                results = self.llm_handler.enhance_prompts(
+                    [args[0] for _, args, _ in items],
+                    [args[1] for _, args, _ in items]
+                )
+            elif kind == "analyze":
+                results = self.llm_handler.analyze_references([args for _, args, _ in items])
+            else:
+                results = self.llm_handler.enhance_with_references([args for _, args, _ in items])
+
+            self.batches_run += 1
+            self.requests_served += len(items)
+            for (_, _, future), result in zip(items, results):
+                future.set_result(result)
+
+        except Exception as e:
+            logging.error(f"Error running LLM batch: {str(e)}")
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _run_stream(self, args: Tuple, future: Future) -> None:
+        prompt, style_guide, stop_sequences, pieces, cancelled = args
+        stream = self.llm_handler.stream_enhance_prompt(prompt, style_guide, stop_sequences)
+        try:
+            for piece in stream:
+                if cancelled.is_set():
+                    break
+                pieces.put(piece)
+            future.set_result(None)
+        except Exception as e:
+            logging.error(f"Error streaming LLM output: {str(e)}")
+            future.set_exception(e)
+        finally:
+            stream.close()
+            pieces.put(None)
@@ -0,0 +1,56 @@
+from typing import Optional, Sequence, Tuple
+
+
+ENHANCE_SYSTEM_PROMPT = """You are a creative AI assistant specialized in enhancing text prompts for image generation.
+Your task is to expand the given prompt with rich, artistic details while maintaining the original intent.
+Focus on visual elements like lighting, mood, composition, colors, and artistic style.
+Keep the enhanced prompt concise but descriptive."""
+
+ANALYSIS_SYSTEM_PROMPT = """Analyze the relationship between a reference creation and a new prompt.
+Extract key differences and similarities in terms of:
+1. Subject matter
+2. Style
+3. Mood
+4. Composition
+Return specific aspects that should be maintained or modified."""
+
+# One generation that does both jobs for reference-based creations
+FUSED_SYSTEM_PROMPT = """You are a creative AI assistant specialized in enhancing text prompts for image generation.
+Expand the new prompt with rich, artistic details while maintaining its intent and the style of the reference creation.
+Then analyze the relationship between the reference and the new prompt in terms of subject matter, style, mood and composition,
+and name the specific aspects that should be maintained or modified.
+Answer in exactly this format:
+Enhanced prompt: <the enhanced prompt on a single line>
+Style analysis: <the analysis>"""
+
+ANALYSIS_FAILED = "Failed to analyze relationship."
+
+# The enhanced prompt is a single line; the model tends to continue with a new example
+ENHANCE_STOP_SEQUENCES = ("\n", "Original prompt:")
+ANALYSIS_STOP_SEQUENCES = ("\nReference:", "\nNew prompt:")
+FUSED_STOP_SEQUENCES = ("\nReference:", "\nNew prompt:", "\nEnhanced prompt:")
+FUSED_ANALYSIS_MARKER = "Style analysis:"
+
+
+def truncate_at_stop(text: str, stop_sequences: Sequence[str]) -> str:
+    """Cut generated text at the earliest stop sequence, ignoring leading whitespace."""
+    text = text.lstrip()
+    positions = [text.find(stop) for stop in stop_sequences]
+    positions = [p for p in positions if p >= 0]
+    return (text[:min(positions)] if positions else text).strip()
+
+
+def longest_stop(stop_sequences: Sequence[str]) -> int:
+    """Length of the longest stop sequence, i.e. how much trailing text could still start one."""
+    return max((len(stop) for stop in stop_sequences), default=0)
+
+
+def parse_fused(text: str) -> Optional[Tuple[str, str]]:
+    """Split a fused generation into (enhanced prompt, analysis); None if either part is missing."""
+    enhanced, marker, analysis = text.partition(FUSED_ANALYSIS_MARKER)
+    # The enhanced prompt is a single line; anything after it is the model rambling
+    enhanced = enhanced.strip().split("\n", 1)[0].strip()
+    analysis = analysis.strip()
+    if not marker or not enhanced or not analysis:
+        return None
+    return enhanced, analysis
@@ -0,0 +1,333 @@
+"""Shared LLM server: one process owns the model, API workers talk to it over IPC.
+
+Run it with
+    python -m llm.server --model deepseek-ai/deepseek-coder-6.7b-base --address memory/llm.sock
+and set llm_server_address (LLM_SERVER_ADDRESS in main.py) to the same
+address, so every worker gets an LLMClient instead of loading its own copy
+of the model. The server batches concurrent requests from all clients.
+
+multiprocessing.connection unpickles what it receives, so only clients that
+pass the authkey handshake get that far: the key comes from
+LLM_SERVER_AUTHKEY, or else the server writes a random one to
+LLM_SERVER_AUTHKEY_FILE (mode 0600) for clients on the same host to read.
+TCP addresses must be loopback.
+"""
+import argparse
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple, Union
+
+from llm.prompts import ENHANCE_STOP_SEQUENCES
+
+# Methods a client may call; anything else is refused
+SERVED_METHODS = ("enhance_prompt", "analyze_reference", "enhance_with_reference", "stats")
+STREAMED_METHODS = ("stream_enhance_prompt",)
+
+LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")
+AUTHKEY_FILE = os.getenv("LLM_SERVER_AUTHKEY_FILE", "memory/llm.key")
+
+Address = Union[str, Tuple[str, int]]
+
+
+def parse_address(address: str) -> Address:
+    """A filesystem path is a Unix socket; host:port is a loopback TCP socket."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        host = host.strip("[]")
+        if host not in LOOPBACK_HOSTS:
+            raise ValueError(f"LLM server TCP address must be on loopback, not {host}")
+        return host, int(port)
+    return address
+
+
+def server_authkey(path: str = AUTHKEY_FILE) -> bytes:
+    """LLM_SERVER_AUTHKEY, or a fresh random key written to path readable by this user only."""
+    key = os.getenv("LLM_SERVER_AUTHKEY")
+    if key:
+        return key.encode("utf-8")
+    key = secrets.token_hex(32)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)  # left over from a previous run, possibly with looser permissions
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    return key.encode("utf-8")
+
+
+def client_authkey(path: str = AUTHKEY_FILE) -> bytes:
+    """LLM_SERVER_AUTHKEY, or the key the server wrote to path."""
+    key = os.getenv("LLM_SERVER_AUTHKEY")
+    if key:
+        return key.encode("utf-8")
+    try:
+        with open(path) as f:
+            return f.read().strip().encode("utf-8")
+    except FileNotFoundError:
+        raise RuntimeError(f"LLM server key {path} not found; is the server running?")
+
+
+class LLMServer:
+    """Serves an LLM handler's methods to LLMClient connections, one thread per connection."""
+
+    def __init__(self, llm_handler: Any, address: str, authkey: Optional[bytes] = None):
+        self.llm_handler = llm_handler
+        self.address = parse_address(address)
+        self.authkey = authkey or server_authkey()
+        self.connections = 0
+        self.requests = 0
+        self._listener: Optional[Listener] = None
+        self._closed = threading.Event()
+
+    def serve_forever(self) -> None:
+        if isinstance(self.address, str):
+            os.makedirs(os.path.dirname(self.address) or ".", exist_ok=True)
+            if os.path.exists(self.address):
+                os.unlink(self.address)  # left over from a previous run
+        # The socket is created owner-only, rather than chmod-ed once it is already listening
+        previous_umask = os.umask(0o177)
+        try:
+            self._listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(previous_umask)
+        logging.info(f"LLM server listening on {self.address}")
+
+        while not self._closed.is_set():
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                if self._closed.is_set():
+                    break
+                raise
+            except Exception as e:
+                # A client that fails the handshake
+                logging.warning(f"Rejected LLM client: {str(e)}")
+                continue
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(connection,), name="llm-server-conn", daemon=True).start()
+
+    def _serve(self, connection: Connection) -> None:
+        with connection:
+            while True:
+                try:
+                    method, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                self.requests += 1
+                try:
+                    if method == "describe":
+                        connection.send(("ok", {
+                            "model_name": self.llm_handler.model_name,
+                            "sampling_params": self.llm_handler.sampling_params
+                        }))
+                    elif method in SERVED_METHODS:
+                        connection.send(("ok", getattr(self.llm_handler, method)(*args)))
+                    elif method in STREAMED_METHODS:
+                        pieces = getattr(self.llm_handler, method)(*args)
+                        try:
+                            for piece in pieces:
+                                connection.send(("piece", piece))
+                        finally:
+                            # Stops generation if the client went away mid-stream
+                            pieces.close()
+                        connection.send(("ok", None))
+                    else:
+                        connection.send(("error", f"Unknown method: {method}"))
+                except (EOFError, OSError):
+                    return
+                except Exception as e:
+                    logging.error(f"Error serving {method}: {str(e)}")
+                    try:
+                        connection.send(("error", str(e)))
+                    except (EOFError, OSError):
+                        return
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._listener is not None:
+            self._listener.close()
+        close = getattr(self.llm_handler, "close", None)
+        if callable(close):
+            close()
+
+
+class LLMClient:
+    """Same interface as LLMHandler, served by an LLMServer in another process.
+
+    Connections are pooled, so concurrent callers each hold their own and the
+    server can batch their requests together. Waits up to connect_timeout
+    seconds for the server, which may still be loading its model.
+    """
+
+    def __init__(self, address: str, authkey: Optional[bytes] = None, connect_timeout: float = 300.0):
+        self.address = parse_address(address)
+        # None reads the key on each connect, so a restarted server's new key is picked up
+        self.authkey = authkey
+        self._idle: "queue.LifoQueue[Connection]" = queue.LifoQueue()
+        self._closed = False
+        self.calls = 0
+        self.reconnects = 0
+
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                description = self._call("describe")
+                break
+            except RuntimeError:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f"LLM server at {address} did not answer within {connect_timeout:.0f}s")
+                time.sleep(1.0)
+        self.model_name: str = description["model_name"]
+        self.sampling_params: Dict[str, Any] = description["sampling_params"]
+
+    def _connect(self) -> Connection:
+        try:
+            return Client(self.address, authkey=self.authkey or client_authkey())
+        except (OSError, EOFError) as e:
+            raise RuntimeError(f"LLM server unavailable: {str(e)}")
+        except AuthenticationError as e:
+            # Also seen while a restarting server replaces a stale key file
+            raise RuntimeError(f"LLM server rejected the key: {str(e)}")
+
+    def _acquire(self) -> Connection:
+        if self._closed:
+            raise RuntimeError("LLM client is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _call(self, method: str, *args: Any) -> Any:
+        # One retry on a fresh connection, in case the server was restarted
+        for attempt in range(2):
+            connection = self._acquire()
+            try:
+                connection.send((method, args))
+                status, result = connection.recv()
+            except (EOFError, OSError) as e:
+                connection.close()
+                if attempt:
+                    raise RuntimeError(f"LLM server unavailable: {str(e)}")
+                self.reconnects += 1
+                continue
+            self._idle.put(connection)
+            self.calls += 1
+            if status == "error":
+                raise RuntimeError(f"LLM server error: {result}")
+            return result
+
+    def enhance_prompt(self, prompt: str, style_guide: Optional[Dict] = None) -> str:
+        return self._call("enhance_prompt", prompt, style_guide)
+
+    def analyze_reference(self, reference_prompt: str, new_prompt: str) -> Dict:
+        return self._call("analyze_reference", reference_prompt, new_prompt)
+
+    def enhance_with_reference(self, reference_prompt: str, prompt: str) -> Dict:
+        return self._call("enhance_with_reference", reference_prompt, prompt)
+
+    def stream_enhance_prompt(self,
+                              prompt: str,
+                              style_guide: Optional[Dict] = None,
+                              stop_sequences: Sequence[str] = ENHANCE_STOP_SEQUENCES) -> Iterator[str]:
+        connection = self._acquire()
+        finished = False
+        try:
+            connection.send(("stream_enhance_prompt", (prompt, style_guide, tuple(stop_sequences))))
+            while True:
+                status, result = connection.recv()
+                if status == "piece":
+                    yield result
+                    continue
+                finished = True
+                if status == "error":
+                    raise RuntimeError(f"LLM server error: {result}")
+                return
+        except (EOFError, OSError) as e:
+            raise RuntimeError(f"LLM server unavailable: {str(e)}")
+        finally:
+            # A stream abandoned midway leaves pieces in flight, so its connection is dropped
+            if finished:
+                self._idle.put(connection)
+                self.calls += 1
+            else:
+                connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "server": self._call("stats"),
+            "address": self.address,
+            "calls": self.calls,
+            "reconnects": self.reconnects,
+            "idle_connections": self._idle.qsize()
+        }
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--address", default=os.getenv("LLM_SERVER_ADDRESS", "memory/llm.sock"),
+                        help="Unix socket path, or host:port for loopback TCP")
+    parser.add_argument("--model", default="deepseek-ai/deepseek-coder-6.7b-base")
+    parser.add_argument("--backend", default="transformers")
+    parser.add_argument("--threads", type=int, default=0, help="0 uses every core")
+    parser.add_argument("--gguf-file")
+    parser.add_argument("--context-length", type=int, default=2048)
+    parser.add_argument("--deterministic", action="store_true")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--batch-wait-ms", type=float, default=20.0)
+    parser.add_argument("--no-cache", action="store_true", help="Skip the enhanced-prompt cache")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+    # Imported here so clients never load torch and transformers
+    from llm.backends import create_llm_handler
+    from llm.cache import CachedLLM, PromptCache
+    from llm.processor import BatchProcessor
+
+    llm_handler = create_llm_handler(
+        args.backend,
+        args.model,
+        deterministic=args.deterministic,
+        num_threads=args.threads,
+        gguf_file=args.gguf_file,
+        context_length=args.context_length
+    )
+    if args.max_batch_size > 1:
+        llm_handler = BatchProcessor(llm_handler, max_batch_size=args.max_batch_size, max_wait_ms=args.batch_wait_ms)
+    if not args.no_cache:
+        llm_handler = CachedLLM(llm_handler, PromptCache())
+
+    # Token and generation metrics are recorded here, not in the API workers
+    shared_metrics = None
+    if os.getenv("METRICS_DIR"):
+        from utils.metrics import MultiprocessMetrics, metrics
+        shared_metrics = MultiprocessMetrics(metrics, os.environ["METRICS_DIR"])
+        shared_metrics.start()
+
+    server = LLMServer(llm_handler, args.address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if shared_metrics:
+            shared_metrics.stop()
+
+
+if __name__ == "__main__":
+    main()
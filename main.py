@@ -1,14 +1,40 @@
+import asyncio
+import fcntl
+import json
 import logging
 import os
-from typing import Dict, Optional
+import shutil
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from typing import AsyncIterator, Callable, ContextManager, Dict, Optional
 
-from fastapi import FastAPI, HTTPException
-from openfabric_pysdk.context import Stub, SchemaUtil
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from openfabric_pysdk.context import SchemaUtil
 
-from llm.llm_handler import LLMHandler
-from memory.memory_handler import MemoryHandler
+from pipeline.bulk import BulkRunner
+from pipeline.jobs import JobQueue, QueueFullError, TERMINAL_STATUSES
 from pipeline.pipeline_handler import PipelineHandler
+from pipeline.registry import registry
+from pipeline.retention import RetentionTask
+from pipeline.staged import StagedPipeline
 from schema import InputClass, OutputClass, ConfigClass
+from utils.metrics import CONTENT_TYPE, MultiprocessMetrics, metrics
+from utils.tracing import LOG_FORMAT, install_log_records, trace
+
+# Every log line carries the trace id of the request or job it belongs to
+install_log_records()
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format=LOG_FORMAT)
+
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_seconds", "Latency of API requests, until the response starts", ["method", "route", "status"]
+)
+# Set (by start.sh) when several processes serve the API: /metrics then merges
+# the snapshots every worker and the LLM server write there
+METRICS_DIR = os.getenv("METRICS_DIR")
+shared_metrics = MultiprocessMetrics(metrics, METRICS_DIR) if METRICS_DIR else None
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -25,10 +51,198 @@ configurations = {
             "69543f29-4d41-4afc-7f29-3d51591f11eb"
         ],
         llm_model="deepseek-ai/deepseek-coder-6.7b-base",
-        memory_type="vector"
+        memory_type="hybrid",
+        # Set when several workers share one model through python -m llm.server
+        llm_server_address=os.getenv("LLM_SERVER_ADDRESS")
     )
 }
 
+# Background creation jobs, started once the handlers are loaded
+job_queue: Optional[JobQueue] = None
+staged_pipeline: Optional[StagedPipeline] = None
+# Expires creations under config.settings.RETENTION_POLICY; with several API
+# workers only the one holding RETENTION_LOCK runs it
+RETENTION_LOCK = "memory/retention.lock"
+retention_task: Optional[RetentionTask] = None
+retention_lock = None
+retention_elsewhere = False
+
+@app.on_event("startup")
+def start_initialization() -> None:
+    """Load handlers in the background so the server answers probes right away."""
+    if shared_metrics:
+        shared_metrics.start()
+    threading.Thread(target=initialize, name="startup", daemon=True).start()
+
+def initialize() -> None:
+    warm_up_handlers()
+    try:
+        start_job_queue()
+    except Exception as e:
+        logging.error(f"Error starting job queue: {str(e)}")
+    try:
+        start_retention()
+    except Exception as e:
+        logging.error(f"Error starting retention: {str(e)}")
+
+def warm_up_handlers() -> None:
+    """Load the model and memory stores once so requests never pay for it."""
+    for name, config in configurations.items():
+        try:
+            registry.warm_up(config)
+        except Exception as e:
+            logging.error(f"Error warming up handlers for {name}: {str(e)}")
+
+def start_job_queue() -> None:
+    global job_queue, staged_pipeline
+    user_config = configurations['super-user']
+    runner = None
+    workers = user_config.job_workers
+    if user_config.staged_execution:
+        # Overlap LLM, text-to-image and image-to-3D work across jobs
+        staged_pipeline = StagedPipeline(
+            lambda: registry.lease(user_config),
+            workers={
+                "enhance": user_config.enhance_workers,
+                "image": user_config.image_workers,
+                "3d": user_config.model_workers,
+                "optimize": user_config.model_optimizer_workers,
+                "persist": user_config.persist_workers
+            },
+            queue_size=user_config.stage_queue_size
+        )
+        staged_pipeline.start()
+        runner = staged_pipeline.run
+        workers = staged_pipeline.capacity
+    job_queue = JobQueue(
+        pipeline_provider=lambda: registry.lease(user_config),
+        workers=workers,
+        max_pending=user_config.max_pending_jobs,
+        runner=runner
+    )
+    job_queue.start()
+
+def start_retention() -> None:
+    global retention_task, retention_lock, retention_elsewhere
+    os.makedirs(os.path.dirname(RETENTION_LOCK), exist_ok=True)
+    lock = open(RETENTION_LOCK, "w")
+    try:
+        # Held until the process exits, so the task moves on if its worker dies
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        retention_elsewhere = True
+        logging.info("Retention runs in another API worker")
+        return
+    retention_lock = lock
+
+    @contextmanager
+    def handlers():
+        with registry.lease(configurations['super-user']) as pipeline:
+            yield pipeline.memory_handler, pipeline.artifact_store, pipeline.thumbnails
+
+    retention_task = RetentionTask(handlers)
+    retention_task.start()
+
+@app.on_event("shutdown")
+def stop_job_queue() -> None:
+    if retention_task:
+        retention_task.stop()
+    if job_queue:
+        job_queue.stop()
+    if staged_pipeline:
+        staged_pipeline.stop()
+    # Flushes buffered index writes and pending artifact writes
+    registry.close()
+    if shared_metrics:
+        shared_metrics.stop()
+
+def ready_pipeline(user: str = 'super-user') -> ContextManager[PipelineHandler]:
+    """Lease the shared pipeline, or answer 503 while it is still loading.
+
+    Use it in a with block, so a reload meanwhile leaves the pipeline open until the request is done.
+    """
+    user_config = configurations[user]
+    state = registry.status(user_config)["state"]
+    if state != "ready":
+        raise HTTPException(status_code=503, detail=f"Handlers are {state}", headers={"Retry-After": "5"})
+    return registry.lease(user_config)
+
+def ready_job_queue() -> JobQueue:
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is not started yet", headers={"Retry-After": "5"})
+    return job_queue
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next: Callable) -> Response:
+    """Run each request under the caller's X-Trace-Id, or a new one, and time it."""
+    start = time.perf_counter()
+    with trace(request.headers.get("X-Trace-Id")) as trace_id:
+        response = await call_next(request)
+    # The route template, so /jobs/{job_id} is one series rather than one per job
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    REQUEST_SECONDS.observe(time.perf_counter() - start,
+                            method=request.method, route=route, status=response.status_code)
+    response.headers["X-Trace-Id"] = trace_id
+    return response
+
+@app.get("/metrics")
+def export_metrics() -> PlainTextResponse:
+    """Expose the pipeline, LLM, Openfabric and memory metrics in the Prometheus text format."""
+    return PlainTextResponse(shared_metrics.render() if shared_metrics else metrics.render(), media_type=CONTENT_TYPE)
+
+@app.get("/health/live")
+def liveness() -> Dict:
+    """Report that the process is serving; never waits on the handlers."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness() -> JSONResponse:
+    """Report whether the handlers are loaded and the job queue accepts work."""
+    handlers = {name: registry.status(config) for name, config in configurations.items()}
+    ready = job_queue is not None and all(status["state"] == "ready" for status in handlers.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "handlers": handlers, "job_queue": job_queue is not None}
+    )
+
+@app.get("/registry")
+def registry_stats() -> Dict:
+    """Report load time and resident memory of the shared handlers."""
+    return registry.stats()
+
+@app.post("/registry/reload")
+def reload_handlers(user: str = 'super-user') -> Dict:
+    """Rebuild the shared handlers for a user configuration."""
+    user_config: Optional[ConfigClass] = configurations.get(user)
+    if not user_config:
+        raise HTTPException(status_code=404, detail="User configuration not found")
+    return registry.reload(user_config)
+
+def ready_retention() -> None:
+    if retention_elsewhere:
+        # A retried request can land on the worker that holds the lock
+        raise HTTPException(status_code=503, detail="Retention runs in another API worker",
+                            headers={"Retry-After": "1"})
+    if retention_task is None:
+        raise HTTPException(status_code=503, detail="Retention is not started yet", headers={"Retry-After": "5"})
+
+@app.get("/retention")
+def retention_stats() -> Dict:
+    """Report what the retention task has expired and reclaimed."""
+    ready_retention()
+    return {"policy": retention_task.policy.__dict__, **retention_task.stats()}
+
+@app.post("/retention/run")
+def run_retention() -> Dict:
+    """Run a retention pass now and return its report."""
+    ready_retention()
+    try:
+        return retention_task.run_once()
+    except Exception as e:
+        logging.error(f"Error running retention: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Retention failed: {str(e)}")
+
 @app.post("/execution")
 async def execute(model: SchemaUtil) -> None:
     """
@@ -43,30 +257,19 @@ async def execute(model: SchemaUtil) -> None:
         
         # Retrieve user config
         user_config: ConfigClass = configurations.get('super-user', None)
-        logging.info(f"Configuration: {configurations}")
+        logging.debug(f"Configuration: {user_config}")
         
         if not user_config:
             raise ValueError("User configuration not found")
         
-        # Initialize components
-        stub = Stub(user_config.app_ids)
-        llm_handler = LLMHandler(user_config.llm_model)
-        memory_handler = MemoryHandler(user_config.memory_type)
-        
-        # Initialize pipeline
-        pipeline = PipelineHandler(
-            stub=stub,
-            llm_handler=llm_handler,
-            memory_handler=memory_handler,
-            config=user_config.__dict__
-        )
-        
-        # Process the creation
-        result = pipeline.process_creation(
-            prompt=request.prompt,
-            session_id=request.session_id,
-            reference_id=request.reference_id
-        )
+        # Shared pipeline, loaded in the background at startup
+        with ready_pipeline() as pipeline:
+            # Process the creation without blocking other connections
+            result = await pipeline.process_creation_async(
+                prompt=request.prompt,
+                session_id=request.session_id,
+                reference_id=request.reference_id
+            )
         
         # Prepare response
         response: OutputClass = model.response
@@ -75,10 +278,180 @@ async def execute(model: SchemaUtil) -> None:
         response.model_path = result["model_path"]
         response.history = [result]
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error during execution: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/enhance/stream")
+async def stream_enhancement(prompt: str) -> StreamingResponse:
+    """Stream the enhanced prompt as Server-Sent Events while it is generated."""
+    loop = asyncio.get_running_loop()
+    lease = ready_pipeline()
+
+    async def event_stream() -> AsyncIterator[str]:
+        with lease as pipeline:
+            pieces = pipeline.llm_handler.stream_enhance_prompt(prompt)
+            start = loop.time()
+            first_token_seconds = None
+            text = ""
+            # Each next() blocks on the model, so pull tokens off the event loop
+            while True:
+                piece = await loop.run_in_executor(None, next, pieces, None)
+                if piece is None:
+                    break
+                if first_token_seconds is None:
+                    first_token_seconds = loop.time() - start
+                text += piece
+                yield f"event: token\ndata: {json.dumps({'text': piece})}\n\n"
+        done = {
+            "enhanced_prompt": text.strip() or prompt,
+            "time_to_first_token_seconds": first_token_seconds,
+            "total_seconds": loop.time() - start
+        }
+        yield f"event: done\ndata: {json.dumps(done)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/jobs")
+def submit_job(request: InputClass) -> Dict:
+    """Queue a creation and return its job id without waiting for it."""
+    try:
+        job_id = ready_job_queue().submit(
+            prompt=request.prompt,
+            session_id=request.session_id,
+            reference_id=request.reference_id
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str) -> Dict:
+    """Return the status of a job and, once completed, its creation."""
+    job = ready_job_queue().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, after: int = 0) -> StreamingResponse:
+    """Stream a job's stage transitions as Server-Sent Events until it finishes."""
+    queue = ready_job_queue()
+    if not queue.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream() -> AsyncIterator[str]:
+        last_seq = after
+        while True:
+            events = await queue.wait_for_events(job_id, last_seq)
+            if not events:
+                yield ": keep-alive\n\n"
+            for event in events:
+                last_seq = event["seq"]
+                yield f"id: {event['seq']}\nevent: stage\ndata: {json.dumps(event)}\n\n"
+
+            job = queue.get(job_id)
+            if job["status"] in TERMINAL_STATUSES and not queue.events(job_id, last_seq):
+                yield f"event: done\ndata: {json.dumps(job)}\n\n"
+                return
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.get("/sessions/{session_id}/creations")
+def list_session_creations(session_id: str, limit: int = 20, cursor: Optional[str] = None) -> Dict:
+    """Page through a session's creations, newest first."""
+    with ready_pipeline() as pipeline:
+        return pipeline.memory_handler.list_session_creations(session_id, min(limit, 100), cursor)
+
+@app.get("/creations")
+def list_recent_creations(limit: int = 20, cursor: Optional[str] = None) -> Dict:
+    """Page through all creations, newest first."""
+    with ready_pipeline() as pipeline:
+        return pipeline.memory_handler.list_recent(min(limit, 100), cursor)
+
+@app.get("/creations/similar")
+def find_similar_creations(prompt: str, n_results: int = 5, session_id: Optional[str] = None) -> Dict:
+    """Return past creations whose prompts are closest to the given one."""
+    with ready_pipeline() as pipeline:
+        return {"creations": pipeline.find_similar_creations(prompt, min(n_results, 50), session_id)}
+
+@app.get("/thumbnails/{digest}")
+def get_thumbnail(digest: str, size: int = 256) -> FileResponse:
+    """Serve a resized image by its content hash, rendering it on first request."""
+    with ready_pipeline() as pipeline:
+        thumbnails = pipeline.thumbnails
+        try:
+            path = thumbnails.get(digest, size)
+        except Exception as e:
+            logging.error(f"Error rendering thumbnail: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to render thumbnail: {str(e)}")
+    if not path:
+        raise HTTPException(status_code=404, detail="Image not found")
+    # Keyed by content hash, so the browser never needs to revalidate
+    return FileResponse(path, media_type=thumbnails.media_type,
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+# Bulk runs started through the API, by run id. Held in this process only: with
+# API_WORKERS > 1 a run's progress and resume are only seen by the worker that
+# started it (others fall back to the checkpoint file), so use one worker or
+# python -m pipeline.bulk for bulk work
+BULK_DIR = "memory/bulk"
+MAX_BULK_CONCURRENCY = 16
+bulk_runs: Dict[str, BulkRunner] = {}
+
+def _start_bulk_run(run_id: str, concurrency: int) -> Dict:
+    # The run keeps its pipeline across reloads, until it finishes
+    lease = ExitStack()
+    runner = BulkRunner(lease.enter_context(ready_pipeline()), concurrency=min(concurrency, MAX_BULK_CONCURRENCY))
+    bulk_runs[run_id] = runner
+
+    def run() -> None:
+        with lease:
+            runner.run(f"{BULK_DIR}/{run_id}.jsonl", f"{BULK_DIR}/{run_id}.results.jsonl")
+
+    threading.Thread(target=run, name=f"bulk-{run_id[:8]}", daemon=True).start()
+    return {"run_id": run_id, "status": "running"}
+
+@app.post("/bulk")
+def submit_bulk(file: UploadFile = File(...), concurrency: int = 4) -> Dict:
+    """Start a bulk run over an uploaded JSONL file of creation requests."""
+    os.makedirs(BULK_DIR, exist_ok=True)
+    run_id = str(uuid.uuid4())
+    with open(f"{BULK_DIR}/{run_id}.jsonl", "wb") as f:
+        # Streamed in 1 MiB blocks, so a large upload is never held in memory
+        shutil.copyfileobj(file.file, f, 1 << 20)
+    return _start_bulk_run(run_id, concurrency)
+
+@app.post("/bulk/{run_id}/resume")
+def resume_bulk(run_id: str, concurrency: int = 4) -> Dict:
+    """Restart a bulk run, skipping requests that already completed."""
+    if not os.path.exists(f"{BULK_DIR}/{run_id}.jsonl"):
+        raise HTTPException(status_code=404, detail="Bulk run not found")
+    if run_id in bulk_runs and bulk_runs[run_id].stats()["running"]:
+        raise HTTPException(status_code=409, detail="Bulk run is still running")
+    return _start_bulk_run(run_id, concurrency)
+
+@app.get("/bulk/{run_id}")
+def get_bulk(run_id: str) -> Dict:
+    """Report progress of a bulk run."""
+    if run_id in bulk_runs:
+        return {"run_id": run_id, **bulk_runs[run_id].stats()}
+    results_path = f"{BULK_DIR}/{run_id}.results.jsonl"
+    if not os.path.exists(results_path):
+        raise HTTPException(status_code=404, detail="Bulk run not found")
+    # Started before a restart: only the checkpoint is left
+    return {"run_id": run_id, "running": False, "completed": len(BulkRunner.completed_lines(results_path))}
+
+@app.get("/bulk/{run_id}/results")
+def get_bulk_results(run_id: str) -> FileResponse:
+    """Download the results JSONL of a bulk run."""
+    results_path = f"{BULK_DIR}/{run_id}.results.jsonl"
+    if not os.path.exists(results_path):
+        raise HTTPException(status_code=404, detail="Bulk run not found")
+    return FileResponse(results_path, media_type="application/x-ndjson")
+
 # Create necessary directories on startup
 os.makedirs("static/images", exist_ok=True)
 os.makedirs("static/models", exist_ok=True)
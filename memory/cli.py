@@ -0,0 +1,88 @@
+"""Maintenance commands for the creative memory stores.
+
+Usage:
+    python -m memory.cli rebuild-index [--user super-user] [--batch-size 500]
+    python -m memory.cli backfill-index [--user super-user] [--batch-size 500]
+    python -m memory.cli retention [--user super-user]
+"""
+import argparse
+import json
+import logging
+from contextlib import nullcontext
+
+from memory.memory_handler import MemoryHandler
+
+
+def _memory_for(user: str) -> MemoryHandler:
+    from main import configurations
+
+    config = configurations[user]
+    return MemoryHandler(
+        config.memory_type,
+        pool_size=config.sqlite_pool_size,
+        embedding_batch_size=config.embedding_batch_size,
+        embedding_cache_size=config.embedding_cache_size
+    )
+
+
+def rebuild_index(args: argparse.Namespace) -> None:
+    memory = _memory_for(args.user)
+    try:
+        indexed = memory.rebuild_index(batch_size=args.batch_size)
+        stats = memory.stats()
+    finally:
+        memory.close()
+    print(json.dumps({"indexed": indexed, **stats}))
+
+
+def backfill_index(args: argparse.Namespace) -> None:
+    memory = _memory_for(args.user)
+    try:
+        indexed = memory.backfill_index(batch_size=args.batch_size)
+        stats = memory.stats()
+    finally:
+        memory.close()
+    print(json.dumps({"indexed": indexed, **stats}))
+
+
+def run_retention(args: argparse.Namespace) -> None:
+    # Policy from config/settings.py, with the stores at their default locations
+    from pipeline.retention import RetentionTask
+    from utils.file_ops import ArtifactStore
+    from utils.thumbnails import ThumbnailCache
+
+    memory = _memory_for(args.user)
+    artifact_store = ArtifactStore()
+    try:
+        report = RetentionTask(lambda: nullcontext((memory, artifact_store, ThumbnailCache()))).run_once()
+    finally:
+        artifact_store.close()
+        memory.close()
+    print(json.dumps(report))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintenance commands for the creative memory stores.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = subparsers.add_parser("rebuild-index", help="Regenerate the similarity index from SQLite")
+    rebuild.add_argument("--user", default="super-user", help="Configuration to use from main.py")
+    rebuild.add_argument("--batch-size", type=int, default=500)
+    rebuild.set_defaults(func=rebuild_index)
+
+    backfill = subparsers.add_parser("backfill-index", help="Index SQLite records missing from the similarity index")
+    backfill.add_argument("--user", default="super-user", help="Configuration to use from main.py")
+    backfill.add_argument("--batch-size", type=int, default=500)
+    backfill.set_defaults(func=backfill_index)
+
+    retention = subparsers.add_parser("retention", help="Expire creations under the retention policy and compact")
+    retention.add_argument("--user", default="super-user", help="Configuration to use from main.py")
+    retention.set_defaults(func=run_retention)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from utils.metrics import metrics
+
+EMBED_SECONDS = metrics.histogram("embedding_batch_seconds", "Time to embed one batch of texts")
+EMBED_LOOKUPS = metrics.counter("embedding_cache_lookups_total", "Embedding cache lookups by result", ["result"])
+FLUSH_SECONDS = metrics.histogram("index_flush_seconds", "Time to embed and upsert one buffered index flush")
+
+EmbeddingFunction = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+class Embedder:
+    """Embeds texts in batches and caches the vectors by text hash.
+
+    The embedding function defaults to the one Chroma would otherwise run
+    inside collection.add/query, so vectors stay compatible with existing
+    collections. It is created on first use, which keeps the model off the
+    startup path.
+    """
+
+    def __init__(self,
+                 embedding_function: Optional[EmbeddingFunction] = None,
+                 batch_size: int = 64,
+                 cache_size: int = 10000):
+        self._embedding_function = embedding_function
+        self.batch_size = max(1, batch_size)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.embed_seconds = 0.0
+
+    @property
+    def embedding_function(self) -> EmbeddingFunction:
+        if self._embedding_function is None:
+            from chromadb.utils import embedding_functions
+            self._embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        return self._embedding_function
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Return one vector per text, embedding only texts not seen before."""
+        keys = [self.text_key(text) for text in texts]
+        vectors: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in vectors or key in missing:
+                    continue
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    vectors[key] = cached
+                    self.hits += 1
+                else:
+                    missing[key] = text
+                    self.misses += 1
+        EMBED_LOOKUPS.inc(len(vectors), result="hit")
+        EMBED_LOOKUPS.inc(len(missing), result="miss")
+
+        pending = list(missing.items())
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            started = time.perf_counter()
+            embedded = self.embedding_function([text for _, text in batch])
+            elapsed = time.perf_counter() - started
+            EMBED_SECONDS.observe(elapsed)
+
+            with self._lock:
+                self.batches += 1
+                self.embed_seconds += elapsed
+                for (key, _), vector in zip(batch, embedded):
+                    vector = [float(x) for x in vector]
+                    vectors[key] = vector
+                    self._cache[key] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "batches": self.batches,
+            "cached": len(self._cache),
+            "embeddings_per_second": self.misses / self.embed_seconds if self.embed_seconds else 0.0
+        }
+
+
+class IndexBuffer:
+    """Collects index upserts and writes them to the collection in bulk.
+
+    Entries are flushed when the buffer reaches flush_size or every
+    flush_seconds by a background thread, and always on close(). Entries
+    from a failed flush are put back and retried on the next one.
+    """
+
+    def __init__(self,
+                 collection_provider: Callable[[], Any],
+                 embedder: Embedder,
+                 flush_size: int = 256,
+                 flush_seconds: float = 2.0):
+        self._collection_provider = collection_provider
+        self.embedder = embedder
+        self.flush_size = max(1, flush_size)
+        self.flush_seconds = flush_seconds
+
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self.flushes = 0
+        self.flushed = 0
+        self.failures = 0
+
+        self._thread = threading.Thread(target=self._run, name="index-flush", daemon=True)
+        self._thread.start()
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            # A later write for the same id replaces the buffered one, as upsert would
+            for id, document, metadata in zip(ids, documents, metadatas):
+                self._pending.pop(id, None)
+                self._pending[id] = {"document": document, "metadata": metadata}
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write every buffered entry now. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = OrderedDict()
+            if not batch:
+                return 0
+
+            ids = list(batch)
+            documents = [entry["document"] for entry in batch.values()]
+            try:
+                with FLUSH_SECONDS.time():
+                    self._collection_provider().upsert(
+                        ids=ids,
+                        documents=documents,
+                        metadatas=[entry["metadata"] for entry in batch.values()],
+                        embeddings=self.embedder.embed(documents)
+                    )
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                    for id, entry in batch.items():
+                        self._pending.setdefault(id, entry)
+                raise
+
+            self.flushes += 1
+            self.flushed += len(ids)
+            return len(ids)
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Error flushing similarity index: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "failures": self.failures
+        }
+
+    def close(self) -> None:
+        """Stop the background thread and write whatever is still buffered."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
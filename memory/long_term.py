@@ -0,0 +1,104 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.metrics import metrics
+
+WRITE_BEHIND_SECONDS = metrics.histogram(
+    "memory_write_behind_seconds", "Time to write one batch of creations to long-term memory"
+)
+
+
+class WriteBehindBuffer:
+    """Queues creation saves and writes them to the long-term stores in batches.
+
+    The writer is called with a list of creations when the buffer reaches
+    flush_size, every flush_seconds from a background thread, and on close().
+    Creations from a failed write are put back and retried on the next
+    flush. Until written, a creation can still be read back with get().
+    """
+
+    def __init__(self,
+                 writer: Callable[[List[Dict[str, Any]]], None],
+                 flush_size: int = 64,
+                 flush_seconds: float = 1.0):
+        self._writer = writer
+        self.flush_size = max(1, flush_size)
+        self.flush_seconds = flush_seconds
+
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+
+        self._thread = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+        self._thread.start()
+
+    def add(self, creations: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            # A later save of the same id replaces the queued one, as INSERT OR REPLACE would
+            for creation in creations:
+                self._pending.pop(creation["creation_id"], None)
+                self._pending[creation["creation_id"]] = creation
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def get(self, creation_id: str) -> Optional[Dict[str, Any]]:
+        """A queued creation, in save_creations form; None once written."""
+        with self._lock:
+            return self._pending.get(creation_id)
+
+    def flush(self) -> int:
+        """Write every queued creation now. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = OrderedDict()
+            if not batch:
+                return 0
+
+            try:
+                with WRITE_BEHIND_SECONDS.time():
+                    self._writer(list(batch.values()))
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                    # Newer saves of the same ids win over the failed ones
+                    for creation_id, creation in batch.items():
+                        self._pending.setdefault(creation_id, creation)
+                raise
+
+            self.flushes += 1
+            self.written += len(batch)
+            return len(batch)
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Error writing creations to long-term memory: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "written": self.written,
+            "failures": self.failures
+        }
+
+    def close(self) -> None:
+        """Stop the background thread and write whatever is still queued."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
@@ -1,49 +1,119 @@
-import sqlite3
+import functools
 import json
 import os
+import sqlite3
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-import chromadb
-from chromadb.config import Settings
+from typing import Callable, Dict, List, Optional, Any, Tuple
 import logging
 
+from memory.embeddings import Embedder, EmbeddingFunction, IndexBuffer
+from memory.long_term import WriteBehindBuffer
+from memory.short_term import ShortTermMemory
+from memory.sqlite_pool import SQLitePool
+from utils.metrics import metrics
+
+OPERATION_SECONDS = metrics.histogram(
+    "memory_operation_seconds", "Latency of MemoryHandler operations", ["backend", "operation"]
+)
+
+
+def _timed(operation: str) -> Callable:
+    """Record a MemoryHandler method's latency under the given operation name."""
+    def decorate(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with OPERATION_SECONDS.time(backend=self.memory_type, operation=operation):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+CREATION_COLUMNS = "id, session_id, prompt, image_path, model_path, metadata, created_at"
+
+# Which stores back each memory type. In hybrid mode SQLite holds the
+# records and the vector store is only a similarity index over their ids.
+MEMORY_TYPES = {
+    "sqlite": {"records": True, "index": False},
+    "vector": {"records": False, "index": True},
+    "hybrid": {"records": True, "index": True},
+}
+
 
 class MemoryHandler:
-    def __init__(self, memory_type: str = "sqlite"):
+    def __init__(self,
+                 memory_type: str = "sqlite",
+                 db_path: str = "memory/creative_memory.db",
+                 vector_db_path: str = "memory/vector_store",
+                 pool_size: int = 4,
+                 embedding_function: Optional[EmbeddingFunction] = None,
+                 embedding_batch_size: int = 64,
+                 embedding_cache_size: int = 10000,
+                 index_flush_size: int = 256,
+                 index_flush_seconds: float = 2.0,
+                 short_term_size: int = 0,
+                 short_term_sessions: int = 1000,
+                 short_term_ttl_seconds: float = 3600.0,
+                 short_term_similarity: float = 0.95,
+                 write_behind: bool = False,
+                 write_behind_seconds: float = 1.0):
         self.memory_type = memory_type
-        self.db_path = "memory/creative_memory.db"
-        self.vector_db_path = "memory/vector_store"
+        self.db_path = db_path
+        self.vector_db_path = vector_db_path
+        self.pool_size = pool_size
+        self.embedder = Embedder(embedding_function, embedding_batch_size, embedding_cache_size)
+        self.index_flush_size = index_flush_size
+        self.index_flush_seconds = index_flush_seconds
+        self.short_term_similarity = short_term_similarity
+        # Recent creations per session, checked before SQLite and the index; off when size is 0
+        self.short_term = (
+            ShortTermMemory(short_term_size, short_term_sessions, short_term_ttl_seconds)
+            if short_term_size > 0 else None
+        )
         
         try:
-            if memory_type == "sqlite":
+            if memory_type not in MEMORY_TYPES:
+                raise ValueError(f"Unsupported memory type: {memory_type}")
+            self.has_records = MEMORY_TYPES[memory_type]["records"]
+            self.has_index = MEMORY_TYPES[memory_type]["index"]
+            if self.has_records:
                 self._init_sqlite()
-            elif memory_type == "vector":
+            if self.has_index:
                 self._init_vector_store()
-            else:
-                raise ValueError(f"Unsupported memory type: {memory_type}")
+            # Saves return once queued; the short-term tier and the queue serve reads until written
+            self.write_behind = (
+                WriteBehindBuffer(self._write_long_term, flush_seconds=write_behind_seconds)
+                if write_behind else None
+            )
         except Exception as e:
             logging.error(f"Error initializing memory handler: {str(e)}")
             raise RuntimeError(f"Failed to initialize memory handler: {str(e)}")
     
     def _init_sqlite(self):
         try:
-            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self.pool = SQLitePool(self.db_path, size=self.pool_size)
             
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS creations (
-                    id TEXT PRIMARY KEY,
-                    session_id TEXT,
-                    prompt TEXT,
-                    image_path TEXT,
-                    model_path TEXT,
-                    metadata TEXT,
-                    created_at TIMESTAMP
+            with self.pool.connection() as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS creations (
+                        id TEXT PRIMARY KEY,
+                        session_id TEXT,
+                        prompt TEXT,
+                        image_path TEXT,
+                        model_path TEXT,
+                        metadata TEXT,
+                        created_at TIMESTAMP
+                    )
+                ''')
+                # (created_at, id) is the keyset for history pagination
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_creations_session "
+                    "ON creations (session_id, created_at, id)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_creations_created "
+                    "ON creations (created_at, id)"
                 )
-            ''')
-            conn.commit()
-            conn.close()
             logging.info("SQLite database initialized successfully")
         except Exception as e:
             logging.error(f"Error initializing SQLite: {str(e)}")
@@ -51,14 +121,22 @@ class MemoryHandler:
     
     def _init_vector_store(self):
         try:
+            # Imported here so sqlite-only processes never load chromadb
+            import chromadb
+            from chromadb.config import Settings
+            
             os.makedirs(self.vector_db_path, exist_ok=True)
-            self.chroma_client = chromadb.Client(Settings(
-                chroma_db_impl="duckdb+parquet",
-                persist_directory=self.vector_db_path
-            ))
-            self.collection = self.chroma_client.create_collection(
-                name="creative_memory",
-                get_or_create=True
+            self.chroma_client = chromadb.PersistentClient(
+                path=self.vector_db_path,
+                settings=Settings(anonymized_telemetry=False)
+            )
+            self.collection = self.chroma_client.get_or_create_collection(name="creative_memory")
+            # Reads self.collection on each flush, since rebuild_index replaces it
+            self.index_buffer = IndexBuffer(
+                lambda: self.collection,
+                self.embedder,
+                flush_size=self.index_flush_size,
+                flush_seconds=self.index_flush_seconds
             )
             logging.info("Vector store initialized successfully")
         except Exception as e:
@@ -72,62 +150,160 @@ class MemoryHandler:
                      image_path: Optional[str] = None,
                      model_path: Optional[str] = None,
                      metadata: Optional[Dict] = None) -> None:
+        self.save_creations([{
+            "creation_id": creation_id,
+            "session_id": session_id,
+            "prompt": prompt,
+            "image_path": image_path,
+            "model_path": model_path,
+            "metadata": metadata
+        }])
+    
+    @_timed("save")
+    def save_creations(self, creations: List[Dict[str, Any]], durable: bool = False) -> None:
+        """Save several creations in one transaction (sqlite) or one buffered upsert (vector).
+
+        Each item takes the same keys as the save_creation arguments. Index
+        writes are buffered and embedded in bulk, so in hybrid mode a new
+        record shows up in similarity search within index_flush_seconds; the
+        record itself is committed before this returns, unless write_behind
+        queues it for the background writer. durable=True always commits it
+        before returning, for callers that checkpoint on the write.
+        """
+        if not creations:
+            return
+        created_at = datetime.now().isoformat()
+        creations = [{**creation, "created_at": creation.get("created_at") or created_at} for creation in creations]
+        if self.short_term:
+            for creation in creations:
+                self.short_term.put(self._to_record(creation))
+        if self.write_behind and not durable:
+            self.write_behind.add(creations)
+            return
+        self._write_long_term(creations)
+    
+    def _write_long_term(self, creations: List[Dict[str, Any]]) -> None:
         try:
-            if self.memory_type == "sqlite":
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    INSERT OR REPLACE INTO creations 
-                    (id, session_id, prompt, image_path, model_path, metadata, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    creation_id,
-                    session_id,
-                    prompt,
-                    image_path,
-                    model_path,
-                    json.dumps(metadata or {}),
-                    datetime.now().isoformat()
-                ))
+            if self.has_records:
+                with self.pool.connection() as conn:
+                    conn.executemany('''
+                        INSERT OR REPLACE INTO creations 
+                        (id, session_id, prompt, image_path, model_path, metadata, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', [
+                        (
+                            creation["creation_id"],
+                            creation["session_id"],
+                            creation["prompt"],
+                            creation.get("image_path"),
+                            creation.get("model_path"),
+                            json.dumps(creation.get("metadata") or {}),
+                            creation["created_at"]
+                        )
+                        for creation in creations
+                    ])
+                if self.has_index:
+                    self.index_buffer.add(**self._index_entries(creations))
                 
-                conn.commit()
-                conn.close()
-                logging.info(f"Creation {creation_id} saved to SQLite")
+                logging.info(f"{len(creations)} creation(s) saved to {self.memory_type} memory")
             
             elif self.memory_type == "vector":
-                self.collection.add(
-                    documents=[prompt],
-                    metadatas=[{
-                        "image_path": image_path,
-                        "model_path": model_path,
-                        **(metadata or {})
-                    }],
-                    ids=[creation_id]
+                self.index_buffer.add(
+                    documents=[creation["prompt"] for creation in creations],
+                    metadatas=[
+                        {
+                            "image_path": creation.get("image_path"),
+                            "model_path": creation.get("model_path"),
+                            **(creation.get("metadata") or {})
+                        }
+                        for creation in creations
+                    ],
+                    ids=[creation["creation_id"] for creation in creations]
                 )
-                logging.info(f"Creation {creation_id} saved to vector store")
+                logging.info(f"{len(creations)} creation(s) saved to vector store")
         
         except Exception as e:
             logging.error(f"Error saving creation: {str(e)}")
             raise RuntimeError(f"Failed to save creation: {str(e)}")
     
-    def get_similar_creations(self, prompt: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _index_entries(creations: List[Dict[str, Any]]) -> Dict[str, List]:
+        # The index keeps only what similarity search needs; records live in SQLite
+        return {
+            "ids": [creation["creation_id"] for creation in creations],
+            "documents": [creation["prompt"] for creation in creations],
+            "metadatas": [{"session_id": creation["session_id"]} for creation in creations]
+        }
+    
+    def _index_creations(self, creations: List[Dict[str, Any]]) -> None:
+        entries = self._index_entries(creations)
+        self.collection.upsert(**entries, embeddings=self.embedder.embed(entries["documents"]))
+    
+    @_timed("similar")
+    def get_similar_creations(self,
+                              prompt: str,
+                              n_results: int = 5,
+                              session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Nearest creations to a prompt, closest first.
+
+        With a session_id, that session's recent creations in the short-term
+        tier are searched first; if its n_results best all reach
+        short_term_similarity they are the answer, otherwise they are merged
+        with the long-term index results.
+        """
+        if not self.short_term or not self.has_index or not session_id:
+            return self._similar_long_term(prompt, n_results)
         try:
+            query_embedding = self.embedder.embed([prompt])[0]
+            recent = [
+                self._with_distance(self._shape_similar(creation), distance)
+                for creation, distance in self.short_term.similar(
+                    session_id, query_embedding, self.embedder.embed, n_results
+                )
+            ]
+        except Exception as e:
+            logging.error(f"Error searching short-term memory: {str(e)}")
+            return self._similar_long_term(prompt, n_results)
+        
+        hit = len(recent) == n_results and all(r["similarity"] >= self.short_term_similarity for r in recent)
+        self.short_term.record_similar(hit)
+        if hit:
+            return recent
+        # Recent creations may not be indexed yet, so they join the long-term results
+        merged = {r["id"]: r for r in self._similar_long_term(prompt, n_results)}
+        for r in recent:
+            if r["id"] not in merged or r["distance"] < merged[r["id"]]["distance"]:
+                merged[r["id"]] = r
+        return sorted(merged.values(), key=lambda r: r["distance"])[:n_results]
+    
+    def _similar_long_term(self, prompt: str, n_results: int) -> List[Dict[str, Any]]:
+        try:
+            if self.memory_type == "hybrid":
+                results = self.collection.query(
+                    query_embeddings=self.embedder.embed([prompt]),
+                    n_results=n_results,
+                    include=["distances"]
+                )
+                ids = results["ids"][0]
+                records = self.get_creations_by_ids(ids)
+                # Ids the index still holds but SQLite no longer does are skipped
+                return [
+                    self._with_distance(records[id], distance)
+                    for id, distance in zip(ids, results["distances"][0])
+                    if id in records
+                ]
             if self.memory_type == "vector":
                 results = self.collection.query(
-                    query_texts=[prompt],
+                    query_embeddings=self.embedder.embed([prompt]),
                     n_results=n_results
                 )
                 return [
-                    {
-                        "id": id,
-                        "prompt": doc,
-                        **metadata
-                    }
-                    for id, doc, metadata in zip(
+                    self._with_distance({"id": id, "prompt": doc, **metadata}, distance)
+                    for id, doc, metadata, distance in zip(
                         results["ids"][0],
                         results["documents"][0],
-                        results["metadatas"][0]
+                        results["metadatas"][0],
+                        results["distances"][0]
                     )
                 ]
             return []
@@ -135,30 +311,291 @@ class MemoryHandler:
             logging.error(f"Error finding similar creations: {str(e)}")
             return []
     
+    @_timed("get")
     def get_creation_by_id(self, creation_id: str) -> Optional[Dict[str, Any]]:
+        if self.short_term:
+            creation = self.short_term.get(creation_id)
+            if creation is not None:
+                return creation
+        if self.write_behind:
+            queued = self.write_behind.get(creation_id)
+            if queued is not None:
+                return self._to_record(queued)
         try:
-            if self.memory_type == "sqlite":
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                
-                cursor.execute(
-                    "SELECT * FROM creations WHERE id = ?",
-                    (creation_id,)
-                )
-                row = cursor.fetchone()
-                conn.close()
+            if self.has_records:
+                with self.pool.connection() as conn:
+                    row = conn.execute(
+                        f"SELECT {CREATION_COLUMNS} FROM creations WHERE id = ?",
+                        (creation_id,)
+                    ).fetchone()
                 
                 if row:
-                    return {
-                        "id": row[0],
-                        "session_id": row[1],
-                        "prompt": row[2],
-                        "image_path": row[3],
-                        "model_path": row[4],
-                        "metadata": json.loads(row[5]),
-                        "created_at": row[6]
-                    }
+                    return self._row_to_creation(row)
             return None
         except Exception as e:
             logging.error(f"Error retrieving creation: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+    
+    @_timed("get_many")
+    def get_creations_by_ids(self, creation_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch several creations in one query, keyed by id; missing ids are left out."""
+        if not creation_ids or not self.has_records:
+            return {}
+        self._flush_queued()
+        placeholders = ", ".join("?" for _ in creation_ids)
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT {CREATION_COLUMNS} FROM creations WHERE id IN ({placeholders})",
+                tuple(creation_ids)
+            ).fetchall()
+        return {row[0]: self._row_to_creation(row) for row in rows}
+    
+    def rebuild_index(self, batch_size: int = 500) -> int:
+        """Regenerate the similarity index from the SQLite records. Returns the count indexed."""
+        if self.memory_type != "hybrid":
+            raise RuntimeError("Rebuilding the index needs hybrid memory")
+        try:
+            self._flush_queued()
+            self.index_buffer.flush()
+            self.chroma_client.delete_collection(name="creative_memory")
+            self.collection = self.chroma_client.get_or_create_collection(name="creative_memory")
+            return self._index_records(batch_size, skip_indexed=False)
+        except Exception as e:
+            logging.error(f"Error rebuilding similarity index: {str(e)}")
+            raise RuntimeError(f"Failed to rebuild similarity index: {str(e)}")
+    
+    def backfill_index(self, batch_size: int = 500) -> int:
+        """Index the SQLite records the similarity index does not have yet. Returns the count added."""
+        if self.memory_type != "hybrid":
+            raise RuntimeError("Backfilling the index needs hybrid memory")
+        try:
+            self._flush_queued()
+            self.index_buffer.flush()
+            return self._index_records(batch_size, skip_indexed=True)
+        except Exception as e:
+            logging.error(f"Error backfilling similarity index: {str(e)}")
+            raise RuntimeError(f"Failed to backfill similarity index: {str(e)}")
+    
+    def _index_records(self, batch_size: int, skip_indexed: bool) -> int:
+        indexed, last_rowid = 0, 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    "SELECT rowid, id, session_id, prompt FROM creations "
+                    "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch_size)
+                ).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            
+            creations = [
+                {"creation_id": id, "session_id": session_id, "prompt": prompt}
+                for _, id, session_id, prompt in rows
+            ]
+            if skip_indexed:
+                present = set(self.collection.get(ids=[c["creation_id"] for c in creations], include=[])["ids"])
+                creations = [c for c in creations if c["creation_id"] not in present]
+            if creations:
+                self._index_creations(creations)
+                indexed += len(creations)
+                logging.info(f"Indexed {indexed} creation(s)")
+        return indexed
+    
+    def list_older_than(self, cutoff: str, limit: int) -> List[Dict[str, Any]]:
+        """Up to limit creations made before an ISO timestamp, oldest first."""
+        return self._select_for_retention(
+            f"SELECT {CREATION_COLUMNS} FROM creations WHERE created_at < ? ORDER BY created_at, id LIMIT ?",
+            (cutoff, limit)
+        )
+    
+    def list_session_overflow(self, max_per_session: int, limit: int) -> List[Dict[str, Any]]:
+        """Up to limit creations beyond the max_per_session newest of their session, oldest first."""
+        return self._select_for_retention(
+            f"SELECT {CREATION_COLUMNS} FROM ("
+            f"  SELECT {CREATION_COLUMNS}, ROW_NUMBER() OVER ("
+            "    PARTITION BY session_id ORDER BY created_at DESC, id DESC"
+            "  ) AS newest FROM creations"
+            ") WHERE newest > ? ORDER BY created_at, id LIMIT ?",
+            (max_per_session, limit)
+        )
+    
+    def list_oldest(self, limit: int) -> List[Dict[str, Any]]:
+        """The limit oldest creations."""
+        return self._select_for_retention(
+            f"SELECT {CREATION_COLUMNS} FROM creations ORDER BY created_at, id LIMIT ?",
+            (limit,)
+        )
+    
+    def _select_for_retention(self, query: str, params: Tuple) -> List[Dict[str, Any]]:
+        if not self.has_records:
+            raise RuntimeError("Retention needs SQLite records (sqlite or hybrid memory)")
+        self._flush_queued()
+        with self.pool.connection() as conn:
+            return [self._row_to_creation(row) for row in conn.execute(query, params).fetchall()]
+    
+    @_timed("delete")
+    def delete_creations(self, creation_ids: List[str]) -> int:
+        """Delete creations from every tier: short-term, SQLite and the similarity index.
+
+        Returns the number of SQLite records deleted. Their artifact files are
+        the caller's to release.
+        """
+        if not creation_ids:
+            return 0
+        try:
+            self._flush_queued()
+            if self.short_term:
+                self.short_term.discard(creation_ids)
+            deleted = 0
+            if self.has_records:
+                placeholders = ", ".join("?" for _ in creation_ids)
+                with self.pool.connection() as conn:
+                    deleted = conn.execute(
+                        f"DELETE FROM creations WHERE id IN ({placeholders})", tuple(creation_ids)
+                    ).rowcount
+            if self.has_index:
+                # A buffered upsert would otherwise bring a deleted id back
+                self.index_buffer.flush()
+                self.collection.delete(ids=list(creation_ids))
+            return deleted
+        except Exception as e:
+            logging.error(f"Error deleting creations: {str(e)}")
+            raise RuntimeError(f"Failed to delete creations: {str(e)}")
+    
+    def compact(self) -> None:
+        """Reclaim the space of deleted rows in the SQLite database and Chroma's own store."""
+        if self.has_records:
+            with self.pool.connection() as conn:
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if self.has_index:
+            self.index_buffer.flush()
+            chroma_db = os.path.join(self.vector_db_path, "chroma.sqlite3")
+            if os.path.exists(chroma_db):
+                try:
+                    conn = sqlite3.connect(chroma_db, timeout=30)
+                    try:
+                        conn.execute("VACUUM")
+                    finally:
+                        conn.close()
+                except sqlite3.Error as e:
+                    # Chroma may hold a write lock; the next run tries again
+                    logging.warning(f"Could not vacuum the vector store: {str(e)}")
+    
+    def list_session_creations(self,
+                               session_id: str,
+                               limit: int = 20,
+                               cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Page through a session's creations, newest first.
+
+        Pass the returned next_cursor back in to get the following page.
+        """
+        return self._list_page("session_id = ?", (session_id,), limit, cursor)
+    
+    def list_recent(self, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Page through all creations, newest first."""
+        return self._list_page("1 = 1", (), limit, cursor)
+    
+    @_timed("list")
+    def _list_page(self, where: str, params: Tuple, limit: int, cursor: Optional[str]) -> Dict[str, Any]:
+        try:
+            if not self.has_records:
+                return {"creations": [], "next_cursor": None}
+            self._flush_queued()
+            
+            # Keyset pagination: seek past the last (created_at, id) seen
+            # instead of OFFSET, so deep pages cost the same as the first
+            if cursor:
+                created_at, last_id = cursor.split("|", 1)
+                where += " AND (created_at, id) < (?, ?)"
+                params = params + (created_at, last_id)
+            
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT {CREATION_COLUMNS} FROM creations WHERE {where} "
+                    "ORDER BY created_at DESC, id DESC LIMIT ?",
+                    params + (limit + 1,)
+                ).fetchall()
+            
+            creations = [self._row_to_creation(row) for row in rows[:limit]]
+            next_cursor = None
+            if len(rows) > limit:
+                last = creations[-1]
+                next_cursor = f"{last['created_at']}|{last['id']}"
+            return {"creations": creations, "next_cursor": next_cursor}
+        except Exception as e:
+            logging.error(f"Error listing creations: {str(e)}")
+            return {"creations": [], "next_cursor": None}
+    
+    def _flush_queued(self) -> None:
+        """Write queued saves before reading SQLite directly, so results include them."""
+        if self.write_behind:
+            self.write_behind.flush()
+    
+    @staticmethod
+    def _to_record(creation: Dict[str, Any]) -> Dict[str, Any]:
+        """A save_creations item in the shape get_creation_by_id returns."""
+        return {
+            "id": creation["creation_id"],
+            "session_id": creation["session_id"],
+            "prompt": creation["prompt"],
+            "image_path": creation.get("image_path"),
+            "model_path": creation.get("model_path"),
+            "metadata": creation.get("metadata") or {},
+            "created_at": creation["created_at"]
+        }
+    
+    def _shape_similar(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """A record in the shape this memory type's similarity results take."""
+        if self.memory_type == "vector":
+            # The vector store flattens paths and metadata into one mapping
+            return {
+                "id": record["id"],
+                "prompt": record["prompt"],
+                "image_path": record["image_path"],
+                "model_path": record["model_path"],
+                **record["metadata"]
+            }
+        return dict(record)
+    
+    def _with_distance(self, result: Dict[str, Any], distance: float) -> Dict[str, Any]:
+        return {**result, "distance": distance, "similarity": self._similarity(distance)}
+    
+    @staticmethod
+    def _similarity(distance: float) -> float:
+        # The collection uses squared L2 distance; on unit-length embeddings
+        # that is 2 - 2 * cosine similarity
+        return max(0.0, 1.0 - distance / 2.0)
+    
+    @staticmethod
+    def _row_to_creation(row: Tuple) -> Dict[str, Any]:
+        return {
+            "id": row[0],
+            "session_id": row[1],
+            "prompt": row[2],
+            "image_path": row[3],
+            "model_path": row[4],
+            "metadata": json.loads(row[5]),
+            "created_at": row[6]
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"memory_type": self.memory_type}
+        if self.has_index:
+            stats["embeddings"] = self.embedder.stats()
+            stats["index"] = {**self.index_buffer.stats(), "indexed": self.collection.count()}
+        if self.short_term:
+            stats["short_term"] = self.short_term.stats()
+        if self.write_behind:
+            stats["write_behind"] = self.write_behind.stats()
+        return stats
+    
+    def close(self) -> None:
+        """Write queued saves and buffered index writes, then release the SQLite connections."""
+        if self.write_behind:
+            self.write_behind.close()
+        if self.has_index:
+            self.index_buffer.close()
+        if self.has_records:
+            self.pool.close() 
\ No newline at end of file
@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils.metrics import metrics
+
+SHORT_TERM_LOOKUPS = metrics.counter(
+    "memory_short_term_lookups_total", "Short-term memory lookups by result", ["operation", "result"]
+)
+
+Embed = Callable[[List[str]], List[List[float]]]
+
+
+class ShortTermMemory:
+    """Recent creations per session, kept in process ahead of the long-term stores.
+
+    Holds at most max_per_session creations for each of the max_sessions most
+    recently active sessions, and drops any creation older than ttl_seconds.
+    Embeddings are computed on the first similarity query that needs them and
+    kept with the creation.
+    """
+
+    def __init__(self,
+                 max_per_session: int = 50,
+                 max_sessions: int = 1000,
+                 ttl_seconds: float = 3600.0):
+        self.max_per_session = max(1, max_per_session)
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_seconds = ttl_seconds
+
+        # session id -> creation id -> entry, both oldest first
+        self._sessions: "OrderedDict[str, OrderedDict[str, Dict[str, Any]]]" = OrderedDict()
+        self._session_of: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.similar_hits = 0
+        self.similar_misses = 0
+        self.evictions = 0
+
+    def put(self, creation: Dict[str, Any]) -> None:
+        """Remember a creation record, shaped like MemoryHandler.get_creation_by_id's result."""
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            session_id = creation["session_id"]
+            previous = self._session_of.get(creation["id"])
+            if previous is not None and previous != session_id:
+                self._sessions.get(previous, {}).pop(creation["id"], None)
+            entries = self._sessions.pop(session_id, None) or OrderedDict()
+            entries.pop(creation["id"], None)
+            entries[creation["id"]] = {"creation": creation, "embedding": None, "expires_at": expires_at}
+            self._session_of[creation["id"]] = session_id
+            while len(entries) > self.max_per_session:
+                self._forget(entries.popitem(last=False)[0])
+            self._sessions[session_id] = entries
+            while len(self._sessions) > self.max_sessions:
+                for creation_id in self._sessions.popitem(last=False)[1]:
+                    self._forget(creation_id)
+
+    def get(self, creation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session_id = self._session_of.get(creation_id)
+            entry = self._live(session_id).get(creation_id) if session_id else None
+            if entry is None:
+                self.misses += 1
+                SHORT_TERM_LOOKUPS.inc(operation="get", result="miss")
+                return None
+            self.hits += 1
+        SHORT_TERM_LOOKUPS.inc(operation="get", result="hit")
+        return entry["creation"]
+
+    def discard(self, creation_ids: List[str]) -> None:
+        """Forget creations, e.g. once they have been deleted from long-term memory."""
+        with self._lock:
+            for creation_id in creation_ids:
+                session_id = self._session_of.pop(creation_id, None)
+                if session_id is not None:
+                    self._sessions.get(session_id, {}).pop(creation_id, None)
+
+    def similar(self,
+                session_id: str,
+                query_embedding: Sequence[float],
+                embed: Embed,
+                n_results: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Nearest held creations of one session, as (creation, squared L2 distance), closest first."""
+        with self._lock:
+            entries = list(self._live(session_id).values())
+            missing = [entry for entry in entries if entry["embedding"] is None]
+        if not entries:
+            return []
+
+        if missing:
+            # Embedded outside the lock; a racing query at worst embeds the same text twice
+            vectors = embed([entry["creation"]["prompt"] for entry in missing])
+            with self._lock:
+                for entry, vector in zip(missing, vectors):
+                    entry["embedding"] = vector
+
+        scored = [
+            (entry["creation"], sum((a - b) ** 2 for a, b in zip(query_embedding, entry["embedding"])))
+            for entry in entries
+        ]
+        scored.sort(key=lambda pair: pair[1])
+        return scored[:n_results]
+
+    def record_similar(self, hit: bool) -> None:
+        """Count a similarity query as answered here or passed on to the long-term index."""
+        with self._lock:
+            if hit:
+                self.similar_hits += 1
+            else:
+                self.similar_misses += 1
+        SHORT_TERM_LOOKUPS.inc(operation="similar", result="hit" if hit else "miss")
+
+    def _live(self, session_id: str) -> "OrderedDict[str, Dict[str, Any]]":
+        """A session's unexpired entries; call with the lock held."""
+        entries = self._sessions.get(session_id)
+        if entries is None:
+            return OrderedDict()
+        now = time.monotonic()
+        while entries and next(iter(entries.values()))["expires_at"] <= now:
+            self._forget(entries.popitem(last=False)[0])
+        if not entries:
+            del self._sessions[session_id]
+        return entries
+
+    def _forget(self, creation_id: str) -> None:
+        self._session_of.pop(creation_id, None)
+        self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        queries = self.similar_hits + self.similar_misses
+        return {
+            "sessions": len(self._sessions),
+            "creations": len(self._session_of),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "similar_hits": self.similar_hits,
+            "similar_misses": self.similar_misses,
+            "similar_hit_rate": self.similar_hits / queries if queries else 0.0,
+            "evictions": self.evictions
+        }
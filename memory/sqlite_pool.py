@@ -0,0 +1,69 @@
+import logging
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+
+# WAL lets readers proceed during a write; NORMAL sync is durable across
+# application crashes under WAL and avoids an fsync per commit
+DEFAULT_PRAGMAS: Dict[str, str] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": "5000",
+    "cache_size": "-65536",      # 64 MiB page cache per connection
+    "temp_store": "MEMORY",
+    "mmap_size": "268435456",    # 256 MiB
+    "foreign_keys": "ON",
+}
+
+
+class SQLitePool:
+    """Fixed-size pool of long-lived SQLite connections shared across threads."""
+
+    def __init__(self, db_path: str, size: int = 4, pragmas: Dict[str, str] = None):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._all: List[sqlite3.Connection] = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+        for _ in range(self.size):
+            conn = self._connect()
+            self._all.append(conn)
+            self._idle.put(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; commits on success and rolls back on error."""
+        if self._closed:
+            raise RuntimeError("SQLite pool is closed")
+        conn = self._idle.get()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for conn in self._all:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logging.error(f"Error closing SQLite connection: {str(e)}")
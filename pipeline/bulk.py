@@ -0,0 +1,202 @@
+"""Run a JSONL file of creation requests through the pipeline.
+
+Each input line is an InputClass record ({"prompt": ..., "session_id": ...,
+"reference_id": ...}). Results are appended to the output JSONL as they
+finish, one line per input line, tagged with the input line number. The
+output file doubles as the checkpoint: rerunning the same input and output
+skips every line that already has a successful result.
+
+Usage:
+    python -m pipeline.bulk requests.jsonl results.jsonl --concurrency 4
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from pipeline.pipeline_handler import PipelineHandler
+
+
+class BulkRunner:
+    def __init__(self,
+                 pipeline: PipelineHandler,
+                 concurrency: int = 4,
+                 chunk_size: Optional[int] = None):
+        self.pipeline = pipeline
+        self.concurrency = max(1, concurrency)
+        # Creations in flight: a sliding window topped up as each one finishes,
+        # a little over the pool size so a worker never waits for the next
+        self.window = self.concurrency * 2
+        # Finished records whose memory writes go out in one call
+        self.chunk_size = chunk_size or self.concurrency * 2
+
+        self.total = 0
+        self.skipped = 0
+        self.completed = 0
+        self.failed = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def completed_lines(output_path: str) -> Set[int]:
+        """Line numbers that already have a successful result in the output file."""
+        done: Set[int] = set()
+        if not os.path.exists(output_path):
+            return done
+        with open(output_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a partial last line from a crashed run
+                if record.get("status") == "completed":
+                    done.add(record["line"])
+        return done
+
+    @staticmethod
+    def read_requests(input_path: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+        """(line number, request, None) per line, or (line number, None, error) for a malformed one."""
+        with open(input_path) as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line), None
+                except ValueError as e:
+                    yield line_number, None, f"Malformed JSON: {str(e)}"
+
+    def run(self, input_path: str, output_path: str) -> Dict[str, Any]:
+        """Process every pending line of input_path, appending results to output_path."""
+        self.started_at = time.time()
+        try:
+            done = self.completed_lines(output_path)
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bulk") as pool, \
+                    open(output_path, "a") as output:
+                in_flight: Set[Future] = set()
+                finished: List[Dict[str, Any]] = []
+                for line_number, request, error in self.read_requests(input_path):
+                    self.total += 1
+                    if line_number in done:
+                        self.skipped += 1
+                        continue
+                    if error:
+                        logging.error(f"Error reading bulk line {line_number}: {error}")
+                        self._write_records([{"line": line_number, "status": "failed", "error": error}], output)
+                        continue
+                    in_flight.add(pool.submit(self._create, line_number, request))
+                    if len(in_flight) >= self.window:
+                        # Wait for any one creation, never for the slowest of a batch
+                        done_now, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        finished = self._collect(done_now, finished, output)
+                while in_flight:
+                    done_now, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    finished = self._collect(done_now, finished, output, flush=not in_flight)
+        finally:
+            # Also when the run fails, so it never reports itself as running forever
+            self.finished_at = time.time()
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "running": self.started_at is not None and self.finished_at is None,
+            "elapsed_seconds": end - self.started_at if self.started_at else 0.0
+        }
+
+    def _create(self, line_number: int, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            result = self.pipeline.process_creation(
+                prompt=request["prompt"],
+                session_id=request.get("session_id"),
+                reference_id=request.get("reference_id"),
+                persist=False
+            )
+            return {"line": line_number, "status": "completed", "result": result}
+        except Exception as e:
+            logging.error(f"Error processing bulk line {line_number}: {str(e)}")
+            return {"line": line_number, "status": "failed", "error": str(e)}
+
+    def _collect(self, done: Set[Future], finished: List[Dict[str, Any]], output,
+                 flush: bool = False) -> List[Dict[str, Any]]:
+        """Add finished creations; saves them once chunk_size are waiting (or on flush). Returns those still waiting."""
+        finished = finished + [future.result() for future in done]
+        if len(finished) >= self.chunk_size or (flush and finished):
+            self._save_chunk(finished, output)
+            return []
+        return finished
+
+    def _save_chunk(self, records: List[Dict[str, Any]], output) -> None:
+        succeeded = [r for r in records if r["status"] == "completed"]
+
+        # One memory write for the whole chunk, committed before results.jsonl
+        # (the checkpoint) says completed, so never left in the write-behind queue
+        try:
+            self.pipeline.memory_handler.save_creations([
+                {
+                    "creation_id": r["result"]["creation_id"],
+                    "session_id": r["result"]["session_id"],
+                    "prompt": r["result"]["enhanced_prompt"],
+                    "image_path": r["result"]["image_path"],
+                    "model_path": r["result"]["model_path"],
+                    "metadata": r["result"]["metadata"]
+                }
+                for r in succeeded
+            ], durable=True)
+        except Exception as e:
+            for r in succeeded:
+                # Never saved, so nothing else will release their artifacts
+                self.pipeline.discard_result(r["result"])
+                r.update(status="failed", error=str(e))
+
+        self._write_records(records, output)
+
+    def _write_records(self, records: List[Dict[str, Any]], output) -> None:
+        with self._write_lock:
+            for record in records:
+                output.write(json.dumps(record) + "\n")
+                if record["status"] == "completed":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            # Results on disk are the checkpoint, so make them durable per chunk
+            output.flush()
+            os.fsync(output.fileno())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a JSONL file of creation requests.")
+    parser.add_argument("input", help="JSONL file of InputClass records")
+    parser.add_argument("output", help="Results JSONL; existing successful lines are skipped")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--user", default="super-user", help="Configuration to use from main.py")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from main import configurations
+    from pipeline.registry import registry
+
+    try:
+        runner = BulkRunner(
+            registry.get(configurations[args.user]),
+            concurrency=args.concurrency,
+            chunk_size=args.chunk_size
+        )
+        print(json.dumps(runner.run(args.input, args.output), indent=2))
+    finally:
+        # Flushes the write-behind queue and index buffer, whose records
+        # results.jsonl already lists as completed
+        registry.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from typing import Any, Callable, ContextManager, Dict, List, Optional
+
+from pipeline.pipeline_handler import PipelineHandler
+from utils.tracing import trace
+
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class JobQueue:
+    """SQLite-backed queue of creation jobs served by a bounded worker pool.
+
+    Jobs and their stage events are persisted, so queued (and interrupted)
+    jobs are picked up again when the queue is restarted.
+
+    Several processes (uvicorn workers) may share one database. Each job is
+    leased to the process that queued or claimed it, which renews the lease
+    while it holds the job; only a job whose lease has run out, because its
+    process died, is taken over by another.
+
+    pipeline_provider returns a context manager (such as HandlerRegistry.lease)
+    that holds the pipeline for the duration of one job.
+    """
+
+    def __init__(self,
+                 pipeline_provider: Callable[[], ContextManager[PipelineHandler]],
+                 db_path: str = "memory/jobs.db",
+                 workers: int = 2,
+                 max_pending: int = 100,
+                 runner: Optional[Callable[..., Dict]] = None,
+                 lease_seconds: float = 30.0):
+        self.pipeline_provider = pipeline_provider
+        # Runs one creation; defaults to the pipeline's own process_creation
+        self.runner = runner
+        self.db_path = db_path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._pending: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._db_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        try:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            # Written by every API worker: readers never wait on a writer, and
+            # writers wait for each other rather than failing
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT,
+                    prompt TEXT,
+                    session_id TEXT,
+                    reference_id TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    updated_at REAL,
+                    owner TEXT,
+                    lease_until REAL
+                )
+            ''')
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    # Databases from before leases
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS job_events (
+                    job_id TEXT,
+                    seq INTEGER,
+                    stage TEXT,
+                    status TEXT,
+                    info TEXT,
+                    created_at REAL,
+                    PRIMARY KEY (job_id, seq)
+                )
+            ''')
+            self._conn.commit()
+        except Exception as e:
+            logging.error(f"Error initializing job queue: {str(e)}")
+            raise RuntimeError(f"Failed to initialize job queue: {str(e)}")
+
+    def start(self) -> None:
+        """Take over unfinished jobs whose process is gone, and start the workers."""
+        self._stopped.clear()
+        self._adopt_expired()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._renew_leases, name="job-leases", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Stop the workers after their current job; queued jobs stay persisted."""
+        self._stopped.set()
+        for _ in range(self.workers):
+            self._pending.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        # Released, so another process can take the remaining jobs over at once
+        with self._db_lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', lease_until = NULL "
+                "WHERE owner = ? AND status IN ('queued', 'running')",
+                (self.owner,)
+            )
+            self._conn.commit()
+
+    def _adopt_expired(self) -> None:
+        """Queue here the unfinished jobs whose owner stopped renewing their lease."""
+        now = time.time()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') "
+                "AND (lease_until IS NULL OR lease_until < ?) ORDER BY created_at",
+                (now,)
+            ).fetchall()
+            adopted = []
+            for (job_id,) in rows:
+                # Conditional, so two processes adopting at once cannot both win a job
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', owner = ?, lease_until = ? WHERE id = ? "
+                    "AND status IN ('queued', 'running') AND (lease_until IS NULL OR lease_until < ?)",
+                    (self.owner, now + self.lease_seconds, job_id, now)
+                )
+                if cursor.rowcount:
+                    adopted.append(job_id)
+            self._conn.commit()
+        for job_id in adopted:
+            self._pending.put(job_id)
+        if adopted:
+            logging.info(f"Requeued {len(adopted)} unfinished jobs")
+
+    def _renew_leases(self) -> None:
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                with self._db_lock:
+                    self._conn.execute(
+                        "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                        (time.time() + self.lease_seconds, self.owner)
+                    )
+                    self._conn.commit()
+                self._adopt_expired()
+            except Exception as e:
+                logging.error(f"Error renewing job leases: {str(e)}")
+
+    def submit(self,
+               prompt: str,
+               session_id: Optional[str] = None,
+               reference_id: Optional[str] = None) -> str:
+        """Persist a new job and queue it; returns the job id immediately."""
+        if self._pending.qsize() >= self.max_pending:
+            raise QueueFullError(f"Job queue is full ({self.max_pending} pending)")
+
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute('''
+                INSERT INTO jobs (id, status, prompt, session_id, reference_id, created_at, updated_at,
+                                  owner, lease_until)
+                VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?)
+            ''', (job_id, prompt, session_id, reference_id, now, now, self.owner, now + self.lease_seconds))
+            self._conn.commit()
+        self._pending.put(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT id, status, prompt, session_id, reference_id, result, error, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "prompt": row[2],
+            "session_id": row[3],
+            "reference_id": row[4],
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "created_at": row[7],
+            "updated_at": row[8]
+        }
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Return the stage events of a job with a sequence number above after."""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT seq, stage, status, info, created_at FROM job_events "
+                "WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after)
+            ).fetchall()
+        return [
+            {"seq": seq, "stage": stage, "status": status, "created_at": created_at, **json.loads(info)}
+            for seq, stage, status, info, created_at in rows
+        ]
+
+    async def wait_for_events(self,
+                              job_id: str,
+                              after: int = 0,
+                              timeout: float = 15.0,
+                              poll_seconds: float = 0.25) -> List[Dict[str, Any]]:
+        """Wait until the job has events newer than after, or the timeout passes.
+
+        Polls the table, so events recorded by another API worker arrive as
+        promptly as local ones, and no thread is held while waiting.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self.events(job_id, after)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            await asyncio.sleep(min(poll_seconds, remaining))
+
+    def _record_event(self, job_id: str, stage: str, status: str, info: Dict[str, Any]) -> None:
+        with self._db_lock:
+            (seq,) = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT INTO job_events (job_id, seq, stage, status, info, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, seq, stage, status, json.dumps(info), time.time())
+            )
+            self._conn.commit()
+
+    def _set_status(self, job_id: str, status: str,
+                    result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        with self._db_lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result else None, error, time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def _claim(self, job_id: str) -> bool:
+        """Mark a job this process holds as running; False if another process has taken it over."""
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND status = 'queued'",
+                (time.time() + self.lease_seconds, time.time(), job_id, self.owner)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._pending.get()
+            if job_id is None:
+                break
+            job = self.get(job_id)
+            if not job or job["status"] in TERMINAL_STATUSES or not self._claim(job_id):
+                continue
+
+            self._record_event(job_id, "job", "started", {})
+            start = time.perf_counter()
+            try:
+                with ExitStack() as stack:
+                    run = self.runner or stack.enter_context(self.pipeline_provider()).process_creation
+                    # Logs of a job are traced under its id
+                    with trace(job_id):
+                        result = run(
+                            prompt=job["prompt"],
+                            session_id=job["session_id"],
+                            reference_id=job["reference_id"],
+                            progress=lambda stage, status, info: self._record_event(job_id, stage, status, info)
+                        )
+                self._set_status(job_id, "completed", result=result)
+                self._record_event(job_id, "job", "completed", {"seconds": time.perf_counter() - start})
+            except Exception as e:
+                logging.error(f"Error running job {job_id}: {str(e)}")
+                self._set_status(job_id, "failed", error=str(e))
+                self._record_event(job_id, "job", "failed", {
+                    "seconds": time.perf_counter() - start,
+                    "error": str(e)
+                })
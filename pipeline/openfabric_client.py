@@ -0,0 +1,231 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional
+
+from openfabric_pysdk.context import Stub
+
+from utils.metrics import metrics
+
+# Prompts are a few hundred bytes; images and GLBs run to megabytes
+PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1 << 20, 4 << 20, 16 << 20, 64 << 20)
+
+CALLS = metrics.counter("openfabric_calls_total", "Openfabric calls by app and outcome", ["app_id", "outcome"])
+STUB_SECONDS = metrics.histogram("openfabric_stub_seconds", "Latency of each Stub.call attempt", ["app_id"])
+PAYLOAD_BYTES = metrics.histogram(
+    "openfabric_payload_bytes", "Size of Openfabric requests and responses", ["app_id", "direction"],
+    buckets=PAYLOAD_BUCKETS
+)
+
+
+def payload_size(data: Dict[str, Any]) -> int:
+    """Bytes of the str and bytes values of a request or response."""
+    return sum(len(value) for value in (data or {}).values() if isinstance(value, (str, bytes)))
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """Fails fast after repeated failures, then lets one trial call through."""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class _AppStats:
+    def __init__(self):
+        self.calls = 0
+        self.attempts = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+        self.latencies: List[float] = []
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in self.__dict__.items() if k != "latencies"}
+
+
+class OpenfabricClient:
+    """Wraps Stub.call with timeouts, bounded concurrency, retries, hedging and a circuit breaker.
+
+    A timed-out call cannot be cancelled inside the Stub; its thread is left to
+    finish in the background and its result is discarded.
+    """
+
+    def __init__(self,
+                 stub: Stub,
+                 uid: str = 'super-user',
+                 timeouts: Optional[Dict[str, float]] = None,
+                 default_timeout: float = 120.0,
+                 max_concurrency: int = 4,
+                 retries: int = 2,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 8.0,
+                 hedge_apps: Iterable[str] = (),
+                 hedge_delay: float = 0.0,
+                 breaker_threshold: int = 5,
+                 breaker_reset_seconds: float = 30.0):
+        self.stub = stub
+        self.uid = uid
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_apps = set(hedge_apps) if hedge_delay > 0 else set()
+        self.hedge_delay = hedge_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, _AppStats] = {}
+        self._lock = threading.Lock()
+        # Room for four apps at full concurrency; hedges share their app's slots
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * 4, thread_name_prefix="openfabric")
+
+    def _per_app(self, app_id: str):
+        with self._lock:
+            if app_id not in self._stats:
+                self._semaphores[app_id] = threading.BoundedSemaphore(self.max_concurrency)
+                self._breakers[app_id] = CircuitBreaker(self.breaker_threshold, self.breaker_reset_seconds)
+                self._stats[app_id] = _AppStats()
+            return self._semaphores[app_id], self._breakers[app_id], self._stats[app_id]
+
+    def call(self, app_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Call an Openfabric app, retrying failures with jittered exponential backoff."""
+        semaphore, breaker, stats = self._per_app(app_id)
+        stats.calls += 1
+        PAYLOAD_BYTES.observe(payload_size(data), app_id=app_id, direction="request")
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                stats.rejected += 1
+                CALLS.inc(app_id=app_id, outcome="rejected")
+                raise CircuitOpenError(f"Circuit open for app {app_id} after {breaker.failures} failures")
+            if attempt:
+                stats.retries += 1
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+            start = time.perf_counter()
+            try:
+                result = self._attempt(app_id, data, semaphore, stats)
+            except Exception as e:
+                last_error = e
+                stats.failures += 1
+                breaker.record_failure()
+                logging.warning(f"Openfabric app {app_id} attempt {attempt + 1} failed: {str(e)}")
+                continue
+
+            stats.latencies.append(time.perf_counter() - start)
+            del stats.latencies[:-1000]
+            breaker.record_success()
+            CALLS.inc(app_id=app_id, outcome="ok")
+            PAYLOAD_BYTES.observe(payload_size(result), app_id=app_id, direction="response")
+            return result
+
+        CALLS.inc(app_id=app_id, outcome="failed")
+        raise RuntimeError(f"Openfabric app {app_id} failed after {self.retries + 1} attempts: {str(last_error)}")
+
+    def _attempt(self, app_id: str, data: Dict[str, Any],
+                 semaphore: threading.BoundedSemaphore, stats: _AppStats) -> Dict[str, Any]:
+        timeout = self.timeouts.get(app_id, self.default_timeout)
+        deadline = time.monotonic() + timeout
+        if not semaphore.acquire(timeout=timeout):
+            stats.timeouts += 1
+            raise TimeoutError(f"No free slot for app {app_id} within {timeout}s")
+
+        futures = [self._submit(app_id, data, semaphore, stats)]
+        if app_id in self.hedge_apps:
+            done, _ = wait(futures, timeout=min(self.hedge_delay, timeout))
+            # Hedge only with a spare slot, so hedges never queue behind real calls
+            if not done and semaphore.acquire(blocking=False):
+                stats.hedges += 1
+                futures.append(self._submit(app_id, data, semaphore, stats))
+
+        # First successful answer wins; the loser's result is discarded
+        pending = set(futures)
+        errors = []
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        stats.hedge_wins += 1
+                    return future.result()
+                errors.append(future.exception())
+        if not pending:
+            raise errors[0]
+        stats.timeouts += 1
+        raise TimeoutError(f"App {app_id} did not answer within {timeout}s")
+
+    def _submit(self, app_id: str, data: Dict[str, Any],
+                semaphore: threading.BoundedSemaphore, stats: _AppStats) -> Future:
+        stats.attempts += 1
+
+        def run() -> Dict[str, Any]:
+            try:
+                with STUB_SECONDS.time(app_id=app_id):
+                    return self.stub.call(app_id, data, self.uid)
+            finally:
+                # The slot is held until the remote call really ends, even after a timeout
+                semaphore.release()
+
+        return self._executor.submit(run)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            app_id: {**stats.as_dict(), "breaker": self._breakers[app_id].state}
+            for app_id, stats in list(self._stats.items())
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
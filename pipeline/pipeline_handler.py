@@ -1,23 +1,140 @@
+import asyncio
+import functools
+import logging
 import os
+import threading
+import time
 import uuid
-from typing import Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
 
-from llm.llm_handler import LLMHandler
-from memory.memory_handler import MemoryHandler
 from openfabric_pysdk.context import Stub
+from pipeline.openfabric_client import OpenfabricClient
+from utils.file_ops import Artifact, ArtifactStore
+from utils.thumbnails import ThumbnailCache
+from utils.tracing import in_context, span
+
+if TYPE_CHECKING:
+    # Type-only: importing them pulls in torch, transformers and chromadb
+    from llm.llm_handler import LLMHandler
+    from memory.memory_handler import MemoryHandler
+
+
+DEFAULT_APP_IDS = [
+    "f0997a01-d6d3-a5fe-53d8-561300318557",  # text-to-image
+    "69543f29-4d41-4afc-7f29-3d51591f11eb"   # image-to-3D
+]
+
+
+# progress(stage, status, info) with status one of started / finished / failed
+ProgressCallback = Callable[[str, str, Dict[str, Any]], None]
+
+# reuse_mode values: "full" reuses a near-duplicate's image and GLB, "model"
+# renders a new image but reuses its GLB
+REUSE_MODES = ("off", "full", "model")
+
+
+@dataclass
+class ArtifactReuse:
+    """A past creation whose artifacts stand in for new Openfabric calls."""
+    creation_id: str
+    similarity: float
+    mode: str
+    image: Optional[Artifact]
+    model: Artifact
+    preview: Optional[Artifact] = None
+
+    @property
+    def calls_saved(self) -> int:
+        return 2 if self.image is not None else 1
+
+    @property
+    def artifacts(self) -> List[Artifact]:
+        """The artifacts retained for this reuse, one reference each."""
+        return [artifact for artifact in (self.image, self.model, self.preview) if artifact is not None]
+
+    def as_metadata(self) -> Dict[str, Any]:
+        return {"creation_id": self.creation_id, "similarity": self.similarity, "mode": self.mode}
 
 
 class PipelineHandler:
     def __init__(self, 
                  stub: Stub,
-                 llm_handler: LLMHandler,
-                 memory_handler: MemoryHandler,
-                 config: Dict):
+                 llm_handler: "LLMHandler",
+                 memory_handler: "MemoryHandler",
+                 config: Dict,
+                 artifact_store: Optional[ArtifactStore] = None,
+                 thumbnails: Optional[ThumbnailCache] = None):
         self.stub = stub
         self.llm_handler = llm_handler
         self.memory_handler = memory_handler
         self.config = config
+        self.artifact_store = artifact_store or ArtifactStore()
+        self.thumbnails = thumbnails or ThumbnailCache(
+            root=os.path.join(self.artifact_store.root, "thumbnails"),
+            image_root=self.artifact_store.root,
+            default_size=config.get("thumbnail_size", 256),
+            image_format=config.get("thumbnail_format", "webp")
+        )
+        
+        # app_ids are [text-to-image, image-to-3D]
+        self.text_to_image_app, self.image_to_3d_app = config.get("app_ids") or DEFAULT_APP_IDS
+        self.openfabric = OpenfabricClient(
+            stub,
+            timeouts=config.get("openfabric_timeouts"),
+            default_timeout=config.get("openfabric_timeout_seconds", 120.0),
+            max_concurrency=config.get("openfabric_max_concurrency", 4),
+            retries=config.get("openfabric_retries", 2),
+            hedge_apps=[self.text_to_image_app],
+            hedge_delay=config.get("openfabric_hedge_delay_seconds", 0.0),
+            breaker_threshold=config.get("openfabric_breaker_threshold", 5),
+            breaker_reset_seconds=config.get("openfabric_breaker_reset_seconds", 30.0)
+        )
+        
+        # Executors for process_creation_async: LLM calls are CPU-bound and get
+        # their own pool; Openfabric round-trips and disk I/O share the other
+        self._llm_executor = ThreadPoolExecutor(
+            max_workers=config.get("llm_max_batch_size", 1),
+            thread_name_prefix="pipeline-llm"
+        )
+        self._io_executor = ThreadPoolExecutor(
+            max_workers=config.get("io_workers", 16),
+            thread_name_prefix="pipeline-io"
+        )
+        
+        # Reference-based creations enhance and analyze in one generation when the LLM supports it
+        self.fused_reference = (config.get("llm_fused_reference", True)
+                                and hasattr(llm_handler, "enhance_with_reference"))
+        
+        # Near-duplicate short-circuit, off unless configured
+        self.reuse_mode = config.get("reuse_mode", "off")
+        if self.reuse_mode not in REUSE_MODES:
+            raise ValueError(f"Unsupported reuse mode: {self.reuse_mode}")
+        self.reuse_threshold = config.get("reuse_threshold", 0.95)
+        self.reuse_query = config.get("reuse_query", "enhanced")
+        self.reuse_lookups = 0
+        self.reuse_hits = 0
+        self.openfabric_calls_saved = 0
+        self._reuse_lock = threading.Lock()
+        
+        # GLB post-processing in a process pool, off unless configured
+        self.model_optimizer = None
+        if config.get("model_optimization", False):
+            # Imported here so numpy only loads when the stage is on
+            from utils.glb import GLBOptimizer, GLBOptions
+            self.model_optimizer = GLBOptimizer(
+                GLBOptions(
+                    quantize=config.get("model_quantize", True),
+                    position_bits=config.get("model_position_bits", 14),
+                    max_triangles=config.get("model_max_triangles"),
+                    preview_triangles=config.get("model_preview_triangles", 5000)
+                ),
+                workers=config.get("model_optimizer_workers", 2),
+                timeout_seconds=config.get("model_optimize_timeout_seconds", 120.0)
+            )
         
         # Create output directories
         os.makedirs("static/images", exist_ok=True)
@@ -26,70 +143,357 @@ class PipelineHandler:
     def process_creation(self,
                         prompt: str,
                         session_id: Optional[str] = None,
-                        reference_id: Optional[str] = None) -> Dict:
-        """Process a creation request from prompt to 3D model."""
+                        reference_id: Optional[str] = None,
+                        progress: Optional[ProgressCallback] = None,
+                        persist: bool = True) -> Dict:
+        """Process a creation request from prompt to 3D model.
+
+        If given, progress is called as progress(stage, status, info) when each
+        stage (enhance, image, 3d, optimize when enabled, persist) starts,
+        finishes or fails. With persist=False the memory write is left to the
+        caller, so it can save several results at once with
+        MemoryHandler.save_creations.
+        """
         
         # Generate unique IDs
         creation_id = str(uuid.uuid4())
         if not session_id:
             session_id = str(uuid.uuid4())
         
-        # Step 1: Get reference if provided
-        reference_info = None
-        if reference_id:
-            reference_info = self.memory_handler.get_creation_by_id(reference_id)
+        # References taken on artifacts are dropped again if the creation fails
+        with self._holding() as held:
+            with self.stage(progress, "enhance"):
+                # Step 1: Get reference if provided
+                reference_info = None
+                if reference_id:
+                    with span("enhance.reference"):
+                        reference_info = self.memory_handler.get_creation_by_id(reference_id)
+                
+                # Step 2: Enhance prompt using LLM
+                enhanced_prompt, analysis = self.enhance(prompt, reference_info)
+                
+                # A close enough past creation can stand in for Openfabric calls
+                reuse = self.find_reuse(prompt, enhanced_prompt, session_id)
+                if reuse:
+                    held.extend(reuse.artifacts)
+            
+            # Step 3: Generate image
+            with self.stage(progress, "image"):
+                if reuse and reuse.image:
+                    image = reuse.image
+                else:
+                    image_result = self.generate_image(enhanced_prompt)
+                    
+                    # Stored in the background; the bytes go straight to the next stage
+                    image = self.store_image(image_result)
+                    held.append(image)
+                image_path = image.path
+            
+            # Step 4: Generate 3D model
+            preview = reuse.preview if reuse else None
+            optimization = None
+            with self.stage(progress, "3d"):
+                if reuse:
+                    model = reuse.model
+                else:
+                    model_result = self.generate_model(image_result)
+                    
+                    # Save the 3D model, unless the optimized one replaces it
+                    if not self.model_optimizer:
+                        model = self.artifact_store.put(model_result, "model")
+                        held.append(model)
+            
+            # Step 4b: Shrink the model and make its preview
+            if self.model_optimizer and not reuse:
+                with self.stage(progress, "optimize"):
+                    model, preview, optimization = self.store_model(
+                        model_result, self.model_optimizer.optimize(model_result)
+                    )
+                    held.extend(artifact for artifact in (model, preview) if artifact)
+            model_path = model.path
+            
+            # Step 5: Save to memory, once all files are on disk
+            with span("artifact_write"):
+                for artifact in (image, model, preview):
+                    if artifact:
+                        artifact.written.result()
+            metadata = self.build_metadata(prompt, enhanced_prompt, reference_id, analysis, image, model, reuse,
+                                            preview, optimization)
+            if persist:
+                with self.stage(progress, "persist"):
+                    self.memory_handler.save_creation(
+                        creation_id=creation_id,
+                        session_id=session_id,
+                        prompt=enhanced_prompt,
+                        image_path=image_path,
+                        model_path=model_path,
+                        metadata=metadata
+                    )
+            
+            return self.build_result(creation_id, session_id, prompt, enhanced_prompt,
+                                      image_path, model_path, metadata)
+
+    async def process_creation_async(self,
+                                     prompt: str,
+                                     session_id: Optional[str] = None,
+                                     reference_id: Optional[str] = None,
+                                     progress: Optional[ProgressCallback] = None) -> Dict:
+        """Process a creation request without blocking the event loop.
+
+        LLM work runs on a dedicated executor so it cannot starve the Openfabric
+        calls and disk I/O, which run on the I/O executor.
+        """
+        creation_id = str(uuid.uuid4())
+        if not session_id:
+            session_id = str(uuid.uuid4())
         
-        # Step 2: Enhance prompt using LLM
-        enhanced_prompt = self.llm_handler.enhance_prompt(prompt)
-        if reference_info:
-            analysis = self.llm_handler.analyze_reference(
-                reference_info["prompt"],
-                enhanced_prompt
-            )
+        with self._holding() as held:
+            with self.stage(progress, "enhance"):
+                # Step 1: Get reference if provided
+                reference_info = None
+                if reference_id:
+                    with span("enhance.reference"):
+                        reference_info = await self._run_io(self.memory_handler.get_creation_by_id, reference_id)
+                
+                # Step 2: Enhance prompt using LLM
+                loop = asyncio.get_running_loop()
+                enhanced_prompt, analysis = await loop.run_in_executor(
+                    self._llm_executor, in_context(self.enhance), prompt, reference_info
+                )
+                reuse = await self._run_io(self.find_reuse, prompt, enhanced_prompt, session_id)
+                if reuse:
+                    held.extend(reuse.artifacts)
+            
+            # Step 3: Generate image
+            with self.stage(progress, "image"):
+                if reuse and reuse.image:
+                    image = reuse.image
+                else:
+                    image_result = await self._run_io(self.generate_image, enhanced_prompt)
+                    image = await self._run_io(self.store_image, image_result)
+                    held.append(image)
+                image_path = image.path
+            
+            # Step 4: Generate 3D model
+            preview = reuse.preview if reuse else None
+            optimization = None
+            with self.stage(progress, "3d"):
+                if reuse:
+                    model = reuse.model
+                else:
+                    model_result = await self._run_io(self.generate_model, image_result)
+                    if not self.model_optimizer:
+                        model = await self._run_io(self.artifact_store.put, model_result, "model")
+                        held.append(model)
+            
+            # Step 4b: Shrink the model and make its preview
+            if self.model_optimizer and not reuse:
+                with self.stage(progress, "optimize"):
+                    optimized = await self.model_optimizer.optimize_async(model_result)
+                    model, preview, optimization = await self._run_io(self.store_model, model_result, optimized)
+                    held.extend(artifact for artifact in (model, preview) if artifact)
+            model_path = model.path
+            
+            # Step 5: Save to memory
+            with self.stage(progress, "persist"):
+                with span("artifact_write"):
+                    for artifact in (image, model, preview):
+                        if artifact:
+                            await asyncio.wrap_future(artifact.written)
+                metadata = self.build_metadata(prompt, enhanced_prompt, reference_id, analysis, image, model, reuse,
+                                                preview, optimization)
+                await self._run_io(functools.partial(
+                    self.memory_handler.save_creation,
+                    creation_id=creation_id,
+                    session_id=session_id,
+                    prompt=enhanced_prompt,
+                    image_path=image_path,
+                    model_path=model_path,
+                    metadata=metadata
+                ))
+            
+            return self.build_result(creation_id, session_id, prompt, enhanced_prompt,
+                                      image_path, model_path, metadata)
+
+    @staticmethod
+    @contextmanager
+    def stage(progress: Optional[ProgressCallback], stage: str) -> Iterator[None]:
+        """Report a stage's start, and its finish or failure with the time it took."""
+        if progress:
+            progress(stage, "started", {})
+        start = time.perf_counter()
+        try:
+            with span(stage):
+                yield
+        except Exception as e:
+            if progress:
+                progress(stage, "failed", {"seconds": time.perf_counter() - start, "error": str(e)})
+            raise
+        if progress:
+            progress(stage, "finished", {"seconds": time.perf_counter() - start})
+
+    @contextmanager
+    def _holding(self) -> Iterator[List[Artifact]]:
+        """Collect a creation's artifact references and release them if it fails before it is saved."""
+        held: List[Artifact] = []
+        try:
+            yield held
+        except BaseException:
+            self.release(artifact.digest for artifact in held)
+            raise
+
+    def release(self, digests: Iterable[str]) -> None:
+        """Drop one artifact reference per digest, logging rather than raising on failure."""
+        for digest in digests:
+            try:
+                self.artifact_store.release(digest)
+            except Exception as e:
+                logging.error(f"Error releasing artifact {digest}: {str(e)}")
+
+    def discard_result(self, result: Dict) -> None:
+        """Drop the artifact references of a persist=False result that will not be saved."""
+        metadata = result["metadata"]
+        self.release(metadata[key] for key in ("image_sha256", "model_sha256", "preview_sha256") if metadata.get(key))
+
+    def _run_io(self, func: Callable, *args: Any) -> "asyncio.Future":
+        return asyncio.get_running_loop().run_in_executor(self._io_executor, in_context(func), *args)
+
+    def enhance(self, prompt: str, reference_info: Optional[Dict]) -> Tuple[str, Optional[Dict]]:
+        """Return the enhanced prompt and, with a reference, its style analysis."""
+        analysis = None
+        if reference_info and self.fused_reference:
+            # One generation for both the enhancement and the reference analysis
+            with span("enhance.fused"):
+                fused = self.llm_handler.enhance_with_reference(reference_info["prompt"], prompt)
+            enhanced_prompt, analysis = fused["enhanced_prompt"], fused["analysis"]
+        else:
+            with span("enhance.llm"):
+                enhanced_prompt = self.llm_handler.enhance_prompt(prompt)
+            if reference_info:
+                with span("enhance.analysis"):
+                    analysis = self.llm_handler.analyze_reference(
+                        reference_info["prompt"],
+                        enhanced_prompt
+                    )
+        if analysis:
             enhanced_prompt = f"{enhanced_prompt} (Style reference: {analysis['analysis']})"
+        return enhanced_prompt, analysis
+
+    def find_reuse(self,
+                   prompt: str,
+                   enhanced_prompt: str,
+                   session_id: Optional[str] = None) -> Optional[ArtifactReuse]:
+        """Return the best past match above reuse_threshold, with references taken on its artifacts."""
+        if self.reuse_mode == "off":
+            return None
+        with self._reuse_lock:
+            self.reuse_lookups += 1
         
-        # Step 3: Generate image
-        image_path = f"static/images/{creation_id}.png"
-        image_result = self.stub.call(
-            'f0997a01-d6d3-a5fe-53d8-561300318557',
-            {'prompt': enhanced_prompt},
-            'super-user'
-        )
-        
-        # Save the image
-        with open(image_path, 'wb') as f:
-            f.write(image_result.get('result'))
-        
-        # Step 4: Generate 3D model
-        model_path = f"static/models/{creation_id}.glb"
-        model_result = self.stub.call(
-            '69543f29-4d41-4afc-7f29-3d51591f11eb',
-            {'image': open(image_path, 'rb').read()},
-            'super-user'
-        )
+        query = enhanced_prompt if self.reuse_query == "enhanced" else prompt
+        with span("enhance.reuse_lookup"):
+            matches = self.memory_handler.get_similar_creations(query, n_results=1, session_id=session_id)
+        if not matches or matches[0].get("similarity", 0.0) < self.reuse_threshold:
+            return None
+        match = matches[0]
+        # Hybrid records nest their metadata; vector results flatten it
+        metadata = match.get("metadata") or match
         
-        # Save the 3D model
-        with open(model_path, 'wb') as f:
-            f.write(model_result.get('result'))
+        if not metadata.get("model_sha256") or (self.reuse_mode == "full" and not metadata.get("image_sha256")):
+            return None
+        model = self.artifact_store.retain(metadata["model_sha256"])
+        if model is None:
+            return None
+        image = None
+        if self.reuse_mode == "full":
+            image = self.artifact_store.retain(metadata["image_sha256"])
+            if image is None:
+                self.artifact_store.release(model.digest)
+                return None
+        # Best effort: a creation made before optimization was on has no preview
+        preview = self.artifact_store.retain(metadata["preview_sha256"]) if metadata.get("preview_sha256") else None
         
-        # Step 5: Save to memory
-        metadata = {
+        reuse = ArtifactReuse(match["id"], match["similarity"], self.reuse_mode, image, model, preview)
+        with self._reuse_lock:
+            self.reuse_hits += 1
+            self.openfabric_calls_saved += reuse.calls_saved
+        logging.info(f"Reusing artifacts of creation {reuse.creation_id} (similarity {reuse.similarity:.3f})")
+        return reuse
+
+    def reuse_stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.reuse_mode,
+            "threshold": self.reuse_threshold,
+            "lookups": self.reuse_lookups,
+            "hits": self.reuse_hits,
+            "reuse_rate": self.reuse_hits / self.reuse_lookups if self.reuse_lookups else 0.0,
+            "openfabric_calls_saved": self.openfabric_calls_saved
+        }
+
+    def store_image(self, image_bytes: bytes) -> Artifact:
+        """Store a generated image and render its gallery thumbnail in the background."""
+        image = self.artifact_store.put(image_bytes, "image")
+        self.thumbnails.submit(image.digest, image_bytes)
+        return image
+
+    def store_model(self,
+                    model_bytes: bytes,
+                    optimized: Optional[Dict[str, Any]]) -> Tuple[Artifact, Optional[Artifact], Optional[Dict]]:
+        """Store optimize_glb's model and preview, or the original model if optimization failed."""
+        if optimized is None:
+            return self.artifact_store.put(model_bytes, "model"), None, None
+        model = self.artifact_store.put(optimized["model"], "model")
+        # No preview is stored when the model is small enough to be its own preview
+        with self._holding() as held:
+            held.append(model)
+            preview = self.artifact_store.put(optimized["preview"], "preview") if optimized["preview"] else None
+        return model, preview, optimized["stats"]
+
+    def generate_image(self, enhanced_prompt: str) -> bytes:
+        """Call the Openfabric text-to-image app."""
+        with span("image.openfabric"):
+            image_result = self.openfabric.call(self.text_to_image_app, {'prompt': enhanced_prompt})
+        return image_result.get('result')
+
+    def generate_model(self, image: bytes) -> bytes:
+        """Call the Openfabric image-to-3D app."""
+        with span("3d.openfabric"):
+            model_result = self.openfabric.call(self.image_to_3d_app, {'image': image})
+        return model_result.get('result')
+
+    @staticmethod
+    def build_metadata(prompt: str,
+                       enhanced_prompt: str,
+                       reference_id: Optional[str],
+                       analysis: Optional[Dict],
+                       image: Artifact,
+                       model: Artifact,
+                       reuse: Optional[ArtifactReuse] = None,
+                       preview: Optional[Artifact] = None,
+                       optimization: Optional[Dict] = None) -> Dict:
+        """Metadata saved with a creation in memory."""
+        return {
             "original_prompt": prompt,
             "enhanced_prompt": enhanced_prompt,
             "reference_id": reference_id,
-            "reference_analysis": analysis if reference_info else None,
+            "reference_analysis": analysis,
+            "image_sha256": image.digest,
+            "model_sha256": model.digest,
+            "preview_sha256": preview.digest if preview else None,
+            "preview_path": preview.path if preview else (model.path if optimization else None),
+            "model_optimization": optimization,
+            "reused_from": reuse.as_metadata() if reuse else None,
             "created_at": datetime.now().isoformat()
         }
-        
-        self.memory_handler.save_creation(
-            creation_id=creation_id,
-            session_id=session_id,
-            prompt=enhanced_prompt,
-            image_path=image_path,
-            model_path=model_path,
-            metadata=metadata
-        )
-        
+
+    @staticmethod
+    def build_result(creation_id: str,
+                     session_id: str,
+                     prompt: str,
+                     enhanced_prompt: str,
+                     image_path: str,
+                     model_path: str,
+                     metadata: Dict) -> Dict:
+        """The result returned to callers of process_creation."""
         return {
             "creation_id": creation_id,
             "session_id": session_id,
@@ -99,7 +503,18 @@ class PipelineHandler:
             "model_path": model_path,
             "metadata": metadata
         }
+
+    def close(self) -> None:
+        """Shut down the executors used by the async path and flush pending artifact writes."""
+        self._llm_executor.shutdown(wait=False)
+        self._io_executor.shutdown(wait=False)
+        self.openfabric.close()
+        self.thumbnails.close()
+        if self.model_optimizer:
+            self.model_optimizer.close()
+        self.artifact_store.close()
+        self.memory_handler.close()
     
-    def find_similar_creations(self, prompt: str, n_results: int = 5) -> Dict:
+    def find_similar_creations(self, prompt: str, n_results: int = 5, session_id: Optional[str] = None) -> Dict:
         """Find similar previous creations based on the prompt."""
-        return self.memory_handler.get_similar_creations(prompt, n_results) 
\ No newline at end of file
+        return self.memory_handler.get_similar_creations(prompt, n_results, session_id) 
\ No newline at end of file
@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from openfabric_pysdk.context import Stub
+
+from llm.cache import CachedLLM, PromptCache
+from llm.processor import BatchProcessor
+from llm.server import LLMClient
+from memory.memory_handler import MemoryHandler
+from pipeline.pipeline_handler import PipelineHandler
+from schema import ConfigClass
+from utils.system import current_rss_bytes
+
+
+@dataclass
+class RegistryEntry:
+    pipeline: PipelineHandler
+    load_seconds: float
+    rss_before: int
+    rss_after: int
+    loaded_at: float = field(default_factory=time.time)
+    hits: int = 0
+    # Open leases; a reloaded entry is closed once the last one ends
+    users: int = 0
+    retired: bool = False
+
+
+class HandlerRegistry:
+    """Process-wide store of pipeline handlers, loaded once per configuration."""
+
+    def __init__(self):
+        self._entries: Dict[Tuple, RegistryEntry] = {}
+        self._locks: Dict[Tuple, threading.Lock] = {}
+        self._guard = threading.Lock()
+        # Per configuration: idle, loading, ready or failed
+        self._status: Dict[Tuple, Dict[str, Any]] = {}
+
+    @staticmethod
+    def config_key(config: ConfigClass) -> Tuple:
+        """Build a hashable key from every field of the configuration."""
+        key = []
+        for f in fields(config):
+            value = getattr(config, f.name)
+            if isinstance(value, list):
+                value = tuple(value)
+            elif isinstance(value, dict):
+                value = tuple(sorted(value.items()))
+            key.append((f.name, value))
+        return tuple(key)
+
+    def _lock_for(self, key: Tuple) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _load(self, config: ConfigClass) -> RegistryEntry:
+        logging.info(f"Loading handlers for model {config.llm_model} ({config.memory_type} memory)")
+        rss_before = current_rss_bytes()
+        start = time.perf_counter()
+
+        stub = Stub(config.app_ids)
+        llm_handler = self._load_llm(config)
+        memory_handler = MemoryHandler(
+            config.memory_type,
+            pool_size=config.sqlite_pool_size,
+            embedding_batch_size=config.embedding_batch_size,
+            embedding_cache_size=config.embedding_cache_size,
+            index_flush_size=config.index_flush_size,
+            index_flush_seconds=config.index_flush_seconds,
+            short_term_size=config.short_term_size,
+            short_term_sessions=config.short_term_sessions,
+            short_term_ttl_seconds=config.short_term_ttl_seconds,
+            short_term_similarity=config.short_term_similarity,
+            write_behind=config.memory_write_behind,
+            write_behind_seconds=config.memory_write_behind_seconds
+        )
+        pipeline = PipelineHandler(
+            stub=stub,
+            llm_handler=llm_handler,
+            memory_handler=memory_handler,
+            config=config.__dict__
+        )
+
+        entry = RegistryEntry(
+            pipeline=pipeline,
+            load_seconds=time.perf_counter() - start,
+            rss_before=rss_before,
+            rss_after=current_rss_bytes()
+        )
+        logging.info(
+            f"Handlers loaded in {entry.load_seconds:.2f}s "
+            f"(RSS {entry.rss_after / 2**20:.0f} MiB)"
+        )
+        return entry
+
+    @staticmethod
+    def _load_llm(config: ConfigClass) -> Any:
+        """Connect to the shared LLM server if one is configured, else load the model in process."""
+        if config.llm_server_address:
+            # The server batches and caches for every worker
+            return LLMClient(config.llm_server_address, connect_timeout=config.llm_server_connect_seconds)
+
+        # The backends import torch and transformers; only pay for that when loading
+        from llm.backends import create_llm_handler
+
+        llm_handler = create_llm_handler(
+            config.llm_backend,
+            config.llm_model,
+            deterministic=config.llm_deterministic,
+            num_threads=config.llm_threads,
+            gguf_file=config.llm_gguf_file,
+            context_length=config.llm_context_length
+        )
+        if config.llm_max_batch_size > 1:
+            llm_handler = BatchProcessor(
+                llm_handler,
+                max_batch_size=config.llm_max_batch_size,
+                max_wait_ms=config.llm_batch_wait_ms
+            )
+        if config.llm_cache:
+            llm_handler = CachedLLM(
+                llm_handler,
+                PromptCache(ttl_seconds=config.llm_cache_ttl_seconds)
+            )
+        return llm_handler
+
+    def _load_entry(self, key: Tuple, config: ConfigClass) -> RegistryEntry:
+        """Load and store an entry, tracking its status; call with the key's lock held."""
+        self._status[key] = {"state": "loading", "error": None, "since": time.time()}
+        try:
+            entry = self._load(config)
+        except Exception as e:
+            self._status[key] = {"state": "failed", "error": str(e), "since": time.time()}
+            raise
+        self._entries[key] = entry
+        self._status[key] = {"state": "ready", "error": None, "since": time.time()}
+        return entry
+
+    def get(self, config: ConfigClass) -> PipelineHandler:
+        """Return the shared pipeline for a configuration, loading it on first use.
+
+        The caller is not counted as a user, so a reload may close the pipeline
+        under it; work that can overlap a reload takes a lease() instead.
+        """
+        key = self.config_key(config)
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock_for(key):
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._load_entry(key, config)
+        entry.hits += 1
+        return entry.pipeline
+
+    @contextmanager
+    def lease(self, config: ConfigClass) -> Iterator[PipelineHandler]:
+        """Use the shared pipeline for one piece of work; a reload closes it only after the lease ends."""
+        key = self.config_key(config)
+        self.get(config)
+        with self._guard:
+            entry = self._entries.get(key)
+            if entry is None:
+                raise RuntimeError("Handlers are closed")
+            entry.users += 1
+        try:
+            yield entry.pipeline
+        finally:
+            with self._guard:
+                entry.users -= 1
+                idle = entry.retired and entry.users == 0
+            if idle:
+                self._close_entry(entry)
+
+    def warm_up(self, config: ConfigClass) -> Dict[str, Any]:
+        """Load the handlers for a configuration ahead of the first request."""
+        key = self.config_key(config)
+        with self._lock_for(key):
+            if key not in self._entries:
+                self._load_entry(key, config)
+        return self._describe(key, self._entries[key])
+
+    def status(self, config: ConfigClass) -> Dict[str, Any]:
+        """Report whether a configuration is idle, loading, ready or failed, without loading it."""
+        return dict(self._status.get(self.config_key(config), {"state": "idle", "error": None, "since": None}))
+
+    def reload(self, config: ConfigClass) -> Dict[str, Any]:
+        """Rebuild the handlers for a configuration and swap them in.
+
+        The old handlers keep serving while the new ones load, and are closed
+        once their last lease ends. If the load fails, the old ones stay.
+        """
+        key = self.config_key(config)
+        with self._lock_for(key):
+            entry = self._load(config)
+            with self._guard:
+                old = self._entries.get(key)
+                self._entries[key] = entry
+                idle = False
+                if old is not None:
+                    old.retired = True
+                    idle = old.users == 0
+            self._status[key] = {"state": "ready", "error": None, "since": time.time()}
+        if idle:
+            self._close_entry(old)
+        return self._describe(key, entry)
+
+    def close(self) -> None:
+        """Close every loaded pipeline, flushing buffered writes, whether or not it is leased."""
+        for key in list(self._entries):
+            with self._lock_for(key):
+                entry = self._entries.pop(key, None)
+                self._status.pop(key, None)
+                if entry is not None:
+                    self._close_entry(entry)
+
+    @staticmethod
+    def _close_entry(entry: RegistryEntry) -> None:
+        entry.pipeline.close()
+        close = getattr(entry.pipeline.llm_handler, "close", None)
+        if callable(close):
+            close()
+
+    def is_loaded(self, config: ConfigClass) -> bool:
+        return self.config_key(config) in self._entries
+
+    def stats(self, config: Optional[ConfigClass] = None) -> Any:
+        """Report load time, resident memory and reuse counts for loaded handlers."""
+        if config is not None:
+            key = self.config_key(config)
+            entry = self._entries.get(key)
+            return self._describe(key, entry) if entry else None
+        return {
+            "rss_bytes": current_rss_bytes(),
+            "handlers": [self._describe(k, e) for k, e in list(self._entries.items())]
+        }
+
+    @staticmethod
+    def _describe(key: Tuple, entry: RegistryEntry) -> Dict[str, Any]:
+        return {
+            "config": dict(key),
+            "load_seconds": entry.load_seconds,
+            "rss_before_bytes": entry.rss_before,
+            "rss_after_bytes": entry.rss_after,
+            "rss_delta_bytes": entry.rss_after - entry.rss_before,
+            "loaded_at": entry.loaded_at,
+            "hits": entry.hits,
+            "openfabric": entry.pipeline.openfabric.stats(),
+            "llm": entry.pipeline.llm_handler.stats() if hasattr(entry.pipeline.llm_handler, "stats") else {},
+            "memory": entry.pipeline.memory_handler.stats() if hasattr(entry.pipeline.memory_handler, "stats") else {},
+            "reuse": entry.pipeline.reuse_stats(),
+            "thumbnails": entry.pipeline.thumbnails.stats(),
+            "model_optimizer": entry.pipeline.model_optimizer.stats() if entry.pipeline.model_optimizer else None
+        }
+
+
+# Shared by the API and the UI so each process loads a configuration only once
+registry = HandlerRegistry()
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+from config.settings import RETENTION_POLICY, RetentionPolicy
+from utils.file_ops import ArtifactStore
+from utils.metrics import metrics
+from utils.thumbnails import ThumbnailCache
+
+if TYPE_CHECKING:
+    from memory.memory_handler import MemoryHandler
+
+CREATIONS_EXPIRED = metrics.counter(
+    "retention_creations_expired_total", "Creations expired by the retention task", ["rule"]
+)
+BYTES_RECLAIMED = metrics.counter("retention_bytes_reclaimed_total", "Disk bytes freed by the retention task")
+
+# Artifact digests kept in creation metadata, by artifact kind
+DIGEST_KEYS = (
+    ("image", "image_sha256"),
+    ("model", "model_sha256"),
+    ("preview", "preview_sha256")
+)
+
+
+def _directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _file_bytes(*paths: str) -> int:
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+class RetentionTask:
+    """Expires creations under a RetentionPolicy, then compacts the stores.
+
+    Each expired creation leaves the memory tiers and the similarity index
+    together, then drops its references on its image and model, so a file
+    goes once no remaining creation uses it. Work is done in batches with a
+    pause between them and a cap per run, so a large backlog is worked off
+    over several runs rather than in one long burst. Rebuilding the similarity
+    index re-embeds every creation while searches use it, so the task only
+    reports when a rebuild is due and leaves it to memory.cli rebuild-index.
+
+    The stores come from handlers_provider, a context manager entered for the
+    length of every run, so a registry reload between runs hands the task the
+    new handlers and one during a run leaves them open until it ends.
+    """
+
+    def __init__(self,
+                 handlers_provider: Callable[[], ContextManager[Tuple["MemoryHandler", ArtifactStore,
+                                                                      Optional[ThumbnailCache]]]],
+                 policy: RetentionPolicy = RETENTION_POLICY,
+                 initial_delay_seconds: float = 60.0):
+        self.handlers_provider = handlers_provider
+        self.memory_handler: Optional["MemoryHandler"] = None
+        self.artifact_store: Optional[ArtifactStore] = None
+        self.thumbnails: Optional[ThumbnailCache] = None
+        self.policy = policy
+        self.initial_delay_seconds = initial_delay_seconds
+
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.runs = 0
+        self.expired = 0
+        self.bytes_reclaimed = 0
+        self.deleted_since_advice = 0
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        delay = self.initial_delay_seconds
+        while not self._stop.wait(delay):
+            delay = self.policy.interval_seconds
+            try:
+                report = self.run_once()
+                if report["expired"]:
+                    logging.info(f"Retention expired {report['expired']} creation(s), "
+                                 f"reclaimed {report['bytes_reclaimed'] / 2**20:.1f} MiB")
+            except Exception as e:
+                logging.error(f"Error running retention: {str(e)}")
+
+    def _rules(self) -> List[Tuple[str, Callable[[int], List[Dict[str, Any]]]]]:
+        """(rule name, select a batch of expired creations) for each limit the policy sets."""
+        policy = self.policy
+        rules = []
+        if policy.max_age_days is not None:
+            cutoff = (datetime.now() - timedelta(days=policy.max_age_days)).isoformat()
+            rules.append(("age", lambda limit: self.memory_handler.list_older_than(cutoff, limit)))
+        if policy.max_per_session is not None:
+            rules.append(("session", lambda limit: self.memory_handler.list_session_overflow(
+                policy.max_per_session, limit)))
+        if policy.max_artifact_bytes is not None:
+            rules.append(("size", lambda limit: (
+                self.memory_handler.list_oldest(limit)
+                if self.artifact_store.stats()["stored_bytes"] > policy.max_artifact_bytes else []
+            )))
+        return rules
+
+    def run_once(self) -> Dict[str, Any]:
+        """Expire what the policy allows in one run, compact if anything went, and report."""
+        with self._run_lock, self.handlers_provider() as handlers:
+            start = time.perf_counter()
+            self.memory_handler, self.artifact_store, self.thumbnails = handlers
+            report: Dict[str, Any] = {
+                "started_at": datetime.now().isoformat(),
+                "expired": 0,
+                "by_rule": {},
+                "files_removed": 0,
+                "file_bytes": 0,
+                "compacted_bytes": 0,
+                "index_rebuild_due": False,
+                "archived_to": self.policy.archive_dir,
+                "complete": True
+            }
+            batches = 0
+            for rule, select in self._rules():
+                report["by_rule"][rule] = 0
+                while True:
+                    if batches >= self.policy.max_batches_per_run or self._stop.is_set():
+                        # The rest waits for the next run
+                        report["complete"] = False
+                        break
+                    batch = select(self.policy.batch_size)
+                    if not batch:
+                        break
+                    self._expire(batch, report)
+                    report["by_rule"][rule] += len(batch)
+                    CREATIONS_EXPIRED.inc(len(batch), rule=rule)
+                    batches += 1
+                    self._stop.wait(self.policy.pause_seconds)
+
+            if report["expired"] and self.policy.vacuum:
+                report["compacted_bytes"] = self._compact()
+            if report["expired"]:
+                report["index_rebuild_due"] = self._index_rebuild_due()
+
+            report["bytes_reclaimed"] = report["file_bytes"] + report["compacted_bytes"]
+            report["seconds"] = time.perf_counter() - start
+            BYTES_RECLAIMED.inc(report["bytes_reclaimed"])
+            self.runs += 1
+            self.expired += report["expired"]
+            self.bytes_reclaimed += report["bytes_reclaimed"]
+            self.last_report = report
+            return report
+
+    def _expire(self, creations: List[Dict[str, Any]], report: Dict[str, Any]) -> None:
+        archive_dir = self.policy.archive_dir
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+            with open(os.path.join(archive_dir, "creations.jsonl"), "a") as f:
+                for creation in creations:
+                    f.write(json.dumps(creation) + "\n")
+
+        # Records go first: a crash in between leaks files, never dangling records
+        self.memory_handler.delete_creations([creation["id"] for creation in creations])
+        self.deleted_since_advice += len(creations)
+        report["expired"] += len(creations)
+
+        for creation in creations:
+            metadata = creation.get("metadata") or {}
+            for kind, key in DIGEST_KEYS:
+                digest = metadata.get(key)
+                if digest:
+                    path = self.artifact_store.path_for(digest, kind)
+                    size = _file_bytes(path)
+                    if self.artifact_store.release(digest, archive_dir):
+                        report["files_removed"] += 1
+                        report["file_bytes"] += size
+                        if kind == "image" and self.thumbnails:
+                            report["file_bytes"] += self.thumbnails.discard(digest)
+                else:
+                    # Written before artifacts were content-addressed, so used by this creation alone
+                    self._remove_legacy(creation.get(f"{kind}_path"), report)
+
+    def _remove_legacy(self, path: Optional[str], report: Dict[str, Any]) -> None:
+        if not path or not os.path.exists(path):
+            return
+        size = _file_bytes(path)
+        if self.policy.archive_dir:
+            destination = os.path.join(self.policy.archive_dir, "legacy", os.path.basename(path))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(path, destination)
+        else:
+            os.remove(path)
+        report["files_removed"] += 1
+        report["file_bytes"] += size
+
+    def _store_bytes(self) -> int:
+        memory = self.memory_handler
+        return (_file_bytes(memory.db_path, f"{memory.db_path}-wal")
+                + (_directory_bytes(memory.vector_db_path) if memory.has_index else 0))
+
+    def _compact(self) -> int:
+        """VACUUM the databases. Returns bytes freed."""
+        before = self._store_bytes()
+        self.memory_handler.compact()
+        return max(0, before - self._store_bytes())
+
+    def _index_rebuild_due(self) -> bool:
+        """Whether enough of the index has been deleted since the last advice to warrant a rebuild."""
+        memory = self.memory_handler
+        if not (memory.has_index and memory.memory_type == "hybrid"):
+            return False
+        indexed = memory.collection.count()
+        if self.deleted_since_advice < self.policy.index_rebuild_ratio * (indexed + self.deleted_since_advice):
+            return False
+        # Chroma only marks deleted vectors; a rebuild drops them from its files
+        logging.warning(f"{self.deleted_since_advice} creations deleted from a similarity index of {indexed}; "
+                        "run python -m memory.cli rebuild-index in a quiet period to reclaim the space")
+        self.deleted_since_advice = 0
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "expired": self.expired,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_report": self.last_report
+        }
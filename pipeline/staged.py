@@ -0,0 +1,232 @@
+import logging
+import queue
+import threading
+import uuid
+from concurrent.futures import Future
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Any, Callable, ContextManager, Dict, List, Optional
+
+from pipeline.pipeline_handler import ArtifactReuse, PipelineHandler, ProgressCallback
+from utils.file_ops import Artifact
+from utils.tracing import current_trace_id, trace
+
+
+STAGES = ("enhance", "image", "3d", "optimize", "persist")
+
+
+@dataclass
+class _Creation:
+    prompt: str
+    session_id: str
+    reference_id: Optional[str]
+    progress: Optional[ProgressCallback]
+    future: Future
+    creation_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    enhanced_prompt: str = ""
+    analysis: Optional[Dict] = None
+    image_bytes: bytes = b""
+    image: Optional[Artifact] = None
+    model_bytes: bytes = b""
+    model: Optional[Artifact] = None
+    preview: Optional[Artifact] = None
+    optimization: Optional[Dict] = None
+    reuse: Optional[ArtifactReuse] = None
+    # Resolved when the creation enters the first stage and kept for all of them
+    pipeline: Optional[PipelineHandler] = None
+    # Holds the pipeline's lease until the creation completes or fails
+    lease: ExitStack = field(default_factory=ExitStack)
+    # Artifact references taken so far, released if a stage fails
+    held: List[Artifact] = field(default_factory=list)
+    # Carried from the submitting thread so every stage logs under the same trace
+    trace_id: str = field(default_factory=lambda: current_trace_id() or uuid.uuid4().hex[:16])
+
+
+class StagedPipeline:
+    """Runs creations through per-stage worker pools joined by bounded queues.
+
+    Each stage (enhance, image, 3d, optimize, persist) has its own workers, so
+    the LLM can enhance request N+1 while request N is rendered remotely. A full
+    downstream queue blocks the stage feeding it, which in turn blocks
+    submit(), so load never piles up unboundedly in memory.
+
+    The pipeline comes from pipeline_provider (a context manager such as
+    HandlerRegistry.lease) once per creation and is held until the creation
+    finishes, so creations submitted after a registry reload use the new
+    handlers while those in flight finish on the old ones.
+    """
+
+    def __init__(self,
+                 pipeline_provider: Callable[[], ContextManager[PipelineHandler]],
+                 workers: Optional[Dict[str, int]] = None,
+                 queue_size: int = 4):
+        self.pipeline_provider = pipeline_provider
+        self.workers = {stage: 1 for stage in STAGES}
+        self.workers.update(workers or {})
+        self.queue_size = queue_size
+
+        self._queues: Dict[str, "queue.Queue[Optional[_Creation]]"] = {
+            stage: queue.Queue(maxsize=queue_size) for stage in STAGES
+        }
+        self._threads: Dict[str, List[threading.Thread]] = {stage: [] for stage in STAGES}
+        self._handlers = {
+            "enhance": self._run_enhance,
+            "image": self._run_image,
+            "3d": self._run_model,
+            "optimize": self._run_optimize,
+            "persist": self._run_persist
+        }
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def capacity(self) -> int:
+        """Number of creations the engine can hold in flight before submit() blocks."""
+        return sum(self.workers.values()) + self.queue_size * len(STAGES)
+
+    def start(self) -> None:
+        for stage in STAGES:
+            for i in range(self.workers[stage]):
+                thread = threading.Thread(
+                    target=self._work, args=(stage,), name=f"stage-{stage}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads[stage].append(thread)
+
+    def stop(self) -> None:
+        """Drain in-flight creations, then stop every stage in order."""
+        for stage in STAGES:
+            for _ in self._threads[stage]:
+                self._queues[stage].put(None)
+            for thread in self._threads[stage]:
+                thread.join()
+            self._threads[stage] = []
+
+    def submit(self,
+               prompt: str,
+               session_id: Optional[str] = None,
+               reference_id: Optional[str] = None,
+               progress: Optional[ProgressCallback] = None) -> Future:
+        """Queue a creation; blocks while the enhance stage is saturated."""
+        creation = _Creation(
+            prompt=prompt,
+            session_id=session_id or str(uuid.uuid4()),
+            reference_id=reference_id,
+            progress=progress,
+            future=Future()
+        )
+        self._queues["enhance"].put(creation)
+        return creation.future
+
+    def run(self,
+            prompt: str,
+            session_id: Optional[str] = None,
+            reference_id: Optional[str] = None,
+            progress: Optional[ProgressCallback] = None) -> Dict:
+        """Same contract as PipelineHandler.process_creation."""
+        return self.submit(prompt, session_id, reference_id, progress).result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "workers": dict(self.workers),
+            "queue_depths": {stage: q.qsize() for stage, q in self._queues.items()}
+        }
+
+    def _work(self, stage: str) -> None:
+        handler = self._handlers[stage]
+        index = STAGES.index(stage)
+        next_queue = self._queues[STAGES[index + 1]] if index + 1 < len(STAGES) else None
+
+        while True:
+            creation = self._queues[stage].get()
+            if creation is None:
+                break
+            if stage == "optimize" and creation.model is not None:
+                # Nothing to shrink: optimization is off or the model was reused.
+                # Like process_creation, an empty model result is still optimized,
+                # so the fallback stores it and persist always has a model
+                next_queue.put(creation)
+                continue
+            try:
+                if creation.pipeline is None:
+                    creation.pipeline = creation.lease.enter_context(self.pipeline_provider())
+                with trace(creation.trace_id), creation.pipeline.stage(creation.progress, stage):
+                    handler(creation)
+            except Exception as e:
+                logging.error(f"Error in {stage} stage for creation {creation.creation_id}: {str(e)}")
+                self.failed += 1
+                if creation.held:
+                    creation.pipeline.release(artifact.digest for artifact in creation.held)
+                creation.lease.close()
+                creation.future.set_exception(e)
+                continue
+            if next_queue is not None:
+                next_queue.put(creation)
+            else:
+                creation.lease.close()
+
+    def _run_enhance(self, creation: _Creation) -> None:
+        reference_info = None
+        if creation.reference_id:
+            reference_info = creation.pipeline.memory_handler.get_creation_by_id(creation.reference_id)
+        creation.enhanced_prompt, creation.analysis = creation.pipeline.enhance(creation.prompt, reference_info)
+        creation.reuse = creation.pipeline.find_reuse(
+            creation.prompt, creation.enhanced_prompt, creation.session_id
+        )
+        if creation.reuse:
+            creation.held.extend(creation.reuse.artifacts)
+
+    def _run_image(self, creation: _Creation) -> None:
+        if creation.reuse and creation.reuse.image:
+            creation.image = creation.reuse.image
+            return
+        creation.image_bytes = creation.pipeline.generate_image(creation.enhanced_prompt)
+        creation.image = creation.pipeline.store_image(creation.image_bytes)
+        creation.held.append(creation.image)
+
+    def _run_model(self, creation: _Creation) -> None:
+        if creation.reuse:
+            creation.image_bytes = b""
+            creation.model = creation.reuse.model
+            creation.preview = creation.reuse.preview
+            return
+        model_result = creation.pipeline.generate_model(creation.image_bytes)
+        creation.image_bytes = b""  # no longer needed; do not hold it in the queues
+        if creation.pipeline.model_optimizer:
+            # Stored by the optimize stage
+            creation.model_bytes = model_result
+        else:
+            creation.model = creation.pipeline.artifact_store.put(model_result, "model")
+            creation.held.append(creation.model)
+
+    def _run_optimize(self, creation: _Creation) -> None:
+        optimized = creation.pipeline.model_optimizer.optimize(creation.model_bytes)
+        creation.model, creation.preview, creation.optimization = creation.pipeline.store_model(
+            creation.model_bytes, optimized
+        )
+        creation.held.extend(artifact for artifact in (creation.model, creation.preview) if artifact)
+        creation.model_bytes = b""
+
+    def _run_persist(self, creation: _Creation) -> None:
+        for artifact in (creation.image, creation.model, creation.preview):
+            if artifact:
+                artifact.written.result()
+        metadata = creation.pipeline.build_metadata(
+            creation.prompt, creation.enhanced_prompt, creation.reference_id, creation.analysis,
+            creation.image, creation.model, creation.reuse, creation.preview, creation.optimization
+        )
+        creation.pipeline.memory_handler.save_creation(
+            creation_id=creation.creation_id,
+            session_id=creation.session_id,
+            prompt=creation.enhanced_prompt,
+            image_path=creation.image.path,
+            model_path=creation.model.path,
+            metadata=metadata
+        )
+        self.completed += 1
+        creation.future.set_result(creation.pipeline.build_result(
+            creation.creation_id, creation.session_id, creation.prompt, creation.enhanced_prompt,
+            creation.image.path, creation.model.path, metadata
+        ))
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional, List, Dict, Any
 from openfabric_pysdk.utility import SchemaUtil
 
@@ -23,3 +23,54 @@ class ConfigClass(SchemaUtil):
     app_ids: List[str]
     llm_model: str
     memory_type: str
+    llm_max_batch_size: int = 8
+    llm_batch_wait_ms: float = 20.0
+    llm_cache: bool = True
+    llm_cache_ttl_seconds: float = 7 * 24 * 3600
+    llm_deterministic: bool = False
+    llm_backend: str = "transformers"
+    llm_threads: int = 0
+    llm_gguf_file: Optional[str] = None
+    llm_context_length: int = 2048
+    llm_fused_reference: bool = True
+    llm_server_address: Optional[str] = None
+    llm_server_connect_seconds: float = 300.0
+    io_workers: int = 16
+    job_workers: int = 2
+    max_pending_jobs: int = 100
+    staged_execution: bool = True
+    enhance_workers: int = 1
+    image_workers: int = 2
+    model_workers: int = 2
+    persist_workers: int = 1
+    stage_queue_size: int = 4
+    openfabric_timeouts: Dict[str, float] = field(default_factory=dict)
+    openfabric_timeout_seconds: float = 120.0
+    openfabric_max_concurrency: int = 4
+    openfabric_retries: int = 2
+    openfabric_hedge_delay_seconds: float = 0.0
+    openfabric_breaker_threshold: int = 5
+    openfabric_breaker_reset_seconds: float = 30.0
+    sqlite_pool_size: int = 4
+    embedding_batch_size: int = 64
+    embedding_cache_size: int = 10000
+    index_flush_size: int = 256
+    index_flush_seconds: float = 2.0
+    short_term_size: int = 50
+    short_term_sessions: int = 1000
+    short_term_ttl_seconds: float = 3600.0
+    short_term_similarity: float = 0.95
+    memory_write_behind: bool = True
+    memory_write_behind_seconds: float = 1.0
+    reuse_mode: str = "off"
+    reuse_threshold: float = 0.95
+    reuse_query: str = "enhanced"
+    thumbnail_size: int = 256
+    thumbnail_format: str = "webp"
+    model_optimization: bool = False
+    model_optimizer_workers: int = 2
+    model_quantize: bool = True
+    model_position_bits: int = 14
+    model_max_triangles: Optional[int] = None
+    model_preview_triangles: int = 5000
+    model_optimize_timeout_seconds: float = 120.0
@@ -3,8 +3,20 @@
 # Create necessary directories
 mkdir -p static/images static/models memory
 
+# Every API worker and the model server write metric snapshots here, and
+# /metrics on any worker merges them; cleared so a restart starts from zero
+export METRICS_DIR=${METRICS_DIR:-memory/metrics}
+rm -rf "$METRICS_DIR"
+
+# One model server shared by every API worker, so the model is loaded once
+export LLM_SERVER_ADDRESS=${LLM_SERVER_ADDRESS:-memory/llm.sock}
+python -m llm.server --address "$LLM_SERVER_ADDRESS" &
+
 # Start Streamlit UI in the background
 streamlit run app_ui.py --server.port 8501 &
 
-# Start the API server
-python -m uvicorn main:app --host 0.0.0.0 --port 8888
+# Start the API server. With API_WORKERS > 1 the workers share the job queue
+# (jobs are leased, so a worker only takes over jobs of one that died) and one
+# of them runs retention; bulk runs and the short-term memory tier are per
+# worker, so their state is only seen by the worker that holds it.
+python -m uvicorn main:app --host 0.0.0.0 --port 8888 --workers ${API_WORKERS:-1}
@@ -0,0 +1,237 @@
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional
+
+
+# Where each kind of artifact lives under the store root, and its extension
+ARTIFACT_KINDS = {
+    "image": ("images", ".png"),
+    "model": ("models", ".glb"),
+    # Low-LOD copy of an optimized model, for quick previews
+    "preview": ("previews", ".glb"),
+}
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Write a file so readers never observe it half-written."""
+    tmp_path = f"{path}.tmp-{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class Artifact:
+    digest: str
+    path: str
+    size: int
+    written: Future
+
+
+class ArtifactStore:
+    """Content-addressed store for pipeline stage outputs.
+
+    Bytes are handed back to the caller immediately and written to disk in
+    the background under their SHA-256 digest, so identical outputs are
+    stored once. A reference count per digest tracks how many creations
+    point at each file.
+
+    Several processes may share the store. Each refcount change runs in a
+    BEGIN IMMEDIATE transaction together with the file check, write or
+    removal it depends on. A put in another process therefore never sees a
+    file that a release is about to remove.
+    """
+
+    def __init__(self,
+                 root: str = "static",
+                 db_path: str = "memory/artifacts.db",
+                 writers: int = 2):
+        self.root = root
+        self.db_path = db_path
+        self._executor = ThreadPoolExecutor(max_workers=writers, thread_name_prefix="artifact-writer")
+        self._lock = threading.Lock()
+        # Guards _pending alone, so a write can finish while _lock is held waiting for it
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+
+        self.puts = 0
+        self.dedup_hits = 0
+        self.bytes_written = 0
+
+        try:
+            for directory, _ in ARTIFACT_KINDS.values():
+                os.makedirs(os.path.join(root, directory), exist_ok=True)
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            # Autocommit; every change goes through _transaction
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    digest TEXT PRIMARY KEY,
+                    kind TEXT,
+                    path TEXT,
+                    size INTEGER,
+                    refcount INTEGER
+                )
+            ''')
+        except Exception as e:
+            logging.error(f"Error initializing artifact store: {str(e)}")
+            raise RuntimeError(f"Failed to initialize artifact store: {str(e)}")
+
+    def path_for(self, digest: str, kind: str) -> str:
+        directory, extension = ARTIFACT_KINDS[kind]
+        return f"{self.root}/{directory}/{digest}{extension}"
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Hold the thread lock and SQLite's write lock; commits on success and rolls back on error."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def put(self, data: bytes, kind: str) -> Artifact:
+        """Take a reference on data and persist it asynchronously if it is new."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest, kind)
+
+        with self._transaction() as conn:
+            self.puts += 1
+            row = conn.execute(
+                "SELECT refcount, path FROM artifacts WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row:
+                # The same bytes stored under another kind live at the stored path
+                path = row[1]
+                conn.execute(
+                    "UPDATE artifacts SET refcount = refcount + 1 WHERE digest = ?", (digest,)
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO artifacts (digest, kind, path, size, refcount) VALUES (?, ?, ?, ?, 1)",
+                    (digest, kind, path, len(data))
+                )
+
+            with self._pending_lock:
+                written = self._pending.get(digest)
+                if written is None and os.path.exists(path):
+                    self.dedup_hits += 1
+                    written = Future()
+                    written.set_result(path)
+                elif written is None:
+                    written = self._executor.submit(self._write, digest, path, data)
+                    self._pending[digest] = written
+                else:
+                    self.dedup_hits += 1
+
+        return Artifact(digest=digest, path=path, size=len(data), written=written)
+
+    def _write(self, digest: str, path: str, data: bytes) -> str:
+        try:
+            write_atomic(path, data)
+            with self._pending_lock:
+                self.bytes_written += len(data)
+            return path
+        finally:
+            with self._pending_lock:
+                self._pending.pop(digest, None)
+
+    def retain(self, digest: str) -> Optional[Artifact]:
+        """Take another reference on a stored artifact, or return None if it is gone."""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT path, size FROM artifacts WHERE digest = ?", (digest,)
+            ).fetchone()
+            with self._pending_lock:
+                written = self._pending.get(digest)
+            if not row or (written is None and not os.path.exists(row[0])):
+                return None
+            conn.execute(
+                "UPDATE artifacts SET refcount = refcount + 1 WHERE digest = ?", (digest,)
+            )
+
+        if written is None:
+            written = Future()
+            written.set_result(row[0])
+        return Artifact(digest=digest, path=row[0], size=row[1], written=written)
+
+    def release(self, digest: str, archive_dir: Optional[str] = None) -> bool:
+        """Drop one reference; deletes the file with the last one. Returns True if deleted.
+
+        With archive_dir, the last reference moves the file there instead.
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT refcount, path FROM artifacts WHERE digest = ?", (digest,)
+            ).fetchone()
+            if not row:
+                return False
+            refcount, path = row
+            if refcount > 1:
+                conn.execute(
+                    "UPDATE artifacts SET refcount = refcount - 1 WHERE digest = ?", (digest,)
+                )
+                return False
+            conn.execute("DELETE FROM artifacts WHERE digest = ?", (digest,))
+
+            # Still in the transaction, so no put can count the file as stored meanwhile
+            with self._pending_lock:
+                pending = self._pending.get(digest)
+            if pending is not None:
+                try:
+                    pending.result()
+                except Exception:
+                    pass  # the write failed, so there is no file to remove
+            if os.path.exists(path):
+                if archive_dir:
+                    destination = os.path.join(archive_dir, os.path.relpath(path, self.root))
+                    os.makedirs(os.path.dirname(destination), exist_ok=True)
+                    shutil.move(path, destination)
+                else:
+                    os.remove(path)
+        return True
+
+    def read(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM artifacts WHERE digest = ?", (digest,)).fetchone()
+        if not row:
+            return None
+        with open(row[0], "rb") as f:
+            return f.read()
+
+    def flush(self) -> None:
+        """Wait for every pending background write."""
+        with self._pending_lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (artifacts, stored_bytes) = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts"
+            ).fetchone()
+        return {
+            "puts": self.puts,
+            "dedup_hits": self.dedup_hits,
+            "bytes_written": self.bytes_written,
+            "artifacts": artifacts,
+            "stored_bytes": stored_bytes,
+            "pending_writes": len(self._pending)
+        }
+
+    def close(self) -> None:
+        self.flush()
+        self._executor.shutdown(wait=True)
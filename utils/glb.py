@@ -0,0 +1,653 @@
+"""Shrinks binary glTF (GLB) models: vertex dedup, attribute quantization, decimation.
+
+Triangle primitives with plain float attributes are rewritten; anything else
+(skins, morph targets, compressed or sparse data) is copied through as is.
+Quantized output uses KHR_mesh_quantization: positions become int16 under a
+per-mesh dequantization transform on a new child node, normals and tangents
+int8, and texture coordinates and colours normalized integers.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import struct
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import metrics
+
+OPTIMIZE_SECONDS = metrics.histogram("glb_optimize_seconds", "Time to optimize one GLB in the process pool")
+SIZE_RATIO = metrics.histogram(
+    "glb_size_ratio", "Optimized GLB size as a share of the original",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+)
+
+GLB_MAGIC = 0x46546C67
+JSON_CHUNK = 0x4E4F534A
+BIN_CHUNK = 0x004E4942
+
+COMPONENT_TYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+COMPONENT_CODES = {np.dtype(dtype): code for code, dtype in COMPONENT_TYPES.items()}
+TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT2": 4, "MAT3": 9, "MAT4": 16}
+SIZE_TYPES = {1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4"}
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+
+REWRITTEN_ATTRIBUTES = ("POSITION", "NORMAL", "TANGENT", "TEXCOORD_0", "TEXCOORD_1", "COLOR_0")
+# Quantized storage by attribute name (TEXCOORD_n shares an entry): integer scale and bytes per vertex
+STORED_SCALES = {"NORMAL": 127, "TANGENT": 127, "TEXCOORD": 65535, "COLOR_0": 255}
+STORED_BYTES = {"POSITION": 8, "NORMAL": 4, "TANGENT": 4, "TEXCOORD": 4, "COLOR_0": 4}
+# Extensions that may be required without stopping a rewrite; others (e.g. Draco, meshopt) do
+SAFE_REQUIRED_EXTENSIONS = ("KHR_mesh_quantization", "KHR_texture_transform", "KHR_materials_")
+
+
+@dataclass
+class GLBOptions:
+    quantize: bool = True
+    # Position precision within each mesh's bounding box; stored as int16 either way
+    position_bits: int = 14
+    # Triangle budget of the compact model; None keeps every triangle
+    max_triangles: Optional[int] = None
+    preview_triangles: int = 5000
+
+
+def read_glb(data: bytes) -> Tuple[Dict[str, Any], bytes]:
+    """Split a GLB into its glTF JSON and its binary chunk."""
+    if len(data) < 12:
+        raise ValueError("Not a GLB file: too short")
+    magic, version, length = struct.unpack_from("<III", data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise ValueError("Not a glTF 2.0 binary file")
+    gltf, binary = None, b""
+    offset = 12
+    while offset + 8 <= min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        offset += 8 + chunk_length
+        if chunk_type == JSON_CHUNK:
+            gltf = json.loads(chunk.decode("utf-8"))
+        elif chunk_type == BIN_CHUNK and not binary:
+            binary = bytes(chunk)
+    if gltf is None:
+        raise ValueError("GLB has no JSON chunk")
+    return gltf, binary
+
+
+def write_glb(gltf: Dict[str, Any], binary: bytes) -> bytes:
+    if binary:
+        binary += b"\x00" * (-len(binary) % 4)
+        gltf["buffers"] = [{"byteLength": len(binary)}]
+    else:
+        gltf.pop("buffers", None)
+    json_bytes = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_bytes += b" " * (-len(json_bytes) % 4)
+
+    chunks = struct.pack("<II", len(json_bytes), JSON_CHUNK) + json_bytes
+    if binary:
+        chunks += struct.pack("<II", len(binary), BIN_CHUNK) + binary
+    return struct.pack("<III", GLB_MAGIC, 2, 12 + len(chunks)) + chunks
+
+
+def _read_accessor(gltf: Dict[str, Any], binary: bytes, index: int) -> np.ndarray:
+    """An accessor's data as a (count, components) array; normalized integers come back as floats."""
+    accessor = gltf["accessors"][index]
+    if "sparse" in accessor or "bufferView" not in accessor:
+        raise ValueError("Sparse and zero-filled accessors are not rewritten")
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    if view.get("buffer", 0) != 0:
+        raise ValueError("Only the GLB's own binary chunk is supported")
+    dtype = np.dtype(COMPONENT_TYPES[accessor["componentType"]])
+    components = TYPE_SIZES[accessor["type"]]
+    stride = view.get("byteStride") or dtype.itemsize * components
+    offset = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+    values = np.ndarray(
+        shape=(accessor["count"], components), dtype=dtype, buffer=binary,
+        offset=offset, strides=(stride, dtype.itemsize)
+    ).copy()
+    if accessor.get("normalized"):
+        limit = float(np.iinfo(dtype).max)
+        values = np.maximum(values.astype(np.float32) / limit, -1.0)
+    return values
+
+
+class _BufferBuilder:
+    """Assembles the new binary chunk, copying kept views and appending rewritten data."""
+
+    def __init__(self, gltf: Dict[str, Any], binary: bytes):
+        self.gltf = gltf
+        self.binary = binary
+        self.parts: List[bytes] = []
+        self.length = 0
+        self.views: List[Dict[str, Any]] = []
+        self.accessors: List[Dict[str, Any]] = []
+        self._view_map: Dict[int, int] = {}
+        self._accessor_map: Dict[int, int] = {}
+
+    def add_view(self, data: bytes, target: Optional[int] = None, stride: Optional[int] = None) -> int:
+        padding = -self.length % 4
+        self.parts.append(b"\x00" * padding)
+        self.length += padding
+        view: Dict[str, Any] = {"buffer": 0, "byteOffset": self.length, "byteLength": len(data)}
+        if target is not None:
+            view["target"] = target
+        if stride is not None:
+            view["byteStride"] = stride
+        self.parts.append(data)
+        self.length += len(data)
+        self.views.append(view)
+        return len(self.views) - 1
+
+    def add_accessor(self, values: np.ndarray, target: int, normalized: bool = False,
+                     bounds: bool = False) -> int:
+        """Store values, padding each element to 4 bytes as glTF requires of vertex attributes."""
+        count, components = values.shape
+        element = values.dtype.itemsize * components
+        stride = None
+        if target == ARRAY_BUFFER and element % 4:
+            padded = element + (-element % 4)
+            rows = np.zeros((count, padded), dtype=np.uint8)
+            rows[:, :element] = np.ascontiguousarray(values).view(np.uint8).reshape(count, element)
+            data, stride = rows.tobytes(), padded
+        else:
+            data = np.ascontiguousarray(values).tobytes()
+        accessor: Dict[str, Any] = {
+            "bufferView": self.add_view(data, target, stride),
+            "componentType": COMPONENT_CODES[values.dtype],
+            "count": count,
+            "type": SIZE_TYPES[components]
+        }
+        if normalized:
+            accessor["normalized"] = True
+        if bounds:
+            accessor["min"] = values.min(axis=0).tolist()
+            accessor["max"] = values.max(axis=0).tolist()
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def keep_view(self, index: int) -> int:
+        if index not in self._view_map:
+            view = self.gltf["bufferViews"][index]
+            if view.get("buffer", 0) != 0:
+                raise ValueError("Only the GLB's own binary chunk is supported")
+            start = view.get("byteOffset", 0)
+            new = self.add_view(self.binary[start:start + view["byteLength"]], view.get("target"),
+                                view.get("byteStride"))
+            self._view_map[index] = new
+        return self._view_map[index]
+
+    def keep_accessor(self, index: int) -> int:
+        if index not in self._accessor_map:
+            accessor = json.loads(json.dumps(self.gltf["accessors"][index]))
+            if "bufferView" in accessor:
+                accessor["bufferView"] = self.keep_view(accessor["bufferView"])
+            sparse = accessor.get("sparse")
+            if sparse:
+                sparse["indices"]["bufferView"] = self.keep_view(sparse["indices"]["bufferView"])
+                sparse["values"]["bufferView"] = self.keep_view(sparse["values"]["bufferView"])
+            self.accessors.append(accessor)
+            self._accessor_map[index] = len(self.accessors) - 1
+        return self._accessor_map[index]
+
+    def build(self) -> bytes:
+        return b"".join(self.parts)
+
+
+def _rewritable(gltf: Dict[str, Any], primitive: Dict[str, Any]) -> bool:
+    attributes = primitive.get("attributes", {})
+    if primitive.get("mode", TRIANGLES) != TRIANGLES or "POSITION" not in attributes:
+        return False
+    if primitive.get("targets") or primitive.get("extensions"):
+        return False
+    if any(name not in REWRITTEN_ATTRIBUTES for name in attributes):
+        return False
+    accessors = [gltf["accessors"][i] for i in attributes.values()]
+    if "indices" in primitive:
+        index_accessor = gltf["accessors"][primitive["indices"]]
+        if "sparse" in index_accessor or "bufferView" not in index_accessor:
+            return False
+    return all(a["componentType"] == 5126 and "sparse" not in a and "bufferView" in a for a in accessors)
+
+
+def _drop_degenerate(triangles: np.ndarray) -> np.ndarray:
+    return triangles[(triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2])
+                     & (triangles[:, 0] != triangles[:, 2])]
+
+
+def _unique_rows(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(first index, inverse) of each distinct row of an integer array.
+
+    Rows are hashed to one uint64 each, which sorts far faster than whole
+    rows; the grouping is then checked, and a hash collision falls back to
+    comparing rows as raw bytes.
+    """
+    keys = np.ascontiguousarray(keys)
+    hashes = np.zeros(len(keys), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for column in keys.T:
+            hashes = (hashes ^ column.astype(np.uint64)) * np.uint64(0x9E3779B97F4A7C15)
+            hashes ^= hashes >> np.uint64(29)
+    _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    if not np.array_equal(keys[first][inverse], keys):
+        rows = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).reshape(-1)
+        _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    return first, inverse
+
+
+def _decimate(attributes: Dict[str, np.ndarray], triangles: np.ndarray,
+              target: int) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Vertex clustering: merge vertices on a uniform grid, as fine as the triangle budget allows."""
+    positions = attributes["POSITION"]
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    extent = float((high - low).max()) or 1.0
+
+    def cluster(resolution: int) -> Tuple[np.ndarray, np.ndarray]:
+        cells = np.floor((positions - low) / extent * resolution).astype(np.int64)
+        np.clip(cells, 0, resolution - 1, out=cells)
+        keys = (cells[:, 0] * resolution + cells[:, 1]) * resolution + cells[:, 2]
+        _, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        return inverse, _drop_degenerate(inverse[triangles])
+
+    # Binary search for the finest grid that fits the budget. A grid so coarse that
+    # every triangle collapses counts as too coarse; if no grid fits, the fewest
+    # triangles any grid left are kept, and if none left any the input is
+    best, fewest = None, None
+    lo, hi = 1, 1024
+    while lo <= hi:
+        middle = (lo + hi) // 2
+        candidate = cluster(middle)
+        if not len(candidate[1]):
+            lo = middle + 1
+        elif len(candidate[1]) <= target:
+            best, lo = candidate, middle + 1
+        else:
+            if fewest is None or len(candidate[1]) < len(fewest[1]):
+                fewest = candidate
+            hi = middle - 1
+    if best is None and fewest is None:
+        return attributes, triangles
+    inverse, merged = best or fewest
+
+    # The same triangle from several source triangles is kept once; counting them
+    # during the search only makes it err towards fewer triangles
+    ordered = np.sort(merged, axis=1)
+    bits = max(1, (len(positions) - 1).bit_length())
+    if bits <= 21:
+        first = np.unique((ordered[:, 0] << 2 * bits) | (ordered[:, 1] << bits) | ordered[:, 2],
+                          return_index=True)[1]
+    else:
+        first = _unique_rows(ordered)[0]
+    merged = merged[np.sort(first)]
+
+    clusters = int(inverse.max()) + 1
+    counts = np.bincount(inverse, minlength=clusters)
+    averaged = {}
+    for name, values in attributes.items():
+        mean = np.stack([np.bincount(inverse, weights=column, minlength=clusters) / counts
+                         for column in values.T], axis=1).astype(np.float32)
+        if name in ("NORMAL", "TANGENT"):
+            xyz = mean[:, :3]
+            xyz /= np.maximum(np.linalg.norm(xyz, axis=1, keepdims=True), 1e-8)
+            if name == "TANGENT":
+                mean[:, 3] = np.where(mean[:, 3] < 0, -1.0, 1.0)
+        averaged[name] = mean
+    return averaged, merged
+
+
+def _dedup(attributes: Dict[str, np.ndarray], triangles: np.ndarray,
+           dequantize: Optional[Tuple]) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Merge vertices that would be stored identically, exactly so when not quantizing."""
+    if dequantize is None:
+        keys = np.hstack([attributes[name] for name in sorted(attributes)]).view(np.uint32)
+    else:
+        origin, step = dequantize
+        columns = [np.round((attributes["POSITION"] - origin) / step).astype(np.int32)]
+        for name in sorted(attributes):
+            if name != "POSITION":
+                columns.append(np.round(attributes[name] * STORED_SCALES[name[:8]]).astype(np.int32))
+        keys = np.hstack(columns)
+    first, inverse = _unique_rows(keys)
+    return ({name: values[first] for name, values in attributes.items()},
+            _drop_degenerate(inverse[triangles]))
+
+
+def _rewrite_mesh(primitives: List[Tuple[Dict[str, np.ndarray], np.ndarray]], options: GLBOptions,
+                  budget: Optional[float]) -> Tuple[List[Tuple[Dict[str, np.ndarray], np.ndarray]], Optional[Tuple]]:
+    """Dedup and decimate one mesh's primitives; returns them and the mesh's dequantization (origin, step)."""
+    dequantize = None
+    if options.quantize:
+        points = np.vstack([attributes["POSITION"] for attributes, _ in primitives])
+        low, high = points.min(axis=0), points.max(axis=0)
+        limit = 2 ** (min(16, max(2, options.position_bits)) - 1) - 1
+        step = np.maximum((high - low) / 2 / limit, 1e-12).astype(np.float32)
+        dequantize = (((low + high) / 2).astype(np.float32), step)
+
+    result = []
+    for attributes, triangles in primitives:
+        # Dedup first: clustering then works on far fewer vertices
+        attributes, triangles = _dedup(attributes, triangles, dequantize)
+        target = max(1, int(len(triangles) * budget)) if budget is not None else None
+        if target is not None and len(triangles) > target:
+            decimated = _dedup(*_decimate(attributes, triangles, target), dequantize)
+            # Quantizing can still collapse a decimated primitive; it then keeps full detail
+            if len(decimated[1]):
+                attributes, triangles = decimated
+        result.append((attributes, triangles))
+    return result, dequantize
+
+
+def _indexed(attributes: Dict[str, np.ndarray], triangles: np.ndarray, quantized: bool) -> bool:
+    """Whether an index buffer costs less than the vertices it lets triangles share."""
+    corners = triangles.size
+    vertex_bytes = sum(
+        (STORED_BYTES[name[:8]] if quantized else 4 * values.shape[1]) for name, values in attributes.items()
+    )
+    index_bytes = 2 if len(attributes["POSITION"]) < 65535 else 4
+    return (corners - len(attributes["POSITION"])) * vertex_bytes > corners * index_bytes
+
+
+def _store_attribute(builder: _BufferBuilder, name: str, values: np.ndarray,
+                     dequantize: Optional[Tuple]) -> int:
+    if dequantize is None:
+        return builder.add_accessor(values.astype(np.float32), ARRAY_BUFFER, bounds=name == "POSITION")
+    if name == "POSITION":
+        origin, step = dequantize
+        quantized = np.clip(np.round((values - origin) / step), -32767, 32767).astype(np.int16)
+        return builder.add_accessor(quantized, ARRAY_BUFFER, bounds=True)
+    if name in ("NORMAL", "TANGENT"):
+        return builder.add_accessor(np.round(np.clip(values, -1, 1) * 127).astype(np.int8), ARRAY_BUFFER,
+                                    normalized=True)
+    if values.size and (values.min() < 0 or values.max() > 1):
+        # Wrapped texture coordinates stay float
+        return builder.add_accessor(values.astype(np.float32), ARRAY_BUFFER)
+    if name == "COLOR_0":
+        return builder.add_accessor(np.round(values * 255).astype(np.uint8), ARRAY_BUFFER, normalized=True)
+    return builder.add_accessor(np.round(values * 65535).astype(np.uint16), ARRAY_BUFFER, normalized=True)
+
+
+def _transform(gltf: Dict[str, Any], binary: bytes, options: GLBOptions,
+               max_triangles: Optional[int]) -> Tuple[bytes, Dict[str, int]]:
+    gltf = json.loads(json.dumps(gltf))
+    for extension in gltf.get("extensionsRequired", []):
+        if not extension.startswith(SAFE_REQUIRED_EXTENSIONS):
+            raise ValueError(f"Unsupported required extension: {extension}")
+    if any(buffer.get("uri") for buffer in gltf.get("buffers", [])):
+        raise ValueError("GLB references external buffers")
+
+    meshes = gltf.get("meshes", [])
+    skinned = {node["mesh"] for node in gltf.get("nodes", []) if "mesh" in node and "skin" in node}
+
+    # Read every rewritable primitive first, so the triangle budget can be shared out
+    decoded: Dict[Tuple[int, int], Tuple[Dict[str, np.ndarray], np.ndarray]] = {}
+    for m, mesh in enumerate(meshes):
+        for p, primitive in enumerate(mesh.get("primitives", [])):
+            if m in skinned or not _rewritable(gltf, primitive):
+                continue
+            attributes = {name: _read_accessor(gltf, binary, index)
+                          for name, index in primitive["attributes"].items()}
+            count = len(attributes["POSITION"])
+            if "indices" in primitive:
+                indices = _read_accessor(gltf, binary, primitive["indices"]).reshape(-1).astype(np.int64)
+            else:
+                indices = np.arange(count, dtype=np.int64)
+            triangles = indices[:len(indices) // 3 * 3].reshape(-1, 3)
+            if len(triangles):
+                decoded[(m, p)] = (attributes, triangles)
+
+    stats = {
+        "triangles_in": sum(len(t) for _, t in decoded.values()),
+        "vertices_in": sum(len(a["POSITION"]) for a, _ in decoded.values()),
+        "triangles_out": 0,
+        "vertices_out": 0
+    }
+    budget = None
+    if max_triangles is not None and stats["triangles_in"] > max_triangles:
+        budget = max_triangles / stats["triangles_in"]
+
+    builder = _BufferBuilder(gltf, binary)
+    quantized_meshes: Dict[int, Tuple] = {}
+    for m, mesh in enumerate(meshes):
+        keys = [(m, p) for p in range(len(mesh.get("primitives", [])))]
+        rewritable = [key for key in keys if key in decoded]
+        # One dequantization transform covers a whole mesh, so every primitive must be rewritten
+        mesh_options = options if options.quantize and len(rewritable) == len(keys) else \
+            GLBOptions(quantize=False, position_bits=options.position_bits)
+        rewritten, dequantize = _rewrite_mesh([decoded[key] for key in rewritable], mesh_options, budget) \
+            if rewritable else ([], None)
+        if dequantize is not None:
+            quantized_meshes[m] = dequantize
+        done = dict(zip(rewritable, rewritten))
+
+        kept = []
+        for p, primitive in enumerate(mesh.get("primitives", [])):
+            if (m, p) in done and not len(done[(m, p)][1]):
+                # Nothing but degenerate triangles; never written as an empty primitive
+                continue
+            kept.append(primitive)
+            if (m, p) not in done:
+                primitive["attributes"] = {name: builder.keep_accessor(index)
+                                           for name, index in primitive.get("attributes", {}).items()}
+                if "indices" in primitive:
+                    primitive["indices"] = builder.keep_accessor(primitive["indices"])
+                for target in primitive.get("targets", []):
+                    for name in target:
+                        target[name] = builder.keep_accessor(target[name])
+                continue
+            attributes, triangles = done[(m, p)]
+            stats["triangles_out"] += len(triangles)
+            indexed = _indexed(attributes, triangles, dequantize is not None)
+            if not indexed:
+                # Mostly unshared vertices, e.g. flat shading: a plain triangle list is smaller
+                attributes = {name: values[triangles.reshape(-1)] for name, values in attributes.items()}
+            stats["vertices_out"] += len(attributes["POSITION"])
+            primitive["attributes"] = {name: _store_attribute(builder, name, values, dequantize)
+                                       for name, values in attributes.items()}
+            primitive.pop("indices", None)
+            if indexed:
+                # 65535 is reserved as primitive restart for 16-bit indices
+                index_type = np.uint16 if len(attributes["POSITION"]) < 65535 else np.uint32
+                primitive["indices"] = builder.add_accessor(
+                    triangles.reshape(-1, 1).astype(index_type), ELEMENT_ARRAY_BUFFER
+                )
+        if not kept and keys:
+            raise ValueError(f"Mesh {m} has no triangles left")
+        mesh["primitives"] = kept
+
+    for skin in gltf.get("skins", []):
+        if "inverseBindMatrices" in skin:
+            skin["inverseBindMatrices"] = builder.keep_accessor(skin["inverseBindMatrices"])
+    for animation in gltf.get("animations", []):
+        for sampler in animation.get("samplers", []):
+            sampler["input"] = builder.keep_accessor(sampler["input"])
+            sampler["output"] = builder.keep_accessor(sampler["output"])
+    for image in gltf.get("images", []):
+        if "bufferView" in image:
+            image["bufferView"] = builder.keep_view(image["bufferView"])
+
+    if quantized_meshes:
+        # Each quantized mesh moves to a child node carrying its dequantization transform
+        nodes = gltf.setdefault("nodes", [])
+        for node in list(nodes):
+            if node.get("mesh") in quantized_meshes:
+                mesh = node.pop("mesh")
+                origin, step = quantized_meshes[mesh]
+                nodes.append({"mesh": mesh, "translation": origin.tolist(), "scale": step.tolist()})
+                node.setdefault("children", []).append(len(nodes) - 1)
+        for key in ("extensionsUsed", "extensionsRequired"):
+            extensions = gltf.setdefault(key, [])
+            if "KHR_mesh_quantization" not in extensions:
+                extensions.append("KHR_mesh_quantization")
+
+    gltf["accessors"] = builder.accessors
+    gltf["bufferViews"] = builder.views
+    if not builder.accessors:
+        gltf.pop("accessors")
+    if not builder.views:
+        gltf.pop("bufferViews")
+    return write_glb(gltf, builder.build()), stats
+
+
+def optimize_glb(data: bytes, options: Optional[GLBOptions] = None) -> Dict[str, Any]:
+    """Return the compact model, a low-LOD preview and size/triangle stats for a GLB."""
+    options = options or GLBOptions()
+    start = time.perf_counter()
+    gltf, binary = read_glb(data)
+    model, stats = _transform(gltf, binary, options, options.max_triangles)
+    # Never a finer level of detail than the model itself
+    preview_budget = options.preview_triangles
+    if options.max_triangles is not None:
+        preview_budget = min(preview_budget, options.max_triangles)
+    # preview is None when it failed or would be no smaller than the model; the model then serves as preview
+    preview, preview_stats = None, {"triangles_out": 0}
+    try:
+        preview, preview_stats = _transform(gltf, binary, options, preview_budget)
+    except ValueError as e:
+        logging.warning(f"GLB preview failed, keeping the model only: {e}")
+    if preview is not None and len(preview) >= len(model):
+        preview, preview_stats = None, {"triangles_out": 0}
+    return {
+        "model": model,
+        "preview": preview,
+        "stats": {
+            **stats,
+            "triangles_preview": preview_stats["triangles_out"],
+            "input_bytes": len(data),
+            "output_bytes": len(model),
+            "preview_bytes": len(preview) if preview else 0,
+            "ratio": len(model) / len(data) if data else 1.0,
+            "seconds": time.perf_counter() - start
+        }
+    }
+
+
+class GLBOptimizer:
+    """Runs optimize_glb in a process pool, so mesh work never holds the GIL of the API process.
+
+    optimize() returns None when the GLB cannot be rewritten or takes longer
+    than timeout_seconds; callers then keep the original. A timed-out job may
+    be stuck in its worker, so the pool is then replaced and the old one's
+    workers are killed once its other jobs have had timeout_seconds to finish.
+    """
+
+    def __init__(self, options: Optional[GLBOptions] = None, workers: int = 2, timeout_seconds: float = 120.0):
+        self.options = options or GLBOptions()
+        self.timeout_seconds = timeout_seconds
+        self.workers = max(1, workers)
+        self._executor = self._new_executor()
+        self._lock = threading.Lock()
+
+        self.optimized = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.seconds = 0.0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Spawned rather than forked: the parent holds model threads and locks
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, data: bytes) -> Future:
+        return self._submit(data)[0]
+
+    def _submit(self, data: bytes) -> Tuple[Future, ProcessPoolExecutor]:
+        executor = self._executor
+        try:
+            future = executor.submit(optimize_glb, data, self.options)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); later models get a fresh pool
+            with self._lock:
+                if self._executor is executor:
+                    logging.warning("GLB optimizer pool broke; starting a new one")
+                    self._executor = self._new_executor()
+                executor = self._executor
+            future = executor.submit(optimize_glb, data, self.options)
+        future.add_done_callback(self._record)
+        return future, executor
+
+    def optimize(self, data: bytes) -> Optional[Dict[str, Any]]:
+        future, executor = self._submit(data)
+        try:
+            return future.result(timeout=self.timeout_seconds)
+        except FutureTimeoutError:
+            self._timed_out(future, executor)
+        except Exception as e:
+            logging.warning(f"Could not optimize GLB, keeping the original: {str(e)}")
+        return None
+
+    async def optimize_async(self, data: bytes) -> Optional[Dict[str, Any]]:
+        """optimize() without blocking the event loop."""
+        future, executor = self._submit(data)
+        try:
+            # Shielded: on timeout the job is cancelled through its pool, not by wait_for
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self._timed_out(future, executor)
+        except Exception as e:
+            logging.warning(f"Could not optimize GLB, keeping the original: {str(e)}")
+        return None
+
+    def _timed_out(self, future: Future, executor: ProcessPoolExecutor) -> None:
+        logging.warning(f"GLB optimization took over {self.timeout_seconds:.0f}s; keeping the original")
+        with self._lock:
+            self.timeouts += 1
+        if future.cancel() or future.done():
+            return  # never started (or just finished), so no worker is stuck on it
+        with self._lock:
+            if self._executor is not executor:
+                return  # already recycled for an earlier timeout
+            self._executor = self._new_executor()
+        logging.warning("Replacing the GLB optimizer pool after a timeout")
+        threading.Thread(target=self._retire, args=(executor,), name="glb-pool-retire", daemon=True).start()
+
+    def _retire(self, executor: ProcessPoolExecutor) -> None:
+        executor.shutdown(wait=False)
+        time.sleep(self.timeout_seconds)
+        # Workers still alive now are stuck; ProcessPoolExecutor has no public way to stop them
+        for process in list((executor._processes or {}).values()):
+            if process.is_alive():
+                process.terminate()
+
+    def _record(self, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                self.failures += 1
+            return
+        stats = future.result()["stats"]
+        OPTIMIZE_SECONDS.observe(stats["seconds"])
+        SIZE_RATIO.observe(stats["ratio"])
+        with self._lock:
+            self.optimized += 1
+            self.input_bytes += stats["input_bytes"]
+            self.output_bytes += stats["output_bytes"]
+            self.seconds += stats["seconds"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "optimized": self.optimized,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "size_ratio": self.output_bytes / self.input_bytes if self.input_bytes else 1.0,
+            "avg_seconds": self.seconds / self.optimized if self.optimized else 0.0
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,280 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a fast SQLite lookup up to a slow Openfabric round-trip
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def _samples(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_number(value)}"]
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            return [(key, value.copy() if isinstance(value, list) else value) for key, value in self._values.items()]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Everything needed to rebuild the metric in another process."""
+        return {
+            "kind": self.kind,
+            "help": self.help,
+            "labelnames": list(self.labelnames),
+            "values": [[list(key), value] for key, value in self._items()]
+        }
+
+    def _merge(self, key: Tuple[str, ...], value: Any) -> None:
+        """Add another process's value for a label set."""
+        self._values[key] = self._values.get(key, 0.0) + value
+
+    def render(self) -> List[str]:
+        items = self._items()
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(items):
+            lines += self._samples(key, value)
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """Cumulative buckets plus sum and count per label set, as Prometheus expects."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # [count per bucket..., sum, count]
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the wall time of the block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: Any) -> int:
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**super().snapshot(), "buckets": list(self.buckets)}
+
+    def _merge(self, key: Tuple[str, ...], value: Any) -> None:
+        state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+        for i, amount in enumerate(value):
+            state[i] += amount
+
+    def _samples(self, key: Tuple[str, ...], state: List) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{self._labels(key, [('le', _number(bound))])} {cumulative}")
+        # +Inf holds every observation, including those above the last bound
+        lines.append(f"{self.name}_bucket{self._labels(key, [('le', '+Inf')])} {state[-1]}")
+        lines.append(f"{self.name}_sum{self._labels(key)} {_number(state[-2])}")
+        lines.append(f"{self.name}_count{self._labels(key)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide set of metrics, rendered in the Prometheus text format.
+
+    Metrics are created by the module that records them; asking for an
+    existing name returns the same metric, so modules can be reloaded.
+    """
+
+    def __init__(self, namespace: str = "thinktothing"):
+        self.namespace = namespace
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls: type, name: str, help: str, labelnames: Sequence[str], **kwargs: Any) -> Any:
+        full_name = f"{self.namespace}_{name}" if self.namespace else name
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {full_name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+class MultiprocessMetrics:
+    """Metrics of several processes (API workers, the LLM server), merged on export.
+
+    Each process keeps its own registry, so with uvicorn --workers N one
+    worker's /metrics would only show the requests it happened to serve. Every
+    process writes a snapshot of its registry to directory every
+    interval_seconds (and at stop); render() merges all of them. Counters and
+    histograms are summed; gauges get a pid label, as they do not add up.
+
+    Snapshots of exited processes are kept so counters never go backwards
+    while the server runs; clear the directory before starting it.
+    """
+
+    def __init__(self, registry: MetricsRegistry, directory: str, interval_seconds: float = 5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self.path = os.path.join(directory, f"{os.getpid()}.json")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.write()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.write()
+            except Exception as e:
+                logging.error(f"Error writing metrics snapshot: {str(e)}")
+
+    def write(self) -> None:
+        """Replace this process's snapshot; readers never see a partial file."""
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"pid": os.getpid(), "metrics": self.registry.snapshot()}, f)
+        os.replace(temporary, self.path)
+
+    def render(self) -> str:
+        """This process's current metrics merged with the latest snapshot of every other one."""
+        self.write()
+        merged: Dict[str, _Metric] = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Skipping metrics snapshot {path}: {str(e)}")
+                continue
+            for name, state in snapshot["metrics"].items():
+                if state["kind"] == Gauge.kind:
+                    metric = merged.setdefault(name, Gauge(name, state["help"], state["labelnames"] + ["pid"]))
+                    for key, value in state["values"]:
+                        metric._values[tuple(key) + (str(snapshot["pid"]),)] = value
+                    continue
+                if name not in merged:
+                    if state["kind"] == Histogram.kind:
+                        merged[name] = Histogram(name, state["help"], state["labelnames"], state["buckets"])
+                    else:
+                        merged[name] = Counter(name, state["help"], state["labelnames"])
+                for key, value in state["values"]:
+                    merged[name]._merge(tuple(key), value)
+        lines = []
+        for metric in merged.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,26 @@
+import os
+import resource
+import sys
+
+
+def current_rss_bytes() -> int:
+    """Return the resident set size of this process in bytes."""
+    try:
+        return process_rss_bytes(os.getpid())
+    except (OSError, ValueError, IndexError):
+        # No procfs (macOS); the peak is the best approximation available
+        return peak_rss_bytes()
+
+
+def process_rss_bytes(pid: int) -> int:
+    """Return the resident set size of a process in bytes; needs procfs."""
+    with open(f"/proc/{pid}/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def peak_rss_bytes() -> int:
+    """Return the peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
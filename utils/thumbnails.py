@@ -0,0 +1,148 @@
+import io
+import logging
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Sequence, Union
+
+from PIL import Image, features
+
+from utils.file_ops import ARTIFACT_KINDS, write_atomic
+
+
+# Sizes the cache will render; other requests snap to the nearest, so the
+# number of files per image stays bounded
+THUMBNAIL_SIZES = (128, 256, 512)
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+class ThumbnailCache:
+    """Resized copies of artifact images, stored on disk under the image's SHA-256.
+
+    Thumbnails are rendered in the background as images are stored, and on
+    first request for images stored before that. Since the key is the
+    content hash, a cached file never goes stale and may be served with
+    immutable caching headers.
+    """
+
+    def __init__(self,
+                 root: str = "static/thumbnails",
+                 image_root: str = "static",
+                 default_size: int = 256,
+                 image_format: str = "webp",
+                 quality: int = 80,
+                 workers: int = 1):
+        self.root = root
+        self.image_root = image_root
+        self.default_size = self.snap(default_size)
+        # JPEG when this Pillow build cannot write WebP
+        self.image_format = "webp" if image_format == "webp" and features.check("webp") else "jpeg"
+        self.quality = quality
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnailer")
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.rendered = 0
+        self.failures = 0
+        self.bytes_written = 0
+
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def snap(size: int) -> int:
+        return min(THUMBNAIL_SIZES, key=lambda allowed: abs(allowed - size))
+
+    @staticmethod
+    def valid_digest(digest: str) -> bool:
+        return bool(_DIGEST.fullmatch(digest or ""))
+
+    @property
+    def media_type(self) -> str:
+        return f"image/{self.image_format}"
+
+    def path_for(self, digest: str, size: int) -> str:
+        extension = "webp" if self.image_format == "webp" else "jpg"
+        return os.path.join(self.root, f"{digest}_{size}.{extension}")
+
+    def get(self, digest: str, size: Optional[int] = None) -> Optional[str]:
+        """Return the path of a thumbnail, rendering it from the stored image if needed.
+
+        Returns None when the digest is malformed or no image is stored under it.
+        """
+        if not self.valid_digest(digest):
+            return None
+        size = self.snap(size or self.default_size)
+        path = self.path_for(digest, size)
+        if os.path.exists(path):
+            with self._lock:
+                self.hits += 1
+            return path
+
+        directory, extension = ARTIFACT_KINDS["image"]
+        source = os.path.join(self.image_root, directory, f"{digest}{extension}")
+        if not os.path.exists(source):
+            return None
+        return self._render(digest, source, size)
+
+    def submit(self, digest: str, data: bytes, sizes: Sequence[int] = ()) -> Future:
+        """Render thumbnails of freshly generated image bytes in the background."""
+        return self._executor.submit(self._render_quietly, digest, data, sizes or (self.default_size,))
+
+    def _render_quietly(self, digest: str, data: bytes, sizes: Sequence[int]) -> None:
+        for size in sizes:
+            size = self.snap(size)
+            if os.path.exists(self.path_for(digest, size)):
+                continue
+            try:
+                self._render(digest, data, size)
+            except Exception as e:
+                # Counted in stats and rendered again on request; never fails the creation
+                logging.debug(f"Error rendering thumbnail for {digest[:12]}: {str(e)}")
+
+    def _render(self, digest: str, source: Union[str, bytes], size: int) -> str:
+        try:
+            with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+                image.thumbnail((size, size))
+                if self.image_format == "jpeg" and image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                buffer = io.BytesIO()
+                image.save(buffer, format=self.image_format.upper(), quality=self.quality)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+
+        path = self.path_for(digest, size)
+        write_atomic(path, buffer.getvalue())
+        with self._lock:
+            self.rendered += 1
+            self.bytes_written += buffer.tell()
+        return path
+
+    def discard(self, digest: str) -> int:
+        """Delete every cached size of an image's thumbnail. Returns the bytes freed."""
+        if not self.valid_digest(digest):
+            return 0
+        freed = 0
+        for size in THUMBNAIL_SIZES:
+            path = self.path_for(digest, size)
+            try:
+                freed += os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "format": self.image_format,
+            "hits": self.hits,
+            "rendered": self.rendered,
+            "failures": self.failures,
+            "bytes_written": self.bytes_written
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,71 @@
+import contextvars
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from utils.metrics import metrics
+
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"
+
+SPAN_SECONDS = metrics.histogram(
+    "span_seconds",
+    "Wall time of each instrumented step of a creation",
+    ["span", "status"]
+)
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id: Optional[str] = None) -> Iterator[str]:
+    """Tag everything logged inside the block with a trace id, generating one if not given."""
+    token = _trace_id.set(trace_id or uuid.uuid4().hex[:16])
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+def in_context(func: Callable) -> Callable:
+    """Bind func to a copy of the caller's context, so an executor thread keeps its trace id."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+    return run
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a step into span_seconds, labelled ok or error, and log it at debug level."""
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.observe(elapsed, span=name, status=status)
+        logging.debug(f"{name} {status} in {elapsed * 1000:.1f}ms")
+
+
+def install_log_records() -> None:
+    """Give every log record a trace_id attribute ("-" outside a trace) for LOG_FORMAT."""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, "adds_trace_id", False):
+        return
+
+    def record_factory(*args, **kwargs) -> logging.LogRecord:
+        record = factory(*args, **kwargs)
+        record.trace_id = _trace_id.get() or "-"
+        return record
+
+    record_factory.adds_trace_id = True
+    logging.setLogRecordFactory(record_factory)